@@ -0,0 +1,242 @@
+"""Per-session audio aggregation into longer Speech requests, and WebM stream framing"""
+import os
+from typing import List, Optional, Dict, Any, Tuple
+from collections import OrderedDict
+import time
+import re
+from vad import VAD_ENABLED, VAD_PCM_FRAME_MS, pcm_levels, vad
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Chunk aggregation. With ``aggregate`` set, chunks are stitched per session
+# and sent to Speech only when the speaker pauses or the buffered audio
+# reaches the latency budget, instead of once per chunk. A budget flush cuts
+# mid-speech, so its tail is kept as the start of the next flush and the
+# repeated words are removed from that transcript.
+AGGREGATION_MAX_MS = float(os.environ.get('AGGREGATION_MAX_MS', '6000'))
+AGGREGATION_PAUSE_MS = float(os.environ.get('AGGREGATION_PAUSE_MS', '500'))
+AGGREGATION_OVERLAP_MS = float(os.environ.get('AGGREGATION_OVERLAP_MS', '500'))
+AGGREGATION_IDLE_SECONDS = float(os.environ.get('AGGREGATION_IDLE_SECONDS', '30'))
+AGGREGATION_MAX_SESSIONS = int(os.environ.get('AGGREGATION_MAX_SESSIONS', '5000'))
+# Assumed length of a compressed chunk that arrives without an energy summary
+AGGREGATION_CHUNK_MS = 1000
+DEDUPE_MAX_WORDS = 8
+
+class AudioFlush:
+    __slots__ = ("audio", "duration_ms", "reason", "previous_text")
+    
+    def __init__(self, audio: bytes, duration_ms: float, reason: str, previous_text: Optional[str]):
+        self.audio = audio
+        self.duration_ms = duration_ms
+        self.reason = reason
+        self.previous_text = previous_text
+
+class SessionAudioBuffer:
+    __slots__ = ("encoding", "sample_rate", "header", "parts", "buffered_ms", "fresh_ms", "carried_overlap", "last_text", "touched")
+    
+    def __init__(self, encoding: str, sample_rate: int):
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self.header: Optional[bytes] = None
+        self.parts: List[Tuple[bytes, float]] = []
+        self.buffered_ms = 0.0
+        self.fresh_ms = 0.0  # buffered audio not yet sent to Speech
+        self.carried_overlap = False
+        self.last_text = ""
+        self.touched = time.monotonic()
+
+def dedupe_overlap(previous: Optional[str], text: str, max_words: int = DEDUPE_MAX_WORDS) -> str:
+    """Drop the leading words of ``text`` that repeat the end of ``previous``"""
+    if not previous or not text:
+        return text
+    words = text.split()
+    normalize = lambda word: re.sub(r"[^\w']", "", word.lower())
+    tail = [normalize(word) for word in previous.split()[-max_words:]]
+    head = [normalize(word) for word in words[:max_words]]
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return " ".join(words[size:])
+    return text
+
+class AudioAggregator:
+    """Per-session audio buffers flushed on pauses or a latency budget"""
+    
+    SILENT = "silent"
+    PENDING = "pending"
+    
+    def __init__(self, max_ms: float, pause_ms: float, overlap_ms: float, idle_seconds: float, max_sessions: int):
+        self.max_ms = max_ms
+        self.pause_ms = pause_ms
+        self.overlap_ms = overlap_ms
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.buffers: "OrderedDict[str, SessionAudioBuffer]" = OrderedDict()
+        self.chunks = 0
+        self.flushes: Dict[str, int] = {}
+        self.expired = 0
+        self.words_deduped = 0
+    
+    def _evict(self, now: float):
+        while self.buffers:
+            session_id, buffer = next(iter(self.buffers.items()))
+            if len(self.buffers) <= self.max_sessions and now - buffer.touched < self.idle_seconds:
+                break
+            del self.buffers[session_id]
+            if buffer.fresh_ms:
+                self.expired += 1
+    
+    def _take(self, buffer: SessionAudioBuffer, reason: str, keep_overlap: bool = False) -> AudioFlush:
+        if buffer.encoding == "LINEAR16":
+            audio = b"".join(part for part, _ in buffer.parts)
+        else:
+            audio = (buffer.header or b"") + b"".join(part for part, _ in buffer.parts)
+        flush = AudioFlush(audio, buffer.buffered_ms, reason, buffer.last_text if buffer.carried_overlap else None)
+        self.flushes[reason] = self.flushes.get(reason, 0) + 1
+        
+        carried: List[Tuple[bytes, float]] = []
+        if keep_overlap and buffer.parts:
+            if buffer.encoding == "LINEAR16":
+                size = min(len(audio), int(buffer.sample_rate * self.overlap_ms / 1000) * 2)
+                if size:
+                    carried = [(audio[-size:], size / 2 / buffer.sample_rate * 1000)]
+            else:
+                # Compressed audio can only be cut at chunk boundaries
+                carried = [buffer.parts[-1]]
+        buffer.parts = carried
+        buffer.buffered_ms = sum(ms for _, ms in carried)
+        buffer.fresh_ms = 0.0
+        buffer.carried_overlap = bool(carried)
+        return flush
+    
+    def add(
+        self,
+        session_id: str,
+        audio: bytes,
+        encoding: str,
+        sample_rate: int,
+        levels: Optional[List[float]] = None,
+        frame_ms: int = 100,
+        flush: bool = False
+    ):
+        """Buffer one raw chunk; returns SILENT, PENDING or an AudioFlush to recognise"""
+        now = time.monotonic()
+        self._evict(now)
+        self.chunks += 1
+        
+        buffer = self.buffers.get(session_id)
+        if buffer is None or buffer.encoding != encoding or buffer.sample_rate != sample_rate:
+            buffer = self.buffers[session_id] = SessionAudioBuffer(encoding, sample_rate)
+        self.buffers.move_to_end(session_id)
+        buffer.touched = now
+        
+        result = None
+        if encoding == "LINEAR16":
+            levels, frame_ms = pcm_levels(audio, sample_rate), VAD_PCM_FRAME_MS
+            duration_ms = len(audio) / 2 / sample_rate * 1000
+        else:
+            if audio.startswith(WEBM_EBML_MAGIC):
+                cluster_start = audio.find(WEBM_CLUSTER_ID)
+                if cluster_start > 0:
+                    # A new recording: its clusters restart the timeline, so
+                    # audio buffered from the previous one goes out first
+                    if buffer.fresh_ms:
+                        result = self._take(buffer, "new_stream")
+                    buffer.parts = []
+                    buffer.buffered_ms = 0.0
+                    buffer.carried_overlap = False
+                    buffer.header, audio = audio[:cluster_start], audio[cluster_start:]
+            duration_ms = len(levels) * frame_ms if levels else AGGREGATION_CHUNK_MS
+        
+        speech = True
+        trailing_silence = 0.0
+        if levels is not None:
+            speech = not VAD_ENABLED or vad.voiced_span(levels, frame_ms) is not None
+            trailing_silence = vad.trailing_silence_ms(levels, frame_ms)
+            if VAD_ENABLED:
+                vad.record(duration_ms / 1000, not speech)
+        
+        if result is not None:
+            if speech:
+                buffer.parts.append((audio, duration_ms))
+                buffer.buffered_ms += duration_ms
+                buffer.fresh_ms += duration_ms
+            return result
+        
+        if not speech:
+            # Silence after speech is a pause: send what is buffered
+            if buffer.fresh_ms:
+                return self._take(buffer, "pause")
+            return self.SILENT
+        
+        buffer.parts.append((audio, duration_ms))
+        buffer.buffered_ms += duration_ms
+        buffer.fresh_ms += duration_ms
+        if flush:
+            return self._take(buffer, "client")
+        if trailing_silence >= self.pause_ms:
+            return self._take(buffer, "pause")
+        if buffer.buffered_ms >= self.max_ms:
+            return self._take(buffer, "budget", keep_overlap=True)
+        return self.PENDING
+    
+    def flush(self, session_id: str, reason: str = "client") -> Optional[AudioFlush]:
+        """Force out whatever is buffered for the session"""
+        buffer = self.buffers.get(session_id)
+        if buffer is None or not buffer.fresh_ms:
+            return None
+        return self._take(buffer, reason)
+    
+    def pending_ms(self, session_id: str) -> float:
+        buffer = self.buffers.get(session_id)
+        return buffer.fresh_ms if buffer is not None else 0.0
+    
+    def finish(self, session_id: str, flush: AudioFlush, transcript: str) -> str:
+        """Remember the flush's transcript and return it without overlapped words"""
+        buffer = self.buffers.get(session_id)
+        if buffer is not None:
+            buffer.last_text = transcript
+        deduped = dedupe_overlap(flush.previous_text, transcript)
+        self.words_deduped += len(transcript.split()) - len(deduped.split())
+        return deduped
+    
+    def discard(self, session_id: str):
+        self.buffers.pop(session_id, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        flushes = sum(self.flushes.values())
+        return {
+            "sessions": len(self.buffers),
+            "chunks": self.chunks,
+            "flushes": flushes,
+            "flushes_by_reason": dict(self.flushes),
+            "chunks_per_flush": round(self.chunks / flushes, 2) if flushes else 0.0,
+            "expired_buffers": self.expired,
+            "words_deduped": self.words_deduped,
+        }
+
+audio_aggregator = AudioAggregator(
+    AGGREGATION_MAX_MS, AGGREGATION_PAUSE_MS, AGGREGATION_OVERLAP_MS,
+    AGGREGATION_IDLE_SECONDS, AGGREGATION_MAX_SESSIONS
+)
+
+# WebM framing. A MediaRecorder started with a timeslice emits the EBML
+# header and track info only in its first chunk; later chunks are bare
+# clusters that Google Speech cannot decode on their own.
+WEBM_EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+WEBM_CLUSTER_ID = b"\x1f\x43\xb6\x75"
+
+class WebMFrameAssembler:
+    """Prefix continuation frames with the stream's cached WebM header"""
+    
+    def __init__(self):
+        self.header: Optional[bytes] = None
+    
+    def assemble(self, frame: bytes) -> bytes:
+        if frame.startswith(WEBM_EBML_MAGIC):
+            # Self-contained recording: remember everything before the first cluster
+            cluster_start = frame.find(WEBM_CLUSTER_ID)
+            if cluster_start > 0:
+                self.header = frame[:cluster_start]
+            return frame
+        if self.header is None:
+            return frame
+        return self.header + frame
@@ -0,0 +1,82 @@
+"""Validation, request keys and the non-streaming AI answer path"""
+from fastapi import HTTPException
+from typing import Tuple
+from emergentintegrations.llm.chat import UserMessage
+import time
+from models import APIKeysModel, AIResponse, AIResponseRequest
+from metrics import time_stage, count_upstream_error
+import database
+import upstream
+from question_detector import question_classifier
+from llm import create_gemini_chat
+from context import build_ai_prompt
+from search import index_for_search
+from question_cache import normalize_question, answer_scope, lookup_cached_answer, remember_answer
+from speculative import speculation
+
+class NotAQuestion(Exception):
+    """require_question was set and the classifier rejected the utterance"""
+
+def validate_ai_response_request(input: AIResponseRequest):
+    """Validate an AI response request before any upstream work"""
+    if not input.session_id or len(input.session_id) < 10:
+        raise HTTPException(status_code=400, detail="Invalid session ID")
+    
+    if not input.question or len(input.question.strip()) < 5:
+        raise HTTPException(status_code=400, detail="Question must be at least 5 characters")
+    
+    if len(input.question) > 5000:
+        raise HTTPException(status_code=400, detail="Question too long")
+    
+    if input.require_question and not question_classifier.is_question(input.question):
+        raise NotAQuestion()
+
+def ai_request_key(input: AIResponseRequest) -> Tuple[str, str]:
+    return input.session_id, normalize_question(input.question) or input.question.strip().lower()
+
+async def produce_ai_response(input: AIResponseRequest, api_keys: APIKeysModel) -> AIResponse:
+    """Answer from the cache, a speculation or Gemini, and store the result"""
+    scope = answer_scope(api_keys)
+    cached_answer = await lookup_cached_answer(input, scope)
+    speculated = None
+    if cached_answer is None:
+        speculated = await speculation.claim(input.session_id, input.question)
+    
+    if cached_answer is not None:
+        ai_response_text = cached_answer.response
+    elif speculated is not None:
+        ai_response_text, latency_ms = speculated
+        await remember_answer(input.question, ai_response_text, latency_ms, scope)
+    else:
+        started = time.perf_counter()
+        
+        # Create user message with context and question
+        full_prompt = await build_ai_prompt(input.session_id, input.question, api_keys)
+        user_message = UserMessage(text=full_prompt)
+        
+        # Get AI response; each attempt (a hedge included) gets its own chat
+        try:
+            with time_stage("gemini"):
+                ai_response_text = await upstream.gemini_guard.call(
+                    api_keys.gemini_api_key,
+                    lambda: create_gemini_chat(api_keys.gemini_api_key, input.session_id).send_message(user_message)
+                )
+        except HTTPException:
+            raise
+        except Exception as e:
+            count_upstream_error("gemini", type(e).__name__)
+            raise
+        await remember_answer(input.question, ai_response_text, (time.perf_counter() - started) * 1000, scope)
+    
+    # Save the AI response
+    response_obj = AIResponse(
+        session_id=input.session_id,
+        question=input.question,
+        response=ai_response_text,
+        cached=cached_answer is not None
+    )
+    with time_stage("mongo_write"):
+        await database.db.ai_responses.insert_one(response_obj.dict())
+    index_for_search("ai_responses", response_obj.dict())
+    
+    return response_obj
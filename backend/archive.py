@@ -0,0 +1,290 @@
+"""Cold-session archival into compressed blobs, with restore on access"""
+import os
+import logging
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta
+import asyncio
+import time
+import json
+import zlib
+import database
+from sessions import session_cache, get_cached_session, invalidate_session
+from listing import dumps_json
+import write_behind
+from write_behind import only_duplicates
+from context import bump_context_version
+from search import SEARCH_SOURCES, search_index, index_for_search
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Session lifecycle. Ended sessions idle for ARCHIVE_AFTER_SECONDS are packed,
+# with their transcripts, AI responses and summary, into one zlib-compressed
+# document in session_archives and removed from the hot collections; the
+# session document stays behind with archived_at set. Listing an archived
+# session's transcripts or responses restores it. Sessions still active
+# SESSION_MAX_HOURS after creation are ended automatically. Both are opt-in.
+ARCHIVE_ENABLED = os.environ.get('ARCHIVE_ENABLED', 'false').lower() == 'true'
+ARCHIVE_AFTER_SECONDS = float(os.environ.get('ARCHIVE_AFTER_SECONDS', '3600'))
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '300'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '50'))
+SESSION_MAX_HOURS = float(os.environ.get('SESSION_MAX_HOURS', '0'))
+ARCHIVE_LEASE_SECONDS = 600
+ARCHIVE_PACK_ATTEMPTS = 2
+ARCHIVE_MAX_BYTES = 15 * 1024 * 1024  # under Mongo's 16 MB document limit
+ARCHIVED_COLLECTIONS = ("transcripts", "ai_responses", "session_summaries")
+# What identifies a document when merging hot rows into an existing archive
+ARCHIVE_MERGE_KEYS = {"transcripts": "id", "ai_responses": "id", "session_summaries": "session_id"}
+ARCHIVE_DATETIME_FIELDS = ("timestamp", "updated_at", "summarized_through")
+
+def merge_archive(archived: Dict[str, List[Dict[str, Any]]], hot: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Union of an existing archive and the hot rows; hot copies win"""
+    merged = {}
+    for name in ARCHIVED_COLLECTIONS:
+        key = ARCHIVE_MERGE_KEYS[name]
+        docs = {doc.get(key): doc for doc in archived.get(name, [])}
+        docs.update((doc.get(key), doc) for doc in hot.get(name, []))
+        merged[name] = list(docs.values())
+    return merged
+
+class SessionArchiver:
+    """Moves ended sessions to cold storage and brings them back on demand.
+
+    Each step is idempotent and recorded in ``archive_state`` (``packed``
+    once the archive document is written, ``archived`` once the hot copies
+    are deleted), so a crash or a second worker never loses data: a claim
+    lease keeps two archivers off the same session, and a half-archived
+    session is packed again on the next run. Hot rows are merged into an
+    existing archive (a restored session keeps it), never replace it, and
+    only the exact rows that were packed are deleted; rows written after
+    packing keep the session ``packed`` until a later run picks them up.
+    """
+    
+    def __init__(self, enabled: bool, after_seconds: float, interval: float, batch_size: int, max_session_hours: float):
+        self.enabled = enabled
+        self.after_seconds = after_seconds
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_session_hours = max_session_hours
+        self._task: Optional[asyncio.Task] = None
+        self._restoring: Dict[str, asyncio.Lock] = {}
+        self.auto_ended = 0
+        self.archived = 0
+        self.restored = 0
+        self.deferred = 0
+        self.failures = 0
+        self.raw_bytes = 0
+        self.packed_bytes = 0
+        self.last_run_ms = 0.0
+    
+    @property
+    def needed(self) -> bool:
+        """Whether there is anything for the background loop to do"""
+        return self.enabled or self.max_session_hours > 0
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Session archiver run failed: {str(e)}")
+    
+    async def run_once(self) -> int:
+        """End stale sessions, then archive one batch of candidates if enabled"""
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        if self.max_session_hours > 0:
+            # Cached copies on other workers notice within SESSION_CACHE_TTL
+            result = await database.db.interview_sessions.update_many(
+                {"is_active": True, "created_at": {"$lte": now - timedelta(hours=self.max_session_hours)}},
+                {"$set": {"is_active": False, "ended_at": now}}
+            )
+            self.auto_ended += result.modified_count
+        if not self.enabled:
+            self.last_run_ms = round((time.perf_counter() - started) * 1000, 2)
+            return 0
+        
+        cutoff = now - timedelta(seconds=self.after_seconds)
+        candidates = await database.db.interview_sessions.find({
+            "is_active": False,
+            "ended_at": {"$lte": cutoff},
+            "archived_at": None,
+            "$or": [{"restored_at": None}, {"restored_at": {"$lte": cutoff}}],
+        }, {"_id": 0}).limit(self.batch_size).to_list(self.batch_size)
+        
+        archived = 0
+        for session in candidates:
+            try:
+                archived += await self.archive(session)
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Failed to archive session {session['id']}: {str(e)}")
+                await database.db.interview_sessions.update_one({"id": session["id"]}, {"$unset": {"archive_lease": ""}})
+        self.last_run_ms = round((time.perf_counter() - started) * 1000, 2)
+        return archived
+    
+    async def archive(self, session: Dict[str, Any]) -> bool:
+        session_id = session["id"]
+        if write_behind.transcript_writer.pending_for(session_id):
+            self.deferred += 1
+            return False
+        now = datetime.utcnow()
+        claim = await database.db.interview_sessions.update_one(
+            {"id": session_id, "archived_at": None,
+             "$or": [{"archive_lease": None}, {"archive_lease": {"$lte": now}}]},
+            {"$set": {"archive_lease": now + timedelta(seconds=ARCHIVE_LEASE_SECONDS)}}
+        )
+        if not claim.modified_count:
+            return False
+        
+        for _ in range(ARCHIVE_PACK_ATTEMPTS):
+            outcome = await self._pack(session, now)
+            if outcome is not False:
+                break
+        if not outcome:
+            # Too large, or still receiving rows: a later run merges the rest in
+            self.deferred += 1
+            await database.db.interview_sessions.update_one({"id": session_id}, {"$unset": {"archive_lease": ""}})
+            return False
+        search_index.discard_session(session_id)
+        await database.db.interview_sessions.update_one({"id": session_id}, {
+            "$set": {"archived_at": now, "archive_state": "archived"},
+            "$unset": {"archive_lease": "", "restored_at": ""},
+        })
+        invalidate_session(session_id)
+        await bump_context_version(session_id)
+        self.archived += 1
+        return True
+    
+    async def _pack(self, session: Dict[str, Any], now: datetime) -> Optional[bool]:
+        """Merge the hot rows into the archive and delete them.
+
+        True once nothing is left hot, False if rows arrived meanwhile, None
+        when the archive would be too large.
+        """
+        session_id = session["id"]
+        
+        hot = await asyncio.gather(*(
+            database.db[name].find({"session_id": session_id}).to_list(None)
+            for name in ARCHIVED_COLLECTIONS
+        ))
+        # Exactly what gets deleted once the archive is written. Summaries are
+        # updated in place, so their filter also pins the packed version.
+        packed_rows: Dict[str, List[Dict[str, Any]]] = {}
+        for name, docs in zip(ARCHIVED_COLLECTIONS, hot):
+            packed_rows[name] = [
+                {"_id": doc.pop("_id"), "updated_at": doc.get("updated_at")} if name == "session_summaries"
+                else {"_id": doc.pop("_id")}
+                for doc in docs
+            ]
+        existing = await database.db.session_archives.find_one({"session_id": session_id}, {"_id": 0, "data": 1})
+        contents = dict(zip(ARCHIVED_COLLECTIONS, hot))
+        if existing is not None:
+            # A restored session: hot rows the TTL already purged are still in here
+            contents = merge_archive(json.loads(await asyncio.to_thread(zlib.decompress, existing["data"])), contents)
+        raw = dumps_json(contents)
+        packed = await asyncio.to_thread(zlib.compress, raw, 6)
+        if len(packed) > ARCHIVE_MAX_BYTES:
+            logging.warning(f"Session {session_id} is too large to archive ({len(packed)} bytes compressed)")
+            return None
+        await database.db.session_archives.replace_one({"session_id": session_id}, {
+            "session_id": session_id,
+            "user_id": session.get("user_id"),
+            "created_at": session.get("created_at"),
+            "ended_at": session.get("ended_at"),
+            "archived_at": now,
+            "codec": "zlib+json",
+            "counts": {name: len(contents.get(name, [])) for name in ARCHIVED_COLLECTIONS},
+            "raw_bytes": len(raw),
+            "data": packed,
+        }, upsert=True)
+        await database.db.interview_sessions.update_one({"id": session_id}, {"$set": {"archive_state": "packed"}})
+        self.raw_bytes += len(raw)
+        self.packed_bytes += len(packed)
+        
+        await asyncio.gather(*(
+            database.db[name].delete_one(row) for name, rows in packed_rows.items() if name == "session_summaries" for row in rows
+        ), *(
+            database.db[name].delete_many({"_id": {"$in": [row["_id"] for row in rows]}})
+            for name, rows in packed_rows.items() if rows and name != "session_summaries"
+        ))
+        # Rows written after packing (WebSocket, background persists, a worker
+        # with a stale session cache) were not deleted
+        leftovers = await asyncio.gather(*(
+            database.db[name].find_one({"session_id": session_id}, {"_id": 1}) for name in ARCHIVED_COLLECTIONS
+        ))
+        return all(doc is None for doc in leftovers)
+    
+    async def restore(self, session_id: str) -> bool:
+        """Copy an archived session back into the hot collections"""
+        lock = self._restoring.setdefault(session_id, asyncio.Lock())
+        try:
+            async with lock:
+                session = await database.db.interview_sessions.find_one({"id": session_id}, {"_id": 0, "archive_state": 1})
+                # A packed session may have lost hot rows to an interrupted archive run
+                if not session or session.get("archive_state") not in ("packed", "archived"):
+                    return False
+                archive = await database.db.session_archives.find_one({"session_id": session_id}, {"_id": 0, "data": 1})
+                if archive is None:
+                    logging.warning(f"Archive for session {session_id} is gone (past retention?)")
+                    return False
+                
+                contents = json.loads(await asyncio.to_thread(zlib.decompress, archive["data"]))
+                for name, docs in contents.items():
+                    if not docs:
+                        continue
+                    for doc in docs:
+                        for field in ARCHIVE_DATETIME_FIELDS:
+                            if isinstance(doc.get(field), str):
+                                doc[field] = datetime.fromisoformat(doc[field])
+                    try:
+                        await database.db[name].insert_many(docs, ordered=False)
+                    except Exception as e:
+                        # A previous, interrupted restore already put some back
+                        if not only_duplicates(e):
+                            raise
+                    if name in SEARCH_SOURCES:
+                        for doc in docs:
+                            index_for_search(name, doc)
+                
+                await database.db.interview_sessions.update_one({"id": session_id}, {
+                    "$set": {"restored_at": datetime.utcnow()},
+                    "$unset": {"archived_at": "", "archive_state": ""},
+                })
+                session_cache.pop(session_id)
+                self.restored += 1
+                return True
+        finally:
+            if not lock.locked():
+                self._restoring.pop(session_id, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None,
+            "session_max_hours": self.max_session_hours,
+            "auto_ended": self.auto_ended,
+            "archived": self.archived,
+            "restored": self.restored,
+            "deferred": self.deferred,
+            "failures": self.failures,
+            "compression_ratio": round(self.raw_bytes / self.packed_bytes, 2) if self.packed_bytes else 0.0,
+            "last_run_ms": self.last_run_ms,
+        }
+
+session_archiver = SessionArchiver(
+    ARCHIVE_ENABLED, ARCHIVE_AFTER_SECONDS, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_BATCH_SIZE, SESSION_MAX_HOURS
+)
+
+async def ensure_restored(session_id: str):
+    """Restore an archived session before reading its transcripts or responses"""
+    session = await get_cached_session(session_id)
+    if session and session.get("archive_state") in ("packed", "archived"):
+        await session_archiver.restore(session_id)
@@ -0,0 +1,42 @@
+"""Close codes, auth timeout and message throttling for the audio WebSocket"""
+import os
+import time
+import config  # noqa: F401  (loads .env before the settings below)
+
+# WebSocket close codes (application range)
+WS_CLOSE_UNAUTHORIZED = 4401
+WS_CLOSE_NOT_FOUND = 4404
+WS_CLOSE_BAD_REQUEST = 4400
+WS_CLOSE_ENDED = 4409
+WS_CLOSE_RATE_LIMITED = 4429
+
+# Audio socket limits. The session token arrives in the first message, so it
+# never lands in access logs; each connection may then send
+# WS_MESSAGES_PER_SECOND messages on average with bursts of WS_MESSAGE_BURST,
+# and is_active is re-read from Mongo at most every WS_SESSION_RECHECK_SECONDS
+# so a session ended on another worker stops accepting audio.
+WS_AUTH_TIMEOUT_SECONDS = float(os.environ.get('WS_AUTH_TIMEOUT_SECONDS', '10'))
+WS_MESSAGES_PER_SECOND = float(os.environ.get('WS_MESSAGES_PER_SECOND', '5'))
+WS_MESSAGE_BURST = int(os.environ.get('WS_MESSAGE_BURST', '20'))
+WS_SESSION_RECHECK_SECONDS = float(os.environ.get('WS_SESSION_RECHECK_SECONDS', '5'))
+
+class MessageThrottle:
+    """Token bucket for the messages of one connection"""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+    
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class SessionEnded(Exception):
+    """The socket's session was ended while audio was still arriving"""
@@ -0,0 +1,96 @@
+"""API key credentials: opaque session tokens and the bearer dependencies"""
+from fastapi import HTTPException, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import os
+from typing import Optional
+import json
+import base64
+from cryptography.fernet import Fernet, InvalidToken
+import hashlib
+import hmac
+import secrets
+from models import APIKeysModel
+import shared_state
+from shared_state import state_key
+from ttl_cache import TTLCache
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Security configuration
+JWT_SECRET_DEFAULT = 'your-super-secret-jwt-key-here'
+JWT_SECRET = os.environ.get('JWT_SECRET_KEY', JWT_SECRET_DEFAULT)
+
+# Security
+security = HTTPBearer(auto_error=False)
+
+# Opaque session tokens. /validate-keys hands out a short random token that
+# maps to the encrypted keys in state_store, so hot endpoints resolve the
+# bearer credential with one lookup instead of decoding a key blob.
+SESSION_TOKEN_PREFIX = "ict_"
+SESSION_TOKEN_TTL = float(os.environ.get('SESSION_TOKEN_TTL', '86400'))
+KEY_VALIDATION_TTL = float(os.environ.get('KEY_VALIDATION_TTL', '3600'))
+TOKEN_ENCRYPTION_KEY = os.environ.get('TOKEN_ENCRYPTION_KEY')
+if not TOKEN_ENCRYPTION_KEY:
+    # A key derived from the public default secret would let anyone decrypt stored API keys
+    if JWT_SECRET == JWT_SECRET_DEFAULT:
+        raise RuntimeError(
+            "Set TOKEN_ENCRYPTION_KEY (a Fernet key) or a private JWT_SECRET_KEY before starting the server"
+        )
+    TOKEN_ENCRYPTION_KEY = base64.urlsafe_b64encode(hashlib.sha256(JWT_SECRET.encode()).digest()).decode()
+token_cipher = Fernet(TOKEN_ENCRYPTION_KEY)
+# Short local TTL so revoked or expired tokens stop working on every worker soon
+resolved_tokens = TTLCache(maxsize=10000, ttl=60)
+
+def secret_digest(value: str) -> str:
+    """HMAC of a secret, safe to use as a lookup key"""
+    return hmac.new(JWT_SECRET.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+async def issue_session_token(keys: APIKeysModel) -> str:
+    token = SESSION_TOKEN_PREFIX + secrets.token_urlsafe(24)
+    encrypted = token_cipher.encrypt(json.dumps(keys.dict()).encode()).decode()
+    await shared_state.state_store.set(state_key("token", secret_digest(token)), encrypted, ttl=SESSION_TOKEN_TTL)
+    return token
+
+async def resolve_session_token(token: str) -> APIKeysModel:
+    digest = secret_digest(token)
+    keys = resolved_tokens.get(digest)
+    if keys is not None:
+        return keys
+    encrypted = await shared_state.state_store.get(state_key("token", digest))
+    if encrypted is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    try:
+        keys = APIKeysModel(**json.loads(token_cipher.decrypt(encrypted.encode())))
+    except (InvalidToken, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid or expired session token")
+    resolved_tokens.set(digest, keys)
+    return keys
+
+def decode_api_keys(token: str) -> APIKeysModel:
+    """Decode the base64 JSON key blob used as the bearer credential"""
+    try:
+        keys_data = json.loads(base64.b64decode(token).decode())
+        return APIKeysModel(**keys_data)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail="Invalid API keys format")
+
+async def resolve_api_keys(credential: str) -> APIKeysModel:
+    """Accept either a session token or the legacy base64 key blob"""
+    if credential.startswith(SESSION_TOKEN_PREFIX):
+        return await resolve_session_token(credential)
+    return decode_api_keys(credential)
+
+async def get_api_keys(credentials: HTTPAuthorizationCredentials = Depends(security)) -> APIKeysModel:
+    """Extract API keys from request headers or session"""
+    if not credentials:
+        raise HTTPException(status_code=401, detail="API keys required")
+    
+    return await resolve_api_keys(credentials.credentials)
+
+async def get_optional_api_keys(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[APIKeysModel]:
+    """API keys when the caller sent them, for endpoints that work without"""
+    if not credentials:
+        return None
+    try:
+        return await resolve_api_keys(credentials.credentials)
+    except HTTPException:
+        return None
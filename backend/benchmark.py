@@ -0,0 +1,897 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark harness for the Interview Copilot API
+
+Runs the FastAPI app in-process (no network, no real API keys) with pluggable
+fakes for Gemini (LlmChat), the Google Speech REST endpoint and MongoDB, then
+reports throughput and p50/p95/p99 latency per endpoint at a configurable
+concurrency. Results are written as JSON so releases can be diffed:
+
+    cd backend
+    python benchmark.py endpoints --mongo mock --requests 500 --concurrency 50 --output bench.json
+    python benchmark.py endpoints --mongo mock --compare bench.json
+    python benchmark.py serialization --rows 1000 10000
+    python benchmark.py search --entries 10000 50000
+
+`--mongo mock` needs `pip install mongomock-motor`; `--mongo-url` points the
+run at a local MongoDB instead (a throwaway database is created and dropped).
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# The harness mints its own session tokens; any encryption key will do
+os.environ.setdefault("TOKEN_ENCRYPTION_KEY", base64.urlsafe_b64encode(os.urandom(32)).decode())
+
+SCENARIOS = [
+    "create_session",
+    "get_session",
+    "add_transcript",
+    "list_transcripts",
+    "transcribe_audio",
+    "transcribe_audio_raw",
+    "ai_response",
+    "ai_response_stream",
+]
+
+FAKE_KEYS = {
+    "google_speech_api_key": "fake-speech-key-0123456789",
+    "gemini_api_key": "fake-gemini-key-0123456789",
+}
+
+QUESTIONS = [
+    "Tell me about yourself.",
+    "What are your greatest strengths?",
+    "Describe a time you resolved a conflict within your team.",
+    "How would you design a rate limiter for a public API?",
+    "Why do you want to work here?",
+    "Walk me through a project you are proud of.",
+]
+
+
+class FaultInjector:
+    """Configurable latency (with jitter and a slow tail) and error injection for a fake"""
+
+    def __init__(self, name: str, latency_ms: float, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0,
+                 slow_rate: float = 0.0, slow_ms: float = 0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.injected_errors = 0
+        self.injected_slow = 0
+
+    async def wait(self, scale: float = 1.0):
+        delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) * scale if self.jitter_ms else self.latency_ms * scale
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            # Straggler: what hedging and deadlines are for
+            self.injected_slow += 1
+            delay += self.slow_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+    def should_fail(self) -> bool:
+        self.calls += 1
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.injected_errors += 1
+            return True
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "injected_errors": self.injected_errors, "injected_slow": self.injected_slow}
+
+
+class InjectedUpstreamError(RuntimeError):
+    """Fake Gemini failure, shaped like the 503 a real client raises"""
+
+    status_code = 503
+
+
+def make_fake_llm(fault: FaultInjector, tokens: int = 60, token_interval_ms: float = 5.0):
+    """Build a drop-in LlmChat replacement bound to the given fault injector.
+
+    ``send_message`` waits the configured latency and returns the whole
+    answer; ``stream_message`` waits the latency once (time to first token)
+    and then yields ``tokens`` words ``token_interval_ms`` apart.
+    """
+
+    class FakeLlmChat:
+        def __init__(self, api_key: str, session_id: str, system_message: str):
+            self.session_id = session_id
+            self.max_tokens = 1024
+
+        def with_model(self, provider: str, model: str):
+            return self
+
+        def with_max_tokens(self, max_tokens: int):
+            self.max_tokens = max_tokens
+            return self
+
+        def _words(self, message) -> List[str]:
+            seed = len(getattr(message, "text", ""))
+            return [f"word{(seed + i) % 97}" for i in range(min(tokens, self.max_tokens))]
+
+        async def send_message(self, message) -> str:
+            await fault.wait()
+            if fault.should_fail():
+                raise InjectedUpstreamError("Injected Gemini failure")
+            await asyncio.sleep(tokens * token_interval_ms / 1000)
+            return " ".join(self._words(message))
+
+        async def stream_message(self, message):
+            await fault.wait()
+            if fault.should_fail():
+                raise InjectedUpstreamError("Injected Gemini failure")
+            for i, word in enumerate(self._words(message)):
+                if i:
+                    await asyncio.sleep(token_interval_ms / 1000)
+                yield word + " "
+
+    return FakeLlmChat
+
+
+class FakeSpeechResponse:
+    def __init__(self, status: int, body: Dict[str, Any]):
+        self.status = status
+        self._body = body
+
+    async def text(self) -> str:
+        return json.dumps(self._body)
+
+    async def json(self) -> Dict[str, Any]:
+        return self._body
+
+
+class FakeSpeechCall:
+    def __init__(self, fault: FaultInjector, payload_size: int):
+        self.fault = fault
+        self.payload_size = payload_size
+
+    async def __aenter__(self) -> FakeSpeechResponse:
+        await self.fault.wait()
+        if self.fault.should_fail():
+            return FakeSpeechResponse(503, {"error": {"code": 503, "message": "Injected Speech failure"}})
+        return FakeSpeechResponse(200, {"results": [{"alternatives": [{
+            "transcript": random.choice(QUESTIONS),
+            "confidence": 0.93,
+        }]}]})
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSpeechClient:
+    """Stands in for the pooled aiohttp session used for Speech REST calls"""
+
+    closed = False
+    connector = None
+
+    def __init__(self, fault: FaultInjector):
+        self.fault = fault
+        self.bytes_sent = 0
+
+    def post(self, url: str, data: Optional[bytes] = None, json: Any = None, **kwargs) -> FakeSpeechCall:
+        size = len(data) if data is not None else 0
+        self.bytes_sent += size
+        return FakeSpeechCall(self.fault, size)
+
+    async def close(self):
+        self.closed = True
+
+
+class FaultyCursor:
+    """Motor cursor proxy adding latency to the calls that hit the server"""
+
+    def __init__(self, cursor, fault: FaultInjector):
+        self._cursor = cursor
+        self._fault = fault
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name in ("sort", "limit", "skip", "batch_size"):
+            def chain(*args, **kwargs):
+                attr(*args, **kwargs)
+                return self
+            return chain
+        return attr
+
+    async def to_list(self, length=None):
+        await self._fault.wait()
+        if self._fault.should_fail():
+            raise RuntimeError("Injected MongoDB failure")
+        return await self._cursor.to_list(length)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._fault.wait()
+        if self._fault.should_fail():
+            raise RuntimeError("Injected MongoDB failure")
+        async for doc in self._cursor:
+            yield doc
+
+
+class FaultyCollection:
+    ASYNC_METHODS = {
+        "insert_one", "insert_many", "find_one", "update_one", "update_many",
+        "delete_one", "delete_many", "count_documents", "replace_one",
+        "find_one_and_update", "bulk_write",
+    }
+
+    def __init__(self, collection, fault: FaultInjector):
+        self._collection = collection
+        self._fault = fault
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name == "find" or name == "aggregate":
+            return lambda *args, **kwargs: FaultyCursor(attr(*args, **kwargs), self._fault)
+        if name in self.ASYNC_METHODS:
+            async def call(*args, **kwargs):
+                await self._fault.wait()
+                if self._fault.should_fail():
+                    raise RuntimeError("Injected MongoDB failure")
+                return await attr(*args, **kwargs)
+            return call
+        return attr
+
+
+class FaultyDatabase:
+    """Database proxy whose collections inject latency and errors"""
+
+    def __init__(self, database, fault: FaultInjector):
+        self._database = database
+        self._fault = fault
+
+    def __getitem__(self, name):
+        return FaultyCollection(self._database[name], self._fault)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies_ms: List[float], statuses: Dict[str, int], duration_s: float, extra: Optional[Dict[str, List[float]]] = None) -> Dict[str, Any]:
+    values = sorted(latencies_ms)
+    total = len(values)
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    result = {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "duration_s": round(duration_s, 3),
+        "throughput_rps": round(total / duration_s, 2) if duration_s else 0.0,
+        "latency_ms": {
+            "min": round(values[0], 3) if values else 0.0,
+            "mean": round(sum(values) / total, 3) if total else 0.0,
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": round(values[-1], 3) if values else 0.0,
+        },
+        "status_counts": statuses,
+    }
+    for name, samples in (extra or {}).items():
+        samples = sorted(samples)
+        result[name] = {
+            "p50": round(percentile(samples, 50), 3),
+            "p95": round(percentile(samples, 95), 3),
+            "p99": round(percentile(samples, 99), 3),
+        }
+    return result
+
+
+def fake_audio(size: int) -> bytes:
+    # WebM EBML magic followed by filler; the fake Speech endpoint ignores content
+    return b"\x1a\x45\xdf\xa3" + os.urandom(max(size - 4, 0))
+
+
+class BenchmarkRunner:
+    def __init__(self, server, client, args):
+        self.server = server
+        self.client = client
+        self.args = args
+        self.sessions: List[str] = []
+        self.auth = {"Authorization": "Bearer " + base64.b64encode(json.dumps(FAKE_KEYS).encode()).decode()}
+        self.audio = fake_audio(args.audio_bytes)
+        self.audio_b64 = base64.b64encode(self.audio).decode()
+
+    async def setup(self):
+        for _ in range(self.args.sessions):
+            response = await self.client.post("/api/interview/session", json={"user_id": "bench"})
+            response.raise_for_status()
+            session_id = response.json()["id"]
+            self.sessions.append(session_id)
+            for i in range(self.args.seed_transcripts):
+                await self.client.post("/api/interview/transcript", json={
+                    "session_id": session_id,
+                    "text": QUESTIONS[i % len(QUESTIONS)],
+                    "speaker": "interviewer",
+                }, headers=self.auth)
+
+    def session(self, i: int) -> str:
+        return self.sessions[i % len(self.sessions)]
+
+    def question(self, i: int) -> str:
+        if self.args.answer_cache:
+            return QUESTIONS[i % len(QUESTIONS)]
+        return f"{QUESTIONS[i % len(QUESTIONS)]} (variant {uuid.uuid4().hex[:8]})"
+
+    async def request(self, scenario: str, i: int):
+        """Issue one request; returns (status, extra metrics)"""
+        client = self.client
+        if scenario == "create_session":
+            response = await client.post("/api/interview/session", json={"user_id": "bench"})
+        elif scenario == "get_session":
+            response = await client.get(f"/api/interview/session/{self.session(i)}")
+        elif scenario == "add_transcript":
+            response = await client.post("/api/interview/transcript", json={
+                "session_id": self.session(i),
+                "text": QUESTIONS[i % len(QUESTIONS)],
+                "speaker": "interviewer",
+            }, headers=self.auth)
+        elif scenario == "list_transcripts":
+            response = await client.get(f"/api/interview/transcript/{self.session(i)}")
+        elif scenario == "transcribe_audio":
+            response = await client.post("/api/transcribe-audio", json={
+                "session_id": self.session(i),
+                "audio_data": self.audio_b64,
+                "audio_format": "webm",
+                "sample_rate": 16000,
+            }, headers=self.auth)
+        elif scenario == "transcribe_audio_raw":
+            response = await client.post(
+                f"/api/transcribe-audio/raw?session_id={self.session(i)}&sample_rate=16000",
+                content=self.audio,
+                headers={**self.auth, "Content-Type": "application/octet-stream"},
+            )
+        elif scenario == "ai_response":
+            response = await client.post("/api/interview/ai-response", json={
+                "session_id": self.session(i),
+                "question": self.question(i),
+                "bypass_cache": not self.args.answer_cache,
+            }, headers=self.auth)
+        elif scenario == "ai_response_stream":
+            extra = {}
+            async with client.stream("POST", "/api/interview/ai-response/stream", json={
+                "session_id": self.session(i),
+                "question": self.question(i),
+                "bypass_cache": not self.args.answer_cache,
+            }, headers=self.auth) as response:
+                status = str(response.status_code)
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: ") and event == "done":
+                        extra["ttft_ms"] = json.loads(line[6:])["timings"]["ttft_ms"]
+                    elif event == "error":
+                        status = "stream_error"
+            return status, extra
+        else:
+            raise ValueError(f"Unknown scenario: {scenario}")
+        return str(response.status_code), {}
+
+    async def run_scenario(self, scenario: str) -> Dict[str, Any]:
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        extra: Dict[str, List[float]] = {}
+        counter = iter(range(self.args.requests))
+
+        async def worker():
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    status, metrics = await self.request(scenario, i)
+                except Exception as e:
+                    status, metrics = f"exception:{type(e).__name__}", {}
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+                for name, value in metrics.items():
+                    extra.setdefault(name, []).append(value)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        return summarize(latencies, statuses, time.perf_counter() - started, extra)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+async def open_database(args):
+    """Return (client, database, cleanup) for the selected Mongo backend"""
+    db_name = f"icp_bench_{uuid.uuid4().hex[:8]}"
+    if args.mongo == "mock":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--mongo mock requires mongomock-motor (pip install mongomock-motor)")
+        mongo_client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo_client = AsyncIOMotorClient(args.mongo_url)
+
+    async def cleanup():
+        if args.mongo != "mock":
+            await mongo_client.drop_database(db_name)
+            mongo_client.close()
+
+    return mongo_client, mongo_client[db_name], cleanup
+
+
+async def run_endpoints(args) -> Dict[str, Any]:
+    import httpx
+    import database
+    import http_pool
+    import llm
+    import server
+
+    llm_fault = FaultInjector("gemini", args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate, seed=1,
+                              slow_rate=args.llm_slow_rate, slow_ms=args.llm_slow_ms)
+    speech_fault = FaultInjector("speech", args.speech_latency_ms, args.speech_jitter_ms, args.speech_error_rate, seed=2,
+                                 slow_rate=args.speech_slow_rate, slow_ms=args.speech_slow_ms)
+    mongo_fault = FaultInjector("mongo", args.mongo_latency_ms, args.mongo_jitter_ms, args.mongo_error_rate, seed=3,
+                                slow_rate=args.mongo_slow_rate, slow_ms=args.mongo_slow_ms)
+
+    mongo_client, bench_db, cleanup = await open_database(args)
+    speech_client = FakeSpeechClient(speech_fault)
+
+    # Swap the upstreams for fakes and take rate limiting out of the picture
+    llm.llm_chat_factory = make_fake_llm(llm_fault, args.llm_tokens, args.llm_token_interval_ms)
+    http_pool.get_http_client = lambda: speech_client
+    database.client = mongo_client
+    database.db = FaultyDatabase(bench_db, mongo_fault)
+    server.limiter.enabled = False
+    try:
+        await database.ensure_indexes()
+    except Exception as e:
+        print(f"Index creation skipped: {e}")
+
+    transport = httpx.ASGITransport(app=server.app)
+    results: Dict[str, Any] = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            runner = BenchmarkRunner(server, client, args)
+            await runner.setup()
+            for scenario in args.scenarios:
+                results[scenario] = await runner.run_scenario(scenario)
+                print_row(scenario, results[scenario])
+            stats = (await client.get("/api/stats")).json()
+    finally:
+        await cleanup()
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("func", "compare", "output")},
+        },
+        "results": results,
+        "fakes": {
+            "gemini": llm_fault.stats(),
+            "speech": {**speech_fault.stats(), "bytes_sent": speech_client.bytes_sent},
+            "mongo": mongo_fault.stats(),
+        },
+        "server_stats": stats,
+    }
+
+
+def print_header():
+    print(f"{'scenario':<22}{'reqs':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print("-" * 75)
+
+
+def print_row(scenario: str, result: Dict[str, Any]):
+    latency = result["latency_ms"]
+    print(f"{scenario:<22}{result['requests']:>7}{result['errors']:>6}{result['throughput_rps']:>10.1f}"
+          f"{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}")
+
+
+def compare(report: Dict[str, Any], baseline_path: str):
+    """Print per-scenario changes against a previously saved report"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def delta(new: float, old: float) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('git_revision') or 'unknown revision'})")
+    print(f"{'scenario':<22}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    print("-" * 62)
+    for scenario, result in report["results"].items():
+        old = baseline["results"].get(scenario)
+        if old is None:
+            print(f"{scenario:<22}{'(new)':>10}")
+            continue
+        print(f"{scenario:<22}"
+              f"{delta(result['throughput_rps'], old['throughput_rps']):>10}"
+              f"{delta(result['latency_ms']['p50'], old['latency_ms']['p50']):>10}"
+              f"{delta(result['latency_ms']['p95'], old['latency_ms']['p95']):>10}"
+              f"{delta(result['latency_ms']['p99'], old['latency_ms']['p99']):>10}")
+
+
+def write_report(report: Dict[str, Any], args):
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+def command_endpoints(args):
+    print(f"Benchmarking {len(args.scenarios)} scenarios: {args.requests} requests each at concurrency {args.concurrency}\n")
+    print_header()
+    report = asyncio.run(run_endpoints(args))
+    upstreams = report["server_stats"].get("upstreams", {})
+    for name, stats in upstreams.items():
+        breakers = stats["breakers"]
+        print(f"{name}: breakers open {breakers['open']}/{breakers['keys']} keys (opened {breakers['opened']}, "
+              f"rejected {breakers['rejected']}), timeouts {stats['timeouts']}, "
+              f"hedges {stats['hedges']} ({stats['hedge_wins']} won), p95 {stats['latency_p95_ms']} ms")
+    write_report(report, args)
+
+
+def evaluate_question_detector(args) -> Dict[str, Any]:
+    """Score the held-out split; the training corpus is reported as in-sample"""
+    from question_detector import QuestionClassifier
+
+    def load(path: str) -> List[Dict[str, Any]]:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    training = load(args.corpus)
+    holdout = load(args.holdout)
+
+    classifier = QuestionClassifier(args.threshold)
+    timings = []
+
+    def score_all(corpus, repeat: int) -> List[Tuple[Dict[str, Any], float]]:
+        scored = []
+        for row in corpus:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                score = classifier.score(row["text"])
+            timings.append((time.perf_counter() - started) / repeat * 1e6)
+            scored.append((row, score))
+        return scored
+
+    scored = score_all(holdout, args.repeat)
+    training_scored = score_all(training, 1)
+
+    def confusion(scored, threshold: float) -> Dict[str, Any]:
+        tp = sum(1 for row, score in scored if score >= threshold and row["label"])
+        fp = sum(1 for row, score in scored if score >= threshold and not row["label"])
+        fn = sum(1 for row, score in scored if score < threshold and row["label"])
+        tn = len(scored) - tp - fp - fn
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        return {
+            "threshold": threshold,
+            "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        }
+
+    timings.sort()
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "corpus": args.corpus,
+            "holdout": args.holdout,
+            "examples": len(holdout),
+            "positives": sum(1 for row in holdout if row["label"]),
+            "training_examples": len(training),
+        },
+        "results": confusion(scored, args.threshold),
+        "training_results": confusion(training_scored, args.threshold),
+        "sweep": [confusion(scored, threshold / 10) for threshold in range(1, 10)],
+        "latency_us": {
+            "p50": round(percentile(timings, 50), 2),
+            "p99": round(percentile(timings, 99), 2),
+        },
+        "errors": [
+            {"text": row["text"], "label": row["label"], "score": round(score, 4)}
+            for row, score in scored if (score >= args.threshold) != bool(row["label"])
+        ],
+    }
+
+
+def command_question_detector(args):
+    report = evaluate_question_detector(args)
+    meta, result = report["meta"], report["results"]
+    training = report["training_results"]
+    print(f"Question detector on {meta['examples']} held-out examples ({meta['positives']} questions), threshold {args.threshold}")
+    print(f"precision {result['precision']:.3f}  recall {result['recall']:.3f}  f1 {result['f1']:.3f}  "
+          f"(tp {result['tp']}, fp {result['fp']}, fn {result['fn']}, tn {result['tn']})")
+    print(f"in-sample on {meta['training_examples']} training examples: precision {training['precision']:.3f}  "
+          f"recall {training['recall']:.3f}  f1 {training['f1']:.3f}")
+    print(f"latency p50 {report['latency_us']['p50']} us, p99 {report['latency_us']['p99']} us per utterance")
+    for error in report["errors"]:
+        kind = "false positive" if not error["label"] else "false negative"
+        print(f"  {kind} ({error['score']:.2f}): {error['text']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+def serialization_rows(model_name: str, count: int) -> List[Dict[str, Any]]:
+    """Documents as Mongo returns them: model fields only, millisecond timestamps"""
+    import models
+
+    rng = random.Random(7)
+    session_id = str(uuid.uuid4())
+    rows = []
+    for i in range(count):
+        question = rng.choice(QUESTIONS)
+        if model_name == "transcripts":
+            doc = models.TranscriptEntry(
+                session_id=session_id, text=question, confidence=round(rng.random(), 3)
+            ).model_dump()
+        else:
+            doc = models.AIResponse(
+                session_id=session_id, question=question, response=" ".join([question] * 8)
+            ).model_dump()
+        doc["timestamp"] = doc["timestamp"].replace(microsecond=doc["timestamp"].microsecond // 1000 * 1000)
+        rows.append(doc)
+    return rows
+
+
+def evaluate_serialization(args) -> Dict[str, Any]:
+    """Per-document cost of rendering a list page, model path vs fast path"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    import listing
+    from models import AIResponse, TranscriptEntry
+
+    row_models = {"transcripts": TranscriptEntry, "ai_responses": AIResponse}
+
+    async def model_path(rows, model, field):
+        # What the endpoints did: a model per row, then response_model
+        # validation and jsonable encoding, then json.dumps
+        content = await serialize_response(field=field, response_content=[model(**row) for row in rows])
+        return JSONResponse(content).body
+
+    async def fast_path(rows, model, field):
+        return listing.render_documents(rows, model).body
+
+    async def fallback_path(rows, model, field):
+        installed, listing.orjson = listing.orjson, None
+        try:
+            return listing.render_documents(rows, model).body
+        finally:
+            listing.orjson = installed
+
+    paths = {"model": model_path, "fast": fast_path}
+    if listing.orjson is not None:
+        paths["fast_stdlib_json"] = fallback_path
+
+    async def measure():
+        results = []
+        for model_name in args.models:
+            model = row_models[model_name]
+            field = create_response_field(name="response", type_=List[model])
+            for count in args.rows:
+                rows = serialization_rows(model_name, count)
+                bodies = {}
+                result = {"collection": model_name, "rows": count}
+                for path_name, path in paths.items():
+                    timings = []
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        bodies[path_name] = await path(rows, model, field)
+                        timings.append((time.perf_counter() - started) * 1e6 / count)
+                    timings.sort()
+                    result[path_name] = {
+                        "us_per_doc": round(percentile(timings, 50), 3),
+                        "bytes": len(bodies[path_name]),
+                    }
+                reference = json.loads(bodies["model"])
+                result["identical"] = all(json.loads(body) == reference for body in bodies.values())
+                result["speedup"] = round(result["model"]["us_per_doc"] / result["fast"]["us_per_doc"], 2)
+                results.append(result)
+        return results
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "encoder": "orjson" if listing.orjson is not None else "json",
+            "repeat": args.repeat,
+        },
+        "results": asyncio.run(measure()),
+    }
+
+
+def command_serialization(args):
+    report = evaluate_serialization(args)
+    print(f"List serialization, median of {args.repeat} runs, fast path encoder: {report['meta']['encoder']}")
+    print(f"{'collection':<14}{'rows':>7}  {'model us/doc':>13}  {'fast us/doc':>12}  {'speedup':>8}  same output")
+    for result in report["results"]:
+        line = (f"{result['collection']:<14}{result['rows']:>7}  {result['model']['us_per_doc']:>13.3f}  "
+                f"{result['fast']['us_per_doc']:>12.3f}  {result['speedup']:>7.2f}x  {result['identical']}")
+        if "fast_stdlib_json" in result:
+            line += f"  (stdlib json {result['fast_stdlib_json']['us_per_doc']:.3f} us/doc)"
+        print(line)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+SEARCH_VOCABULARY = (
+    "database optimization index query latency cache replication shard schema migration "
+    "team conflict deadline stakeholder mentoring feedback roadmap priority tradeoff "
+    "python java kubernetes docker service api throughput queue stream kafka redis "
+    "design review incident outage monitoring alert postmortem rollback deploy testing"
+).split()
+
+
+def evaluate_search(args) -> Dict[str, Any]:
+    """Query latency of the in-memory search index at growing corpus sizes"""
+    import search
+
+    rng = random.Random(11)
+    queries = ["database optimization", "team conflict", "kubernetes deploy rollback", "incident postmortem", "latency"]
+    results = []
+    for count in args.entries:
+        index = search.InvertedIndex(search.SEARCH_SOURCES)
+        sessions = [str(uuid.uuid4()) for _ in range(max(1, count // args.entries_per_session))]
+        # Domain words plus a Zipf-distributed filler vocabulary, like real speech
+        vocabulary = SEARCH_VOCABULARY + [f"word{i}" for i in range(args.vocabulary)]
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+        rng.shuffle(vocabulary)
+        entries = []
+        for i in range(count):
+            words = " ".join(rng.choices(vocabulary, weights, k=12))
+            session_id = sessions[i % len(sessions)]
+            if i % 3:
+                entries.append(("transcripts", {"id": str(i), "session_id": session_id, "timestamp": None, "text": words}))
+            else:
+                entries.append(("ai_responses", {
+                    "id": str(i), "session_id": session_id, "timestamp": None,
+                    "question": rng.choice(QUESTIONS), "response": " ".join([words] * 6),
+                }))
+        started = time.perf_counter()
+        for collection, doc in entries:
+            index.add(collection, doc)
+        build_s = time.perf_counter() - started
+
+        scopes = {"session": {sessions[0]}, "user": set(sessions)}
+        result = {"entries": count, "sessions": len(sessions), "build_s": round(build_s, 3)}
+        for scope_name, session_ids in scopes.items():
+            timings = []
+            for _ in range(args.repeat):
+                for query in queries:
+                    query_started = time.perf_counter()
+                    index.search(search.search_terms(query), session_ids, list(search.SEARCH_SOURCES), 21)
+                    timings.append((time.perf_counter() - query_started) * 1000)
+            timings.sort()
+            result[scope_name] = {
+                "p50_ms": round(percentile(timings, 50), 3),
+                "p99_ms": round(percentile(timings, 99), 3),
+            }
+        results.append(result)
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def command_search(args):
+    report = evaluate_search(args)
+    print("In-memory search latency (user scope searches every session)")
+    print(f"{'entries':>8}{'sessions':>10}{'build s':>9}  {'session p50/p99 ms':>20}  {'user p50/p99 ms':>18}")
+    for result in report["results"]:
+        print(f"{result['entries']:>8}{result['sessions']:>10}{result['build_s']:>9.2f}  "
+              f"{result['session']['p50_ms']:>9.3f} / {result['session']['p99_ms']:<8.3f}  "
+              f"{result['user']['p50_ms']:>7.3f} / {result['user']['p99_ms']:.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Interview Copilot API")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    endpoints = subparsers.add_parser("endpoints", help="load-test API endpoints against fake upstreams")
+    endpoints.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    endpoints.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    endpoints.add_argument("--concurrency", type=int, default=20)
+    endpoints.add_argument("--sessions", type=int, default=10, help="sessions created before the run")
+    endpoints.add_argument("--seed-transcripts", type=int, default=5, help="transcripts seeded per session")
+    endpoints.add_argument("--audio-bytes", type=int, default=48000, help="size of each fake audio chunk")
+    endpoints.add_argument("--answer-cache", action="store_true",
+                           help="repeat a small question set so the answer cache can hit")
+    endpoints.add_argument("--mongo", choices=["mock", "local"], default="local")
+    endpoints.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    for name, latency in (("llm", 800.0), ("speech", 300.0), ("mongo", 0.0)):
+        endpoints.add_argument(f"--{name}-latency-ms", type=float, default=latency)
+        endpoints.add_argument(f"--{name}-jitter-ms", type=float, default=latency / 5)
+        endpoints.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+        endpoints.add_argument(f"--{name}-slow-rate", type=float, default=0.0, help="fraction of calls that straggle")
+        endpoints.add_argument(f"--{name}-slow-ms", type=float, default=latency * 10, help="extra latency of a straggler")
+    endpoints.add_argument("--llm-tokens", type=int, default=60, help="words produced per fake answer")
+    endpoints.add_argument("--llm-token-interval-ms", type=float, default=5.0)
+    endpoints.add_argument("--output", help="write the JSON report here")
+    endpoints.add_argument("--compare", help="baseline JSON report to diff against")
+    endpoints.set_defaults(func=command_endpoints)
+
+    detector = subparsers.add_parser("question-detector", help="precision/recall of the local question classifier")
+    detector.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_corpus.jsonl"),
+                          help="training corpus the weights were tuned on")
+    detector.add_argument("--holdout", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_holdout.jsonl"),
+                          help="held-out examples never used for tuning")
+    detector.add_argument("--threshold", type=float, default=0.5)
+    detector.add_argument("--repeat", type=int, default=100, help="scoring repetitions per example for timing")
+    detector.add_argument("--output", help="write the JSON report here")
+    detector.set_defaults(func=command_question_detector)
+
+    serialization = subparsers.add_parser("serialization", help="per-document cost of list responses, model vs fast path")
+    serialization.add_argument("--rows", nargs="+", type=int, default=[1000, 10000])
+    serialization.add_argument("--models", nargs="+", choices=["transcripts", "ai_responses"], default=["transcripts", "ai_responses"])
+    serialization.add_argument("--repeat", type=int, default=20)
+    serialization.add_argument("--output", help="write the JSON report here")
+    serialization.set_defaults(func=command_serialization)
+
+    search = subparsers.add_parser("search", help="query latency of the in-memory search index")
+    search.add_argument("--entries", nargs="+", type=int, default=[10000, 50000])
+    search.add_argument("--entries-per-session", type=int, default=100)
+    search.add_argument("--vocabulary", type=int, default=5000, help="filler words besides the domain terms")
+    search.add_argument("--repeat", type=int, default=20)
+    search.add_argument("--output", help="write the JSON report here")
+    search.set_defaults(func=command_search)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
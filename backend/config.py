@@ -0,0 +1,6 @@
+"""Process configuration: loads backend/.env before any settings are read"""
+from dotenv import load_dotenv
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
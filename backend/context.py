@@ -0,0 +1,484 @@
+"""Token-budgeted conversation context: recent turns, rolling summaries and the prompt builder"""
+from fastapi import HTTPException
+import os
+import logging
+from typing import List, Optional, Dict, Any, Tuple
+from collections import OrderedDict, deque
+from datetime import datetime
+from emergentintegrations.llm.chat import UserMessage
+import asyncio
+import time
+from models import APIKeysModel
+from metrics import time_stage, count_upstream_error
+import shared_state
+from shared_state import state_key
+import database
+import upstream
+from upstream import request_deadline
+import write_behind
+from question_detector import question_classifier
+import llm
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Prompt sizing. Tokens are estimated at ~4 characters each, which is close
+# enough for budgeting without shipping a tokenizer.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '1500'))
+CONTEXT_TURN_MAX_TOKENS = int(os.environ.get('CONTEXT_TURN_MAX_TOKENS', '400'))
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Shorten text to about ``max_tokens``, keeping its beginning and end"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    half = max(max_chars // 2 - 2, 1)
+    return f"{text[:half]} … {text[-half:]}"
+
+class TranscriptBuffer:
+    """Per-session ring buffer of recent utterances used for prompt context.
+
+    A session is only served from memory once it is primed, either empty at
+    creation or from Mongo on the first cold read, so the buffer never
+    silently drops older turns. Each turn is clipped to ``turn_tokens`` and
+    kept with its timestamp, so a turn that rolls out can be matched against
+    the summary watermark.
+    With several workers, each buffer remembers the shared context version
+    it reflects and is treated as cold once another worker moved it on.
+    Idle sessions are swept after ``idle_seconds`` and least recently used
+    ones are evicted when the session count or total buffered characters
+    exceed their bounds.
+    """
+    
+    def __init__(self, turns: int, max_sessions: int, max_chars: int, idle_seconds: float, turn_tokens: int):
+        self.turns = turns
+        self.turn_tokens = turn_tokens
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self.idle_seconds = idle_seconds
+        self._lines: "OrderedDict[str, deque]" = OrderedDict()
+        self._context: Dict[str, Tuple[Optional[int], str]] = {}
+        self._touched: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        self._chars = 0
+        self._last_sweep = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+    
+    def get_context(self, session_id: str, max_tokens: Optional[int] = None,
+                    version: Optional[int] = None) -> Optional[str]:
+        """Rendered recent conversation, or None on a cold miss.
+
+        With ``max_tokens`` only the newest turns that fit are included
+        (always at least the latest one). A buffer behind the shared
+        ``version`` counts as a miss.
+        """
+        lines = self._lines.get(session_id)
+        if lines is None:
+            self.misses += 1
+            return None
+        if version is not None and self._versions.get(session_id) != version:
+            self.stale += 1
+            return None
+        self.hits += 1
+        self._touch(session_id)
+        cached = self._context.get(session_id)
+        if cached is not None and cached[0] == max_tokens:
+            return cached[1]
+        
+        selected = [line for line, _ in lines]
+        if max_tokens is not None:
+            used = 0
+            for count, line in enumerate(reversed(selected)):
+                used += estimate_tokens(line)
+                if used > max_tokens and count:
+                    selected = selected[len(lines) - count:]
+                    break
+        context = "".join(selected)
+        self._context[session_id] = (max_tokens, context)
+        return context
+    
+    def prime(self, session_id: str, entries: List[Tuple[str, str, Optional[datetime]]], version: int = 0):
+        """Load (speaker, text, timestamp) turns, oldest first, replacing any buffered state"""
+        self.discard(session_id)
+        lines = deque(maxlen=self.turns)
+        self._lines[session_id] = lines
+        self._versions[session_id] = version
+        for speaker, text, timestamp in entries[-self.turns:]:
+            self._push(lines, (self._render(speaker, text), timestamp))
+        self._touch(session_id)
+        self._evict()
+    
+    def append(self, session_id: str, speaker: str, text: str,
+               timestamp: Optional[datetime] = None) -> Optional[Tuple[str, Optional[datetime]]]:
+        """Record a new utterance; ignored for sessions that are not primed.
+
+        Returns the (line, timestamp) turn that rolled out of the buffer, if
+        any. Turns that roll out while a session is not primed here are
+        picked up from Mongo when it is next primed.
+        """
+        lines = self._lines.get(session_id)
+        if lines is None:
+            return None
+        dropped = self._push(lines, (self._render(speaker, text), timestamp))
+        self._context.pop(session_id, None)
+        self._touch(session_id)
+        self._evict()
+        return dropped
+    
+    def advance(self, session_id: str, version: int):
+        """Follow a shared version bump; only a buffer one behind stays in sync"""
+        if self._versions.get(session_id) == version - 1:
+            self._versions[session_id] = version
+    
+    def _render(self, speaker: str, text: str) -> str:
+        return f"{speaker}: {clip_to_tokens(text, self.turn_tokens)}\n"
+    
+    def discard(self, session_id: str):
+        lines = self._lines.pop(session_id, None)
+        if lines is not None:
+            self._chars -= sum(len(line) for line, _ in lines)
+        self._context.pop(session_id, None)
+        self._touched.pop(session_id, None)
+        self._versions.pop(session_id, None)
+    
+    def _push(self, lines: deque, entry: Tuple[str, Optional[datetime]]) -> Optional[Tuple[str, Optional[datetime]]]:
+        dropped = None
+        if len(lines) == lines.maxlen:
+            dropped = lines[0]
+            self._chars -= len(dropped[0])
+        lines.append(entry)
+        self._chars += len(entry[0])
+        return dropped
+    
+    def _touch(self, session_id: str):
+        self._lines.move_to_end(session_id)
+        self._touched[session_id] = time.monotonic()
+    
+    def _evict(self):
+        now = time.monotonic()
+        if now - self._last_sweep > 60:
+            self._last_sweep = now
+            for session_id in [sid for sid, touched in self._touched.items() if now - touched > self.idle_seconds]:
+                self.discard(session_id)
+                self.evictions += 1
+        while self._lines and (len(self._lines) > self.max_sessions or self._chars > self.max_chars):
+            self.discard(next(iter(self._lines)))
+            self.evictions += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._lines),
+            "buffered_chars": self._chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
+
+TRANSCRIPT_BUFFER_TURNS = int(os.environ.get('TRANSCRIPT_BUFFER_TURNS', '5'))
+TRANSCRIPT_BUFFER_MAX_SESSIONS = int(os.environ.get('TRANSCRIPT_BUFFER_MAX_SESSIONS', '5000'))
+TRANSCRIPT_BUFFER_MAX_CHARS = int(os.environ.get('TRANSCRIPT_BUFFER_MAX_CHARS', '50000000'))
+TRANSCRIPT_BUFFER_IDLE_SECONDS = float(os.environ.get('TRANSCRIPT_BUFFER_IDLE_SECONDS', '1800'))
+transcript_buffer = TranscriptBuffer(
+    TRANSCRIPT_BUFFER_TURNS,
+    TRANSCRIPT_BUFFER_MAX_SESSIONS,
+    TRANSCRIPT_BUFFER_MAX_CHARS,
+    TRANSCRIPT_BUFFER_IDLE_SECONDS,
+    CONTEXT_TURN_MAX_TOKENS,
+)
+
+# Rolling summaries. Turns that roll out of the transcript buffer are folded
+# into a per-session summary by a background task, off the request path, so
+# the prompt carries the whole conversation within a fixed token budget.
+CONTEXT_SUMMARY_TOKENS = int(os.environ.get('CONTEXT_SUMMARY_TOKENS', '300'))
+CONTEXT_SUMMARY_BATCH = int(os.environ.get('CONTEXT_SUMMARY_BATCH', '3'))
+CONTEXT_SUMMARY_USE_LLM = os.environ.get('CONTEXT_SUMMARY_USE_LLM', 'true').lower() == 'true'
+CONTEXT_SUMMARY_MAX_SESSIONS = int(os.environ.get('CONTEXT_SUMMARY_MAX_SESSIONS', '5000'))
+CONTEXT_SUMMARY_BACKFILL_TURNS = int(os.environ.get('CONTEXT_SUMMARY_BACKFILL_TURNS', '50'))
+
+SUMMARY_SYSTEM_MESSAGE = """You maintain a running summary of a job interview for a copilot assistant.
+Merge the new conversation into the existing summary. Keep the questions asked,
+the candidate's key claims, technologies, numbers and commitments. Drop small talk.
+Reply with the updated summary only, as short bullet points."""
+
+class SessionSummary:
+    """``through`` is the newest turn folded into ``text``; ``queued_through``
+    also covers turns still pending"""
+    __slots__ = ("text", "pending", "task", "updated_at", "through", "queued_through")
+    
+    def __init__(self, text: str = "", through: Optional[datetime] = None):
+        self.text = text
+        self.pending: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+        self.updated_at: Optional[datetime] = None
+        self.through = through
+        self.queued_through = through
+
+def local_summary(summary: str, lines: List[str], max_tokens: int) -> str:
+    """Extractive fallback: keep the interviewer's questions, newest last"""
+    bullets = [line for line in summary.splitlines() if line.strip()]
+    for line in lines:
+        speaker, _, text = line.partition(": ")
+        text = text.strip()
+        if speaker == "interviewer" and text and question_classifier.score(text) >= question_classifier.threshold:
+            bullets.append(f"- Asked: {clip_to_tokens(text, 40)}")
+    while len(bullets) > 1 and estimate_tokens("\n".join(bullets)) > max_tokens:
+        bullets.pop(0)
+    return clip_to_tokens("\n".join(bullets), max_tokens)
+
+class RollingSummarizer:
+    """Per-session summaries updated incrementally in the background.
+
+    ``add`` queues a turn that left the verbatim window; once ``batch`` turns
+    are queued a single task per session merges them into the summary, with
+    Gemini when keys are available and extractively otherwise, and stores
+    the result in Mongo so a cold session can resume from it. The stored
+    ``summarized_through`` watermark is the timestamp of the newest turn
+    folded in; turns at or before it are not queued again.
+    """
+    
+    def __init__(self, max_tokens: int, batch: int, max_sessions: int):
+        self.max_tokens = max_tokens
+        self.batch = batch
+        self.max_sessions = max_sessions
+        self._summaries: "OrderedDict[str, SessionSummary]" = OrderedDict()
+        self.updates = 0
+        self.llm_updates = 0
+        self.failures = 0
+        self.duplicates = 0
+    
+    def get(self, session_id: str) -> Optional[str]:
+        summary = self._summaries.get(session_id)
+        return summary.text if summary is not None else None
+    
+    def watermark(self, session_id: str) -> Optional[datetime]:
+        """Timestamp of the newest turn folded in or queued, if known"""
+        summary = self._summaries.get(session_id)
+        return summary.queued_through if summary is not None else None
+    
+    def load(self, session_id: str, text: str, through: Optional[datetime] = None):
+        """Seed a session's summary (from Mongo on a cold read)"""
+        if session_id not in self._summaries:
+            self._summaries[session_id] = SessionSummary(text, through)
+            self._evict()
+    
+    def add(self, session_id: str, line: str, api_keys: Optional[APIKeysModel] = None,
+            timestamp: Optional[datetime] = None):
+        summary = self._summaries.get(session_id)
+        if summary is None:
+            summary = self._summaries[session_id] = SessionSummary()
+        self._summaries.move_to_end(session_id)
+        if timestamp is not None and summary.queued_through is not None and timestamp <= summary.queued_through:
+            self.duplicates += 1
+            return
+        if timestamp is not None:
+            summary.queued_through = timestamp
+        summary.pending.append(line)
+        if len(summary.pending) >= self.batch and (summary.task is None or summary.task.done()):
+            summary.task = asyncio.create_task(self._update(session_id, summary, api_keys))
+        self._evict()
+    
+    async def _update(self, session_id: str, summary: SessionSummary, api_keys: Optional[APIKeysModel]):
+        # Not bound by the budget of the request that happened to start it
+        request_deadline.set(None)
+        # Keep folding while turns arrive faster than summaries complete
+        while summary.pending:
+            lines, summary.pending = summary.pending, []
+            through = summary.queued_through
+            text = None
+            if CONTEXT_SUMMARY_USE_LLM and api_keys is not None:
+                try:
+                    with time_stage("summary"):
+                        message = UserMessage(
+                            text=f"Existing summary:\n{summary.text or '(none)'}\n\nNew conversation:\n{''.join(lines)}"
+                        )
+                        text = await upstream.summary_guard.call(api_keys.gemini_api_key, lambda: llm.llm_chat_factory(
+                            api_key=api_keys.gemini_api_key,
+                            session_id=f"{session_id}-summary",
+                            system_message=SUMMARY_SYSTEM_MESSAGE
+                        ).with_model("gemini", "gemini-2.5-flash").with_max_tokens(self.max_tokens).send_message(message))
+                    text = clip_to_tokens(text.strip(), self.max_tokens)
+                    self.llm_updates += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if not isinstance(e, HTTPException):
+                        count_upstream_error("gemini", type(e).__name__)
+                    logging.warning(f"Summary update failed for {session_id}: {str(e)}")
+                    self.failures += 1
+                    text = None
+            if text is None:
+                text = local_summary(summary.text, lines, self.max_tokens)
+            summary.text = text
+            summary.through = through
+            summary.updated_at = datetime.utcnow()
+            self.updates += 1
+            try:
+                with time_stage("mongo_write"):
+                    await database.db.session_summaries.update_one(
+                        {"session_id": session_id},
+                        {"$set": {"summary": text, "summarized_through": through, "updated_at": summary.updated_at}},
+                        upsert=True
+                    )
+            except Exception as e:
+                logging.warning(f"Failed to store summary for {session_id}: {str(e)}")
+    
+    def refresh(self, session_id: str, text: str, through: Optional[datetime] = None):
+        """Adopt a summary stored by another worker, unless turns are still being folded in here"""
+        summary = self._summaries.get(session_id)
+        if summary is None:
+            self.load(session_id, text, through)
+        elif not summary.pending and (summary.task is None or summary.task.done()):
+            summary.text = text
+            summary.through = summary.queued_through = through
+    
+    def discard(self, session_id: str):
+        summary = self._summaries.pop(session_id, None)
+        if summary is not None and summary.task is not None and not summary.task.done():
+            summary.task.cancel()
+    
+    def _evict(self):
+        while len(self._summaries) > self.max_sessions:
+            self.discard(next(iter(self._summaries)))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._summaries),
+            "pending_turns": sum(len(summary.pending) for summary in self._summaries.values()),
+            "updates": self.updates,
+            "llm_updates": self.llm_updates,
+            "failures": self.failures,
+            "duplicates": self.duplicates,
+        }
+
+summarizer = RollingSummarizer(CONTEXT_SUMMARY_TOKENS, CONTEXT_SUMMARY_BATCH, CONTEXT_SUMMARY_MAX_SESSIONS)
+
+# Context versions. With a shared state store every worker buffers context
+# for the sessions it serves, so each transcript write and invalidation bumps
+# a per-session counter there. A worker serves its buffer only while it is at
+# the shared version, and otherwise re-primes from Mongo: one state store
+# read per prompt instead of a Mongo query.
+CONTEXT_VERSION_TTL = 86400
+
+def context_version_key(session_id: str) -> str:
+    return state_key("context", session_id)
+
+async def shared_context_version(session_id: str) -> Optional[int]:
+    """The session's shared context version, or None without a shared store"""
+    if not shared_state.state_store.shared:
+        return None
+    try:
+        return int(await shared_state.state_store.get(context_version_key(session_id)) or 0)
+    except Exception as e:
+        logging.warning(f"Context version lookup failed for {session_id}: {str(e)}")
+        return None
+
+async def bump_context_version(session_id: str) -> Optional[int]:
+    """Tell other workers their buffered context for the session is stale"""
+    if not shared_state.state_store.shared:
+        return None
+    try:
+        return await shared_state.state_store.incr(context_version_key(session_id), CONTEXT_VERSION_TTL)
+    except Exception as e:
+        logging.warning(f"Context version bump failed for {session_id}: {str(e)}")
+        transcript_buffer.discard(session_id)
+        return None
+
+async def load_session_context(session_id: str, version: Optional[int] = None,
+                               api_keys: Optional[APIKeysModel] = None):
+    """Prime the transcript buffer and summary of a cold session from Mongo.
+
+    ``version`` is the shared context version read before loading; another
+    worker may have moved the summary on too, so it is re-read as well.
+    Turns older than the window and newer than the summary watermark left
+    the window while the session was not primed here (before a restart or
+    on another worker) and are queued for the summarizer.
+    """
+    async def recent():
+        with time_stage("mongo_read"):
+            stored = await database.db.transcripts.find(
+                {"session_id": session_id}, {"_id": 0, "id": 1, "speaker": 1, "text": 1, "timestamp": 1}
+            ).sort("timestamp", -1).limit(TRANSCRIPT_BUFFER_TURNS).to_list(TRANSCRIPT_BUFFER_TURNS)
+        pending = write_behind.transcript_writer.pending_for(session_id)
+        if not pending:
+            return stored
+        merged = {doc["id"]: doc for doc in stored + pending}.values()
+        return sorted(merged, key=lambda doc: doc["timestamp"], reverse=True)[:TRANSCRIPT_BUFFER_TURNS]
+    
+    async def stored_summary():
+        if version is None and summarizer.get(session_id) is not None:
+            return None
+        with time_stage("mongo_read"):
+            return await database.db.session_summaries.find_one(
+                {"session_id": session_id}, {"_id": 0, "summary": 1, "summarized_through": 1, "updated_at": 1}
+            )
+    
+    recent_transcripts, summary_doc = await asyncio.gather(recent(), stored_summary())
+    transcript_buffer.prime(
+        session_id,
+        [(transcript['speaker'], transcript['text'], transcript.get('timestamp')) for transcript in reversed(recent_transcripts)],
+        version or 0
+    )
+    since = summarizer.watermark(session_id)
+    if summary_doc:
+        # Summaries stored before the watermark existed: nothing newer than
+        # the last update was folded in
+        stored_through = summary_doc.get("summarized_through") or summary_doc.get("updated_at")
+        summarizer.refresh(session_id, summary_doc["summary"], stored_through)
+        if stored_through is not None and (since is None or stored_through > since):
+            since = stored_through
+    if len(recent_transcripts) == TRANSCRIPT_BUFFER_TURNS and recent_transcripts[-1].get("timestamp") is not None:
+        await fold_unsummarized_turns(session_id, recent_transcripts[-1]["timestamp"], since, api_keys)
+
+async def fold_unsummarized_turns(session_id: str, before: datetime, since: Optional[datetime],
+                                  api_keys: Optional[APIKeysModel] = None):
+    """Queue turns stored before ``before`` and after ``since`` for the summarizer.
+
+    At most the newest CONTEXT_SUMMARY_BACKFILL_TURNS are queued, so priming
+    a long session that was never summarized stays bounded.
+    """
+    window = {"$lt": before}
+    if since is not None:
+        window["$gt"] = since
+    with time_stage("mongo_read"):
+        stored = await database.db.transcripts.find(
+            {"session_id": session_id, "timestamp": window}, {"_id": 0, "id": 1, "speaker": 1, "text": 1, "timestamp": 1}
+        ).sort("timestamp", -1).limit(CONTEXT_SUMMARY_BACKFILL_TURNS).to_list(CONTEXT_SUMMARY_BACKFILL_TURNS)
+    pending = [
+        doc for doc in write_behind.transcript_writer.pending_for(session_id)
+        if doc["timestamp"] < before and (since is None or doc["timestamp"] > since)
+    ]
+    turns = sorted({doc["id"]: doc for doc in stored + pending}.values(), key=lambda doc: doc["timestamp"])
+    for doc in turns[-CONTEXT_SUMMARY_BACKFILL_TURNS:]:
+        summarizer.add(session_id, transcript_buffer._render(doc["speaker"], doc["text"]), api_keys, doc["timestamp"])
+
+async def get_recent_context(session_id: str, api_keys: Optional[APIKeysModel] = None) -> str:
+    """Conversation context for the prompt within CONTEXT_TOKEN_BUDGET.
+
+    The rolling summary of older turns comes first, then as many of the most
+    recent turns, verbatim, as fit in the remaining budget.
+    """
+    version = await shared_context_version(session_id)
+    summary = summarizer.get(session_id) or ""
+    budget = max(CONTEXT_TOKEN_BUDGET - estimate_tokens(summary), CONTEXT_TURN_MAX_TOKENS)
+    recent = transcript_buffer.get_context(session_id, budget, version)
+    if recent is None:
+        await load_session_context(session_id, version, api_keys)
+        summary = summarizer.get(session_id) or ""
+        budget = max(CONTEXT_TOKEN_BUDGET - estimate_tokens(summary), CONTEXT_TURN_MAX_TOKENS)
+        recent = transcript_buffer.get_context(session_id, budget)
+    
+    context = "Recent interview conversation:\n" + recent
+    if summary:
+        context = f"Summary of the earlier conversation:\n{summary}\n\n{context}"
+    return context
+
+async def build_ai_prompt(session_id: str, question: str, api_keys: Optional[APIKeysModel] = None) -> str:
+    """Assemble the Gemini prompt from the session's summary and recent transcripts"""
+    context = await get_recent_context(session_id, api_keys)
+    return f"{context}\n\nCurrent Question: {question}\n\nPlease provide a professional interview response:"
@@ -0,0 +1,168 @@
+"""MongoDB client, declared indexes and startup bootstrap"""
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+import os
+from typing import List, Dict
+import asyncio
+import logging
+import config  # noqa: F401  (loads .env before the settings below)
+
+# MongoDB connection
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+client = AsyncIOMotorClient(mongo_url, minPoolSize=MONGO_MIN_POOL_SIZE, maxPoolSize=MONGO_MAX_POOL_SIZE)
+db = client[os.environ.get('DB_NAME', 'interview_copilot')]
+
+logger = logging.getLogger(__name__)
+
+# Retention, enforced by TTL indexes; 0 keeps data forever. Archived sessions
+# expire ARCHIVE_RETENTION_DAYS after archival. HOT_RETENTION_DAYS is a
+# backstop for transcripts and AI responses of sessions that never end.
+ARCHIVE_RETENTION_DAYS = float(os.environ.get('ARCHIVE_RETENTION_DAYS', '0'))
+HOT_RETENTION_DAYS = float(os.environ.get('HOT_RETENTION_DAYS', '0'))
+
+TTL_INDEX_SUFFIX = "_ttl"
+
+def ttl_index(field: str, days: float) -> List[IndexModel]:
+    """A TTL index on ``field`` when a retention period is configured.
+
+    The name does not encode the period: a changed setting is applied to the
+    existing index with collMod by ``ensure_indexes``.
+    """
+    if days <= 0:
+        return []
+    return [IndexModel([(field, ASCENDING)], name=f"{field}{TTL_INDEX_SUFFIX}", expireAfterSeconds=int(days * 86400))]
+
+# Full-text search backend: "mongo" uses text indexes, "memory" an in-process
+# inverted index (for embedded and test setups, e.g. mongomock, without $text)
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'mongo')
+if SEARCH_BACKEND not in ("mongo", "memory"):
+    raise ValueError("SEARCH_BACKEND must be mongo or memory")
+
+def text_index(weights: Dict[str, int]) -> List[IndexModel]:
+    """The collection's text index when searching through Mongo"""
+    if SEARCH_BACKEND != "mongo":
+        return []
+    name = "_".join(f"{field}_text" for field in weights)
+    return [IndexModel([(field, TEXT) for field in weights], name=name, weights=weights, default_language="english")]
+
+# Every index the app relies on, declared in one place and ensured at startup
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    # Listings page on (sort field, id); the trailing id keeps keyset pages index-only
+    "interview_sessions": [
+        IndexModel([("id", ASCENDING)], name="id_1"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_1_id_1"),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="user_id_1_created_at_1_id_1"),
+        # Session lifecycle: auto-ending stale sessions and finding archive candidates
+        IndexModel([("is_active", ASCENDING), ("created_at", ASCENDING)], name="is_active_1_created_at_1"),
+        IndexModel([("is_active", ASCENDING), ("ended_at", ASCENDING)], name="is_active_1_ended_at_1"),
+    ] + ttl_index("archived_at", ARCHIVE_RETENTION_DAYS),
+    "transcripts": [
+        IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)], name="session_id_1_timestamp_1_id_1"),
+        # Makes write-behind journal replay idempotent
+        IndexModel([("id", ASCENDING)], name="id_1", unique=True),
+    ] + ttl_index("timestamp", HOT_RETENTION_DAYS) + text_index({"text": 1}),
+    "ai_responses": [
+        IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING), ("id", ASCENDING)], name="session_id_1_timestamp_1_id_1"),
+        # Makes restoring an archived session idempotent
+        IndexModel([("id", ASCENDING)], name="id_1", unique=True),
+    ] + ttl_index("timestamp", HOT_RETENTION_DAYS) + text_index({"question": 3, "response": 1}),
+    "session_summaries": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_1", unique=True),
+    ],
+    "session_archives": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_1", unique=True),
+    ] + ttl_index("archived_at", ARCHIVE_RETENTION_DAYS),
+    "status_checks": [
+        IndexModel([("timestamp", ASCENDING)], name="timestamp_1"),
+    ],
+}
+
+class DatabaseConfigError(RuntimeError):
+    """Mongo rejected the configuration itself; retrying cannot fix it"""
+
+# Index conflicts, invalid index options and authentication failures
+FATAL_MONGO_CODES = {13, 18, 67, 85, 86, 197}
+
+async def reconcile_ttl_indexes(collection: str, indexes: List[IndexModel]):
+    """Bring existing TTL indexes in line with the retention settings.
+
+    A changed period is applied in place with collMod; a TTL index whose
+    retention was turned off is dropped, since it would keep deleting data.
+    """
+    existing = await db[collection].index_information()
+    declared = {index.document["name"]: index.document for index in indexes}
+    for name, info in existing.items():
+        if not name.endswith(TTL_INDEX_SUFFIX):
+            continue
+        spec = declared.get(name)
+        if spec is None:
+            logger.warning(f"Dropping TTL index {collection}.{name}: its retention is turned off")
+            await db[collection].drop_index(name)
+        elif "expireAfterSeconds" not in info or list(info["key"]) != list(spec["key"].items()):
+            raise DatabaseConfigError(f"Index {collection}.{name} exists with a different definition; drop it to continue")
+        elif info["expireAfterSeconds"] != spec["expireAfterSeconds"]:
+            logger.info(
+                f"Changing TTL of {collection}.{name} from {info['expireAfterSeconds']}s "
+                f"to {spec['expireAfterSeconds']}s"
+            )
+            await db.command({"collMod": collection, "index": {
+                "name": name, "expireAfterSeconds": spec["expireAfterSeconds"]
+            }})
+
+async def ensure_indexes():
+    """Create any declared index that does not exist yet, updating TTL periods"""
+    async def ensure(collection: str, indexes: List[IndexModel]):
+        await reconcile_ttl_indexes(collection, indexes)
+        await db[collection].create_indexes(indexes)
+    
+    await asyncio.gather(*(ensure(collection, indexes) for collection, indexes in INDEX_SPECS.items()))
+
+async def check_indexes() -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared indexes with the database, by index name.
+
+    ``changed`` lists TTL indexes whose period differs from the settings;
+    startup applies those in place.
+    """
+    report = {}
+    for collection, indexes in INDEX_SPECS.items():
+        declared = {index.document["name"]: index.document for index in indexes}
+        existing = await db[collection].index_information()
+        existing.pop("_id_", None)
+        report[collection] = {
+            "missing": sorted(set(declared) - set(existing)),
+            "extra": sorted(set(existing) - set(declared)),
+            "changed": sorted(
+                name for name, spec in declared.items()
+                if "expireAfterSeconds" in spec and name in existing
+                and existing[name].get("expireAfterSeconds") != spec["expireAfterSeconds"]
+            ),
+        }
+    return report
+
+async def warm_mongo_pool():
+    """Open the minimum pool connections up front instead of on first request"""
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
+
+async def bootstrap_database():
+    """Ensure indexes and warm the pool, retrying until Mongo is reachable.
+
+    Raises DatabaseConfigError when Mongo rejects the configuration.
+    """
+    retry_delay = 2.0
+    while True:
+        try:
+            await ensure_indexes()
+            await warm_mongo_pool()
+            logger.info("Database bootstrap complete")
+            return
+        except DatabaseConfigError:
+            raise
+        except Exception as e:
+            if isinstance(e, OperationFailure) and e.code in FATAL_MONGO_CODES:
+                raise DatabaseConfigError(str(e)) from e
+            logger.error(f"Database bootstrap failed, retrying in {retry_delay:.0f}s: {str(e)}")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60.0)
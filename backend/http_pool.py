@@ -0,0 +1,93 @@
+"""Shared aiohttp client for upstream calls, with connection pool counters"""
+import os
+from typing import Optional, Dict, Any
+import time
+import aiohttp
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Shared HTTP client pool for upstream REST calls (Google Speech)
+HTTP_POOL_LIMIT = int(os.environ.get('HTTP_POOL_LIMIT', '200'))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', '100'))
+HTTP_DNS_CACHE_TTL = int(os.environ.get('HTTP_DNS_CACHE_TTL', '300'))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get('HTTP_KEEPALIVE_TIMEOUT', '30'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+SPEECH_REQUEST_TIMEOUT = float(os.environ.get('SPEECH_REQUEST_TIMEOUT', '15'))
+
+class HTTPPoolStats:
+    """Connection pool counters collected through aiohttp trace hooks"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.queued = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+    
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        
+        async def on_request_start(session, ctx, params):
+            self.requests += 1
+        
+        async def on_queued_start(session, ctx, params):
+            ctx.queued_at = time.perf_counter()
+        
+        async def on_queued_end(session, ctx, params):
+            wait = time.perf_counter() - ctx.queued_at
+            self.queued += 1
+            self.queue_wait_total += wait
+            self.queue_wait_max = max(self.queue_wait_max, wait)
+        
+        async def on_create_end(session, ctx, params):
+            self.connections_created += 1
+        
+        async def on_reuse(session, ctx, params):
+            self.connections_reused += 1
+        
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_queued_start.append(on_queued_start)
+        trace_config.on_connection_queued_end.append(on_queued_end)
+        trace_config.on_connection_create_end.append(on_create_end)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+    
+    def snapshot(self, connector: Optional[aiohttp.TCPConnector]) -> Dict[str, Any]:
+        idle = in_use = 0
+        if connector is not None and not connector.closed:
+            # aiohttp does not expose pool occupancy publicly
+            idle = sum(len(conns) for conns in connector._conns.values())
+            in_use = len(connector._acquired)
+        return {
+            "limit": HTTP_POOL_LIMIT,
+            "limit_per_host": HTTP_POOL_LIMIT_PER_HOST,
+            "open_connections": idle + in_use,
+            "idle_connections": idle,
+            "in_use_connections": in_use,
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "queued_requests": self.queued,
+            "queue_wait_avg_ms": round(self.queue_wait_total / self.queued * 1000, 3) if self.queued else 0.0,
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 3),
+        }
+
+http_pool_stats = HTTPPoolStats()
+http_client: Optional[aiohttp.ClientSession] = None
+
+def get_http_client() -> aiohttp.ClientSession:
+    """Return the app-lifetime HTTP client, creating it on first use"""
+    global http_client
+    if http_client is None or http_client.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        http_client = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=SPEECH_REQUEST_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            trace_configs=[http_pool_stats.trace_config()],
+        )
+    return http_client
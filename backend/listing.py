@@ -0,0 +1,232 @@
+"""List endpoint helpers: fast row serialization, keyset cursors and streamed exports"""
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pymongo import ASCENDING, DESCENDING
+import os
+from pydantic import BaseModel
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import json
+import base64
+from metrics import time_stage
+import config  # noqa: F401  (loads .env before the settings below)
+
+try:
+    import orjson
+except ImportError:  # optional, speeds up list responses
+    orjson = None
+
+def render_model(model: BaseModel) -> Response:
+    """Serialize a response model to JSON under the ``serialize`` stage timer"""
+    with time_stage("serialize"):
+        return Response(content=model.model_dump_json(), media_type="application/json")
+
+# Listing helpers: keyset pagination on (sort field, id), projections and NDJSON
+PAGE_SIZE_DEFAULT = 1000
+PAGE_SIZE_MAX = 1000
+
+# Fast serialization: list endpoints encode Mongo rows directly instead of
+# building a model per row that FastAPI then validates and encodes again.
+# Rows are written from the same models, so they are trusted as-is.
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION', 'true').lower() == 'true'
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_json(value) -> bytes:
+    """Compact JSON, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=json_default)
+    return json.dumps(value, default=json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+_row_shapes: Dict[type, Tuple[Dict[str, int], Dict[str, Any], frozenset]] = {}
+
+def row_shape(model) -> Tuple[Dict[str, int], Dict[str, Any], frozenset]:
+    """Projection of exactly the model's fields, plain defaults and required fields"""
+    shape = _row_shapes.get(model)
+    if shape is None:
+        projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+        defaults = {
+            name: field.default for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        required = frozenset(name for name in model.model_fields if name not in defaults)
+        shape = _row_shapes[model] = (projection, defaults, required)
+    return shape
+
+def document_rows(docs: List[Dict[str, Any]], model) -> List[Dict[str, Any]]:
+    """Shape full-projection rows like the model would, without validating them.
+
+    Rows missing optional fields (written before the field existed) get the
+    model's defaults; a row missing anything else goes through the model.
+    """
+    _, defaults, required = row_shape(model)
+    rows = []
+    for doc in docs:
+        if len(doc) != len(model.model_fields):
+            if required <= doc.keys():
+                doc = {**defaults, **doc}
+            else:
+                doc = model(**doc).model_dump()
+        rows.append(doc)
+    return rows
+
+def render_documents(docs: List[Dict[str, Any]], model=None, headers: Optional[Dict[str, str]] = None) -> Response:
+    """JSON response for trusted rows under the ``serialize`` stage timer"""
+    with time_stage("serialize"):
+        rows = document_rows(docs, model) if model is not None else docs
+        return Response(content=dumps_json(rows), media_type="application/json", headers=headers)
+
+def encode_cursor(sort_value: datetime, doc_id: str) -> str:
+    raw = json.dumps([sort_value.isoformat(), doc_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), str(doc_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_projection(fields: Optional[str], model, sort_field: str) -> Dict[str, int]:
+    """Mongo projection for a comma separated field list; sort keys are always kept"""
+    projection = {"_id": 0}
+    if not fields:
+        return projection
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    for field in requested | {sort_field, "id"}:
+        projection[field] = 1
+    return projection
+
+def merge_pending(docs, pending: List[Dict[str, Any]], sort_field: str, descending: bool = False):
+    """Interleave sorted ``docs`` with not-yet-written ``pending`` documents.
+
+    Works for lists and async cursors alike; a pending document that Mongo
+    already returned (confirmed mid-request) is emitted once.
+    """
+    key = lambda doc: (doc[sort_field], doc["id"])
+    pending = sorted(pending, key=key, reverse=descending)
+    before = (lambda a, b: a > b) if descending else (lambda a, b: a < b)
+    seen = set()
+    
+    async def merged():
+        index = 0
+        async def source():
+            if isinstance(docs, list):
+                for doc in docs:
+                    yield doc
+            else:
+                async for doc in docs:
+                    yield doc
+        async for doc in source():
+            while index < len(pending) and before(key(pending[index]), key(doc)):
+                if pending[index]["id"] not in seen:
+                    seen.add(pending[index]["id"])
+                    yield pending[index]
+                index += 1
+            if doc["id"] not in seen:
+                seen.add(doc["id"])
+                yield doc
+        for doc in pending[index:]:
+            if doc["id"] not in seen:
+                seen.add(doc["id"])
+                yield doc
+    
+    return merged()
+
+async def list_documents(
+    collection,
+    query: Dict[str, Any],
+    model,
+    sort_field: str,
+    response: Response,
+    limit: Optional[int],
+    after: Optional[str],
+    fields: Optional[str],
+    format: str,
+    pending: Optional[List[Dict[str, Any]]] = None,
+    descending: bool = False
+):
+    """Shared implementation of the paginated listing endpoints.
+
+    ``format=json`` returns one page (at most PAGE_SIZE_MAX documents) and
+    sets ``X-Next-Cursor`` when more remain. ``format=ndjson`` streams
+    documents as the cursor yields them, without a page cap unless
+    ``limit`` is given; a final ``{"next_cursor": ...}`` line marks a cut.
+    ``pending`` documents (queued writes matching the query) are merged in
+    sort order. ``descending`` lists newest first; ties on the sort field
+    are then broken by descending id.
+    """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    if limit is not None and (limit < 1 or (format == "json" and limit > PAGE_SIZE_MAX)):
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {PAGE_SIZE_MAX}")
+    
+    if after:
+        sort_value, doc_id = decode_cursor(after)
+        beyond = "$lt" if descending else "$gt"
+        query = {**query, "$or": [
+            {sort_field: {beyond: sort_value}},
+            {sort_field: sort_value, "id": {beyond: doc_id}},
+        ]}
+        if pending:
+            position = (sort_value, doc_id)
+            pending = [
+                doc for doc in pending
+                if ((doc[sort_field], doc["id"]) < position if descending else (doc[sort_field], doc["id"]) > position)
+            ]
+    projection = build_projection(fields, model, sort_field)
+    if FAST_SERIALIZATION and not fields:
+        # Exactly the model's fields, so stray keys never reach the response
+        projection = row_shape(model)[0]
+    if pending:
+        keep = [field for field, include in projection.items() if include and field != "_id"]
+        pending = [{field: doc[field] for field in keep if field in doc} if keep else dict(doc) for doc in pending]
+    direction = DESCENDING if descending else ASCENDING
+    cursor = collection.find(query, projection).sort([(sort_field, direction), ("id", direction)])
+    
+    if format == "ndjson":
+        if limit is not None:
+            cursor = cursor.limit(limit + 1)
+        if pending:
+            cursor = merge_pending(cursor, pending, sort_field, descending)
+        
+        async def stream():
+            sent = 0
+            last = None
+            async for doc in cursor:
+                if limit is not None and sent == limit:
+                    yield json.dumps({"next_cursor": encode_cursor(last[sort_field], last["id"])}) + "\n"
+                    break
+                if FAST_SERIALIZATION:
+                    yield dumps_json(doc) + b"\n"
+                else:
+                    yield json.dumps(doc, default=json_default) + "\n"
+                sent += 1
+                last = doc
+        
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    
+    page_size = limit or PAGE_SIZE_DEFAULT
+    docs = await cursor.limit(page_size + 1).to_list(page_size + 1)
+    if pending:
+        docs = [doc async for doc in merge_pending(docs, pending, sort_field, descending)]
+    headers = {}
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        headers["X-Next-Cursor"] = encode_cursor(docs[-1][sort_field], docs[-1]["id"])
+    
+    if FAST_SERIALIZATION:
+        return render_documents(docs, None if fields else model, headers)
+    if fields:
+        # Partial documents cannot satisfy the response model
+        return JSONResponse(content=jsonable_encoder(docs), headers=headers)
+    response.headers.update(headers)
+    return [model(**doc) for doc in docs]
@@ -0,0 +1,100 @@
+"""Gemini chat construction and token streaming"""
+import os
+from typing import Dict, Any, Tuple
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+import json
+import aiohttp
+import http_pool
+from http_pool import HTTP_CONNECT_TIMEOUT
+from upstream import GEMINI_TIMEOUT
+import config  # noqa: F401  (loads .env before the settings below)
+
+# System prompt for interview answers
+INTERVIEW_SYSTEM_MESSAGE = """You are an expert interview copilot assistant. Your role is to help the interviewee answer questions professionally and effectively.
+
+When given an interview question, provide:
+1. A clear, concise, and professional answer
+2. Key points to emphasize
+3. Examples or experiences to mention if relevant
+
+Keep responses natural, authentic, and appropriate for a professional interview setting. 
+Format your response to be easy to read quickly during an interview.
+
+Structure your response as:
+**Main Answer:** [Direct response to the question]
+**Key Points:** [2-3 bullet points of important aspects to mention]
+**Example/Experience:** [If relevant, suggest a brief example to share]"""
+
+# Chat class used for Gemini calls. Tests and local runs can swap in a fake
+# with the same interface (with_model/with_max_tokens/send_message and an
+# optional async-generator stream_message).
+llm_chat_factory = LlmChat
+
+def create_gemini_chat(api_key: str, session_id: str, max_tokens: int = 1024):
+    """Build a Gemini chat client for the given session"""
+    return llm_chat_factory(
+        api_key=api_key,
+        session_id=session_id,
+        system_message=INTERVIEW_SYSTEM_MESSAGE
+    ).with_model("gemini", "gemini-2.5-flash").with_max_tokens(max_tokens)
+
+# Token streaming. The emergentintegrations LlmChat only returns whole
+# answers, so with it the stream endpoint calls Gemini's streamGenerateContent
+# directly over the shared HTTP client. GEMINI_STREAMING=false keeps every
+# call on LlmChat; the answer then arrives as one token event and the done
+# event says "streamed": false. The REST stream skips LlmChat's retries and is
+# never hedged; the stream endpoint still applies the breaker and a deadline.
+GEMINI_STREAMING = os.environ.get('GEMINI_STREAMING', 'true').lower() == 'true'
+GEMINI_STREAM_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:streamGenerateContent"
+
+async def stream_gemini_rest(api_key: str, prompt: str, max_tokens: int = 1024):
+    """Yield Gemini response text from the streamGenerateContent SSE endpoint"""
+    body = {
+        "systemInstruction": {"parts": [{"text": INTERVIEW_SYSTEM_MESSAGE}]},
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {"maxOutputTokens": max_tokens},
+    }
+    async with http_pool.get_http_client().post(
+        GEMINI_STREAM_URL,
+        params={"alt": "sse"},
+        headers={"x-goog-api-key": api_key},
+        json=body,
+        timeout=aiohttp.ClientTimeout(total=GEMINI_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    ) as response:
+        # ClientResponseError carries .status, so 5xx count toward the breaker
+        response.raise_for_status()
+        async for line in response.content:
+            if not line.startswith(b"data:"):
+                continue
+            try:
+                event = json.loads(line[5:])
+            except ValueError:
+                # Keep-alives and partial frames carry nothing to relay
+                continue
+            if not isinstance(event, dict):
+                continue
+            for candidate in event.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    if part.get("text"):
+                        yield part["text"]
+
+async def send_whole(chat, message: UserMessage):
+    yield await chat.send_message(message)
+
+def stream_llm_tokens(chat, api_key: str, prompt: str) -> Tuple[Any, bool]:
+    """Return an async iterator of response text and whether it streams.
+
+    Chat clients with an async-generator ``stream_message`` stream through
+    it; the stock LlmChat streams over REST unless GEMINI_STREAMING is off.
+    Otherwise the whole answer is yielded as a single chunk.
+    """
+    stream_message = getattr(chat, "stream_message", None)
+    if stream_message is not None:
+        return (chunk async for chunk in stream_message(UserMessage(text=prompt)) if chunk), True
+    if GEMINI_STREAMING and llm_chat_factory is LlmChat:
+        return stream_gemini_rest(api_key, prompt), True
+    return send_whole(chat, UserMessage(text=prompt)), False
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
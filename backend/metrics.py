@@ -0,0 +1,167 @@
+"""Prometheus metrics: fixed-bucket histograms, counters and per-stage timers"""
+from fastapi import HTTPException, Request
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+import os
+from typing import List, Dict, Tuple
+import time
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Metrics. Prometheus text exposition without a client library: a handful
+# of fixed-bucket histograms and counters. With METRICS_ENABLED off the
+# middleware is not installed and stage timers are a shared no-op object.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+    
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+http_request_duration = Histogram(
+    "icp_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+stage_duration = Histogram(
+    "icp_stage_duration_seconds", "Time spent in internal request stages", ("stage",)
+)
+stage_errors = Counter(
+    "icp_stage_errors_total", "Stages that ended with an exception", ("stage",)
+)
+upstream_errors = Counter(
+    "icp_upstream_errors_total", "Failed calls to upstream services", ("upstream", "reason")
+)
+rate_limit_rejections = Counter(
+    "icp_rate_limit_rejections_total", "Requests rejected by the rate limiter", ("route",)
+)
+METRICS = (http_request_duration, stage_duration, stage_errors, upstream_errors, rate_limit_rejections)
+
+class StageTimer:
+    __slots__ = ("stage", "started")
+    
+    def __init__(self, stage: str):
+        self.stage = stage
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        stage_duration.observe(time.perf_counter() - self.started, self.stage)
+        if exc_type is not None and not issubclass(exc_type, HTTPException):
+            stage_errors.inc(self.stage)
+        return False
+
+class NullTimer:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_TIMER = NullTimer()
+
+def time_stage(stage: str):
+    """Context manager timing one stage (session, mongo_read, gemini, ...)"""
+    return StageTimer(stage) if METRICS_ENABLED else NULL_TIMER
+
+def count_upstream_error(upstream: str, reason: str):
+    if METRICS_ENABLED:
+        upstream_errors.inc(upstream, reason)
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency up to the last body chunk"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        status = "500"
+        
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], route_label(scope), status
+            )
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    if METRICS_ENABLED:
+        rate_limit_rejections.inc(route_label(request.scope))
+    return _rate_limit_exceeded_handler(request, exc)
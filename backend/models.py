@@ -0,0 +1,103 @@
+"""Request and response models shared by the API and its subsystems"""
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
+import uuid
+from datetime import datetime
+
+# Models
+class APIKeysModel(BaseModel):
+    google_speech_api_key: str
+    gemini_api_key: str
+
+class InterviewSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    is_active: bool = True
+    user_id: Optional[str] = None
+    ended_at: Optional[datetime] = None
+    archived_at: Optional[datetime] = None
+
+class InterviewSessionCreate(BaseModel):
+    user_id: Optional[str] = None
+
+class TranscriptEntry(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    session_id: str
+    text: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    speaker: str = "interviewer"
+    confidence: Optional[float] = None
+
+class TranscriptCreate(BaseModel):
+    session_id: str
+    text: str
+    speaker: str = "interviewer"
+    confidence: Optional[float] = None
+
+class AIResponse(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    session_id: str
+    question: str
+    response: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    cached: bool = False
+
+class AIResponseRequest(BaseModel):
+    session_id: str
+    question: str
+    bypass_cache: bool = False
+    require_question: bool = False  # reject with 422 "not_a_question" unless the question classifier accepts it
+
+class QuestionScoreRequest(BaseModel):
+    text: str
+
+class QuestionScore(BaseModel):
+    score: float
+    is_question: bool
+    threshold: float
+    features: List[str]
+
+class SearchHit(BaseModel):
+    type: str  # "transcript" or "ai_response"
+    id: str
+    session_id: str
+    timestamp: datetime
+    score: float
+    field: str  # the field the snippet comes from
+    snippet: str
+    highlights: List[Tuple[int, int]]  # [start, end) offsets of matches in the snippet
+
+class SearchResults(BaseModel):
+    results: List[SearchHit]
+    next_offset: Optional[int] = None
+
+class AudioTranscriptionRequest(BaseModel):
+    session_id: str
+    audio_data: str  # Base64 encoded audio
+    audio_format: str = "webm"  # webm, ogg or pcm (16-bit little-endian mono)
+    sample_rate: int = 16000
+    energy: Optional[List[float]] = None  # client-side RMS level (0..1) per energy_frame_ms
+    energy_frame_ms: int = Field(100, gt=0)
+    # Buffer chunks server-side and flush on pauses. Buffers are per process:
+    # with several workers a session's uploads must reach the same one.
+    aggregate: bool = False
+    flush: bool = False  # with aggregate, send everything buffered now
+    persist: bool = False  # also save a non-empty transcript as a TranscriptEntry
+    persist_in_background: bool = False
+    speaker: str = "interviewer"
+
+class AudioTranscriptionResponse(BaseModel):
+    transcript: str
+    confidence: float
+    session_id: str
+    entry: Optional[TranscriptEntry] = None
+    skipped_silence: bool = False
+    pending: bool = False  # chunk buffered by aggregation, transcript comes with a later flush
+
+class StatusCheck(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    client_name: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class StatusCheckCreate(BaseModel):
+    client_name: str
@@ -0,0 +1,261 @@
+"""Near-duplicate question cache (MinHash/LSH) with a shared exact-match tier"""
+import os
+import logging
+from typing import List, Optional, Dict, Any, Tuple
+from collections import OrderedDict
+import time
+import json
+import hashlib
+import re
+import random
+import zlib
+from models import APIKeysModel, AIResponseRequest
+import shared_state
+from shared_state import state_key
+from auth import secret_digest
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Cross-session answer cache
+FILLER_WORDS = frozenset(
+    "um uh erm er ah hmm so well okay ok like actually basically just please now alright".split()
+)
+LEADING_PHRASES = re.compile(r"^(?:(?:can|could|would|will) you (?:please )?|i(?:'d| would) like (?:you )?to |let'?s )+")
+# Questions that refer back to the conversation cannot be answered from another session
+CONTEXT_DEPENDENT_PATTERN = re.compile(
+    r"\b(?:that|this|it|those|these|earlier|previous|above|mentioned|elaborate|expand|more about)\b"
+)
+
+def normalize_question(text: str) -> str:
+    """Fold case, punctuation, filler words and polite lead-ins"""
+    text = re.sub(r"[^a-z0-9' ]+", " ", text.lower())
+    words = [word.strip("'") for word in text.split()]
+    normalized = " ".join(word for word in words if word and word not in FILLER_WORDS)
+    return LEADING_PHRASES.sub("", normalized)
+
+class CachedAnswer:
+    __slots__ = ("question", "response", "shingles", "band_keys", "latency_ms", "hits", "scope")
+    
+    def __init__(self, question, response, shingles, band_keys, latency_ms, scope=None):
+        self.scope = scope
+        self.question = question
+        self.response = response
+        self.shingles = shingles
+        self.band_keys = band_keys
+        self.latency_ms = latency_ms
+        self.hits = 0
+
+class AnswerCache:
+    """Answers keyed by normalized question, with MinHash near-duplicate lookup.
+
+    Normalized questions are split into character 4-gram shingles; MinHash
+    signatures are banded into an LSH index to find candidates, which are
+    then confirmed by exact Jaccard similarity against ``threshold``.
+
+    Entries carry a ``scope``: pre-warmed answers are global (``None``),
+    learned ones were generated from a session's private conversation and
+    are only served back within the scope they were learned in.
+    """
+    
+    SHINGLE_SIZE = 4
+    NUM_PERM = 64
+    BANDS = 16
+    MERSENNE_PRIME = (1 << 61) - 1
+    
+    def __init__(self, maxsize: int, threshold: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        rng = random.Random(0x1c0)
+        self._perms = [
+            (rng.randrange(1, self.MERSENNE_PRIME), rng.randrange(0, self.MERSENNE_PRIME))
+            for _ in range(self.NUM_PERM)
+        ]
+        self._entries: "OrderedDict[Tuple[Optional[str], str], CachedAnswer]" = OrderedDict()
+        self._bands: Dict[Tuple, set] = {}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.latency_saved_ms = 0.0
+        self.lookup_ms_total = 0.0
+        self.llm_latency_ewma_ms: Optional[float] = None
+    
+    def _shingles(self, normalized: str) -> set:
+        padded = f" {normalized} "
+        size = self.SHINGLE_SIZE
+        return {padded[i:i + size] for i in range(max(1, len(padded) - size + 1))}
+    
+    def _band_keys(self, shingles: set) -> List[Tuple]:
+        hashes = [zlib.crc32(shingle.encode()) for shingle in shingles]
+        prime = self.MERSENNE_PRIME
+        signature = [min((a * h + b) % prime for h in hashes) for a, b in self._perms]
+        rows = self.NUM_PERM // self.BANDS
+        return [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.BANDS)]
+    
+    def cacheable(self, normalized: str) -> bool:
+        return bool(normalized) and not CONTEXT_DEPENDENT_PATTERN.search(normalized)
+    
+    def lookup(self, question: str, scope: Optional[str] = None) -> Optional[CachedAnswer]:
+        """Best match among global entries and those learned in ``scope``"""
+        started = time.perf_counter()
+        normalized = normalize_question(question)
+        if not self.cacheable(normalized):
+            self.skipped += 1
+            return None
+        
+        key = (scope, normalized)
+        entry = self._entries.get(key)
+        if entry is None and scope is not None:
+            key = (None, normalized)
+            entry = self._entries.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+        else:
+            shingles = self._shingles(normalized)
+            best, best_score = None, self.threshold
+            candidates = set()
+            for band_key in self._band_keys(shingles):
+                candidates |= self._bands.get(band_key, set())
+            for key in candidates:
+                if key[0] is not None and key[0] != scope:
+                    continue
+                candidate = self._entries[key]
+                score = len(shingles & candidate.shingles) / len(shingles | candidate.shingles)
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is None:
+                self.misses += 1
+                self.lookup_ms_total += (time.perf_counter() - started) * 1000
+                return None
+            key, entry = best, self._entries[best]
+            self.near_hits += 1
+        
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        lookup_ms = (time.perf_counter() - started) * 1000
+        self.lookup_ms_total += lookup_ms
+        baseline = entry.latency_ms if entry.latency_ms is not None else self.llm_latency_ewma_ms
+        if baseline:
+            self.latency_saved_ms += max(baseline - lookup_ms, 0.0)
+        return entry
+    
+    def store(self, question: str, response: str, latency_ms: Optional[float] = None,
+              scope: Optional[str] = None) -> Optional[CachedAnswer]:
+        if latency_ms is not None:
+            self.llm_latency_ewma_ms = latency_ms if self.llm_latency_ewma_ms is None else (
+                0.9 * self.llm_latency_ewma_ms + 0.1 * latency_ms
+            )
+        return self.insert(question, response, latency_ms, scope)
+    
+    def insert(self, question: str, response: str, latency_ms: Optional[float] = None,
+               scope: Optional[str] = None) -> Optional[CachedAnswer]:
+        """Add an answer without counting it as a fresh LLM observation"""
+        normalized = normalize_question(question)
+        if not self.cacheable(normalized) or not response:
+            return None
+        key = (scope, normalized)
+        self._remove(key)
+        shingles = self._shingles(normalized)
+        band_keys = self._band_keys(shingles)
+        entry = self._entries[key] = CachedAnswer(question, response, shingles, band_keys, latency_ms, scope)
+        for band_key in band_keys:
+            self._bands.setdefault(band_key, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+        return entry
+    
+    def _remove(self, key: Tuple[Optional[str], str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in entry.band_keys:
+            keys = self._bands.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band_key]
+    
+    def load_file(self, path: str) -> int:
+        """Pre-warm from a JSON list of {"question", "response"} objects"""
+        with open(path) as f:
+            items = json.load(f)
+        for item in items:
+            self.store(item["question"], item["response"])
+        return len(items)
+    
+    def stats(self) -> Dict[str, Any]:
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "skipped_context_dependent": self.skipped,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 2),
+            "avg_lookup_ms": round(self.lookup_ms_total / lookups, 4) if lookups else 0.0,
+        }
+
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_LEARN = os.environ.get('ANSWER_CACHE_LEARN', 'true').lower() == 'true'
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', '5000'))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('ANSWER_CACHE_THRESHOLD', '0.7'))
+ANSWER_CACHE_WARM_FILE = os.environ.get('ANSWER_CACHE_WARM_FILE')
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD)
+
+ANSWER_CACHE_SHARED_TTL = float(os.environ.get('ANSWER_CACHE_SHARED_TTL', '86400'))
+answer_cache_shared_hits = 0
+
+def answer_scope(api_keys: APIKeysModel) -> str:
+    """Who may be served a learned answer: the holder of the Gemini key it was made with.
+
+    Learned answers are built from a session's private transcript and
+    summary, so they must not reach other users. Session user_ids are
+    client-supplied; the key is the caller's actual credential.
+    """
+    return secret_digest(api_keys.gemini_api_key)
+
+def shared_answer_key(scope: str, normalized: str) -> str:
+    return state_key("answer", scope, hashlib.sha1(normalized.encode()).hexdigest())
+
+async def lookup_cached_answer(input: AIResponseRequest, scope: str) -> Optional[CachedAnswer]:
+    """Local near-duplicate lookup, then an exact lookup in the shared store"""
+    global answer_cache_shared_hits
+    if not ANSWER_CACHE_ENABLED or input.bypass_cache:
+        return None
+    cached = answer_cache.lookup(input.question, scope)
+    if cached is not None or not shared_state.state_store.shared:
+        return cached
+    
+    normalized = normalize_question(input.question)
+    if not answer_cache.cacheable(normalized):
+        return None
+    try:
+        raw = await shared_state.state_store.get(shared_answer_key(scope, normalized))
+    except Exception as e:
+        logging.warning(f"Shared answer cache lookup failed: {str(e)}")
+        return None
+    if raw is None:
+        return None
+    item = json.loads(raw)
+    answer_cache_shared_hits += 1
+    return answer_cache.insert(item["question"], item["response"], item.get("latency_ms"), scope)
+
+async def remember_answer(question: str, response: str, latency_ms: float, scope: str):
+    """Learn a generated answer, visible only within ``scope``"""
+    if not (ANSWER_CACHE_ENABLED and ANSWER_CACHE_LEARN):
+        return
+    entry = answer_cache.store(question, response, latency_ms, scope)
+    if entry is None or not shared_state.state_store.shared:
+        return
+    normalized = normalize_question(question)
+    try:
+        await shared_state.state_store.set(
+            shared_answer_key(scope, normalized),
+            json.dumps({"question": question, "response": response, "latency_ms": latency_ms}),
+            ttl=ANSWER_CACHE_SHARED_TTL
+        )
+    except Exception as e:
+        logging.warning(f"Shared answer cache write failed: {str(e)}")
@@ -0,0 +1,135 @@
+"""Lexical interviewer-question classifier"""
+import os
+from typing import Dict, Any
+import re
+import math
+import config  # noqa: F401  (loads .env before the settings below)
+
+QUESTION_THRESHOLD = float(os.environ.get('QUESTION_THRESHOLD', '0.5'))
+
+class QuestionClassifier:
+    """Scores an utterance for "is an interviewer question" without any I/O.
+
+    A hand-weighted logistic model over a few lexical features of the last
+    sentence (question mark, wh-/auxiliary opener, prompt verbs such as
+    "tell me" or "walk me through", directives such as "design a ...",
+    trailing conjunctions, small talk). Weights are tuned on
+    question_corpus.jsonl; ``python benchmark.py question-detector`` reports
+    precision/recall on the held-out question_holdout.jsonl.
+    """
+    
+    WH_WORDS = frozenset("what what's whats why how how's when where which who whom whose".split())
+    AUX_WORDS = frozenset(
+        "do does did is are was were can could would will should have has may might "
+        "didn't don't doesn't isn't aren't wasn't can't won't wouldn't".split()
+    )
+    DISCOURSE_MARKERS = frozenset("so and okay ok well alright now right great cool also then next question".split())
+    SUBJECT_WORDS = frozenset("i i'd i'm i've we we're we'd they he she it my our".split())
+    FIRST_PERSON = frozenset("i i'm i've i'd i'll my we we're we've our me".split())
+    SECOND_PERSON = frozenset("you you're you've you'd your yours yourself".split())
+    SMALL_TALK = frozenset(
+        "thanks thank you great okay ok sure nice cool hello hi bye awesome perfect right "
+        "yeah yes no hmm uh um exactly absolutely sounds good worries too much for having me that's".split()
+    )
+    TRAILING_CONTINUATIONS = frozenset("and or but so because then the a an".split())
+    PROMPT_VERBS = re.compile(
+        r"^(?:tell (?:me|us)|describe|explain|(?:walk|talk|take|run) (?:me|us) through|share|"
+        r"give me (?:an? |some )?(?:example|overview|summary|sense|rundown|walkthrough)|"
+        r"talk about|elaborate|help me understand|imagine|suppose|let's say|name)\b"
+    )
+    EMBEDDED_REQUESTS = re.compile(
+        r"\b(?:i'd (?:like|love) to (?:know|hear|understand)|i want to (?:know|hear|understand)|"
+        r"i'm curious|(?:can|could|would|will|do|did|have|are) you)\b"
+    )
+    # Interview tasks given as commands: "Go ahead and introduce yourself",
+    # "Next one: design a URL shortener". A copula right after marks the noun
+    # ("Design reviews were the fun part").
+    DIRECTIVE_LEAD_INS = re.compile(r"^(?:(?:go ahead and|please|(?:next )?one|your turn|let's|briefly|first|now) )+")
+    DIRECTIVES = re.compile(
+        r"^(?:design|build|implement|write|code|introduce|sketch|outline|draw|model|compare|estimate|"
+        r"summari[sz]e|list|pick|choose|define|calculate|solve|debug|optimi[sz]e|start|brief|create|"
+        r"go (?:through|over)|think of)\b(?! (?:[a-z']+ )?(?:is|was|are|were|has|had|took)\b)"
+    )
+    WEIGHTS = {
+        "bias": -2.0,
+        "question_mark": 3.0,
+        "wh_start": 2.0,
+        "aux_start": 1.5,
+        "prompt_verb": 2.5,
+        "directive": 3.0,
+        "embedded_request": 1.5,
+        "second_person": 0.8,
+        "first_person_start": -1.5,
+        "wh_statement": -3.0,
+        "small_talk": -3.0,
+        "trailing_continuation": -3.0,
+        "too_short": -2.0,
+    }
+    
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.scored = 0
+        self.rejected = 0
+    
+    def features(self, text: str) -> Dict[str, float]:
+        """Active features of the utterance (all binary)"""
+        stripped = text.strip()
+        # Interviewers often lead in with a remark; the question is the last sentence
+        sentences = [part for part in re.split(r"(?<=[.!?])\s+", stripped) if part.strip()]
+        last = sentences[-1] if sentences else stripped
+        words = re.findall(r"[a-z']+", last.lower())
+        
+        active = {"bias": 1.0}
+        if last.endswith("?"):
+            active["question_mark"] = 1.0
+        if stripped.endswith(",") or (words and words[-1] in self.TRAILING_CONTINUATIONS and not last.endswith((".", "?", "!"))):
+            active["trailing_continuation"] = 1.0
+        if len(words) < 3:
+            active["too_short"] = 1.0
+        if words and sum(word in self.SMALL_TALK for word in words) / len(words) >= 0.6:
+            active["small_talk"] = 1.0
+        if any(word in self.SECOND_PERSON for word in words):
+            active["second_person"] = 1.0
+        
+        start = 0
+        while start < len(words) - 1 and words[start] in self.DISCOURSE_MARKERS:
+            start += 1
+        opener = words[start:]
+        phrase = " ".join(opener)
+        command = self.DIRECTIVE_LEAD_INS.sub("", phrase)
+        if opener:
+            if opener[0] in self.WH_WORDS:
+                # "What I did was ...", "How we solved it ..." are answers, not questions
+                if len(opener) > 1 and opener[1] in self.SUBJECT_WORDS:
+                    active["wh_statement"] = 1.0
+                else:
+                    active["wh_start"] = 1.0
+            elif opener[0] in self.AUX_WORDS:
+                active["aux_start"] = 1.0
+            elif opener[0] in self.FIRST_PERSON:
+                active["first_person_start"] = 1.0
+            if self.PROMPT_VERBS.match(command):
+                active["prompt_verb"] = 1.0
+            elif self.DIRECTIVES.match(command):
+                active["directive"] = 1.0
+        if self.EMBEDDED_REQUESTS.search(phrase):
+            active["embedded_request"] = 1.0
+            active.pop("first_person_start", None)
+        return active
+    
+    def score(self, text: str) -> float:
+        """Probability-like score in [0, 1]"""
+        self.scored += 1
+        total = sum(self.WEIGHTS[name] * value for name, value in self.features(text).items())
+        return 1.0 / (1.0 + math.exp(-total))
+    
+    def is_question(self, text: str) -> bool:
+        question = self.score(text) >= self.threshold
+        if not question:
+            self.rejected += 1
+        return question
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"threshold": self.threshold, "scored": self.scored, "rejected": self.rejected}
+
+question_classifier = QuestionClassifier(QUESTION_THRESHOLD)
@@ -0,0 +1,192 @@
+"""In-process BM25F transcript search index and the Mongo text search fallback"""
+from typing import List, Optional, Dict, Any, Tuple
+import asyncio
+import re
+import math
+import heapq
+import database
+
+# Full-text search. Queries are split into stemmed terms, matched with OR and
+# ranked (Mongo's textScore, or BM25 over weighted fields in memory). Snippets
+# and highlight offsets are computed here for both backends.
+SEARCH_PAGE_MAX = 100
+SEARCH_OFFSET_MAX = 1000
+SEARCH_SNIPPET_CHARS = 160
+SEARCH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+SEARCH_STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have how i if in into is it its "
+    "me my of on or our so than that the their them then there these they this to was we were "
+    "what when where which who why will with you your".split()
+)
+SEARCH_SUFFIXES = ("izations", "ization", "ations", "ation", "ings", "ing", "ized", "izes", "ize", "ers", "er", "ed", "es", "ly", "s")
+# collection -> (hit type, searchable fields with their weights)
+SEARCH_SOURCES: Dict[str, Tuple[str, Dict[str, float]]] = {
+    "transcripts": ("transcript", {"text": 1.0}),
+    "ai_responses": ("ai_response", {"question": 3.0, "response": 1.0}),
+}
+
+def search_stem(word: str) -> str:
+    """Light suffix stripping so "optimize" and "optimization" meet"""
+    for suffix in SEARCH_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+def search_terms(text: str) -> List[str]:
+    return [search_stem(word) for word in SEARCH_TOKEN_RE.findall(text.lower()) if word not in SEARCH_STOPWORDS]
+
+def highlight(text: str, terms: set) -> Tuple[str, List[Tuple[int, int]]]:
+    """A snippet around the densest run of matches, with match offsets"""
+    matches = [
+        match.span() for match in SEARCH_TOKEN_RE.finditer(text.lower())
+        if match.group() not in SEARCH_STOPWORDS and search_stem(match.group()) in terms
+    ]
+    if len(text) <= SEARCH_SNIPPET_CHARS:
+        return text, matches
+    best_start, best_count = 0, 0
+    for i, (start, _) in enumerate(matches):
+        count = sum(1 for other, _ in matches[i:] if other < start + SEARCH_SNIPPET_CHARS)
+        if count > best_count:
+            best_start, best_count = start, count
+    # Open the window a little before the first match, on a word boundary
+    window_start = max(0, min(best_start - SEARCH_SNIPPET_CHARS // 4, len(text) - SEARCH_SNIPPET_CHARS))
+    if window_start:
+        space = text.rfind(" ", 0, window_start + 1)
+        window_start = space + 1 if space >= 0 and window_start - space < 20 else window_start
+    window_end = min(len(text), window_start + SEARCH_SNIPPET_CHARS)
+    prefix = "… " if window_start else ""
+    suffix = " …" if window_end < len(text) else ""
+    shift = len(prefix) - window_start
+    spans = [(start + shift, end + shift) for start, end in matches if start >= window_start and end <= window_end]
+    return prefix + text[window_start:window_end] + suffix, spans
+
+class InvertedIndex:
+    """In-process BM25F index over the search sources.
+
+    Term frequencies are length-normalized per field, then combined with the
+    field weights. The first search loads the existing documents from Mongo;
+    new documents are added as they are written, and archived sessions are
+    dropped.
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    
+    def __init__(self, sources: Dict[str, Tuple[str, Dict[str, float]]]):
+        self.sources = sources
+        self.postings: Dict[str, Dict[str, Dict[str, int]]] = {}  # term -> doc key -> field -> tf
+        self.documents: Dict[str, Tuple[str, Dict[str, Any], Dict[str, int]]] = {}  # key -> (collection, doc, field lengths)
+        self.session_keys: Dict[str, set] = {}
+        self.field_lengths: Dict[Tuple[str, str], int] = {}  # (collection, field) -> total length
+        self.collection_sizes: Dict[str, int] = {}
+        self.loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+    
+    def add(self, collection: str, doc: Dict[str, Any]):
+        key = f"{collection}:{doc['id']}"
+        if key in self.documents:
+            return
+        fields = self.sources[collection][1]
+        lengths = {}
+        for field in fields:
+            terms = search_terms(doc.get(field) or "")
+            lengths[field] = len(terms)
+            self.field_lengths[(collection, field)] = self.field_lengths.get((collection, field), 0) + len(terms)
+            for term in terms:
+                frequencies = self.postings.setdefault(term, {}).setdefault(key, {})
+                frequencies[field] = frequencies.get(field, 0) + 1
+        stored = {name: doc.get(name) for name in ("id", "session_id", "timestamp", *fields)}
+        self.documents[key] = (collection, stored, lengths)
+        self.collection_sizes[collection] = self.collection_sizes.get(collection, 0) + 1
+        self.session_keys.setdefault(doc["session_id"], set()).add(key)
+    
+    def discard_session(self, session_id: str):
+        for key in self.session_keys.pop(session_id, ()):
+            collection, doc, lengths = self.documents.pop(key)
+            self.collection_sizes[collection] -= 1
+            for field, length in lengths.items():
+                self.field_lengths[(collection, field)] -= length
+            for term in set(search_terms(" ".join(doc.get(field) or "" for field in lengths))):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self.postings[term]
+    
+    async def ensure_loaded(self):
+        if self.loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self.loaded:
+                return
+            for collection, (_, fields) in self.sources.items():
+                projection = {"_id": 0, "id": 1, "session_id": 1, "timestamp": 1, **{field: 1 for field in fields}}
+                async for doc in database.db[collection].find({}, projection):
+                    self.add(collection, doc)
+            self.loaded = True
+    
+    def search(self, terms: List[str], session_ids: set, collections: List[str], limit: int) -> List[Tuple[float, str, Dict[str, Any]]]:
+        if not self.documents:
+            return []
+        # Per (collection, field): weight / length normalization slope, so the
+        # loop below is one multiply-add per field
+        field_factors = {
+            collection: {
+                field: (weight, self.B / ((self.field_lengths.get((collection, field), 0) / self.collection_sizes[collection]) or 1.0))
+                for field, weight in self.sources[collection][1].items()
+            }
+            for collection in collections if self.collection_sizes.get(collection)
+        }
+        base = 1 - self.B
+        k1 = self.K1
+        documents = self.documents
+        postings_by_term = {term: self.postings[term] for term in set(terms) if term in self.postings}
+        scoped_keys = [key for session_id in session_ids for key in self.session_keys.get(session_id, ())]
+        scores: Dict[str, float] = {}
+        for term, postings in postings_by_term.items():
+            idf = math.log(1 + (len(documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+            # Walk whichever side is shorter: the term's postings or the scope's documents
+            if len(scoped_keys) < len(postings):
+                candidates = ((key, postings[key]) for key in scoped_keys if key in postings)
+            else:
+                candidates = postings.items()
+            for key, frequencies in candidates:
+                collection, doc, lengths = documents[key]
+                factors = field_factors.get(collection)
+                if factors is None or doc["session_id"] not in session_ids:
+                    continue
+                weighted = 0.0
+                for field, frequency in frequencies.items():
+                    weight, slope = factors[field]
+                    weighted += weight * frequency / (base + slope * lengths[field])
+                scores[key] = scores.get(key, 0.0) + idf * weighted * (k1 + 1) / (weighted + k1)
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(score, self.documents[key][0], self.documents[key][1]) for key, score in top]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"loaded": self.loaded, "documents": len(self.documents), "terms": len(self.postings)}
+
+search_index = InvertedIndex(SEARCH_SOURCES)
+
+def index_for_search(collection: str, doc: Dict[str, Any]):
+    if database.SEARCH_BACKEND == "memory":
+        search_index.add(collection, doc)
+
+async def mongo_search(query: str, scope: Dict[str, Any], collections: List[str], limit: int) -> List[Tuple[float, str, Dict[str, Any]]]:
+    async def run(collection: str):
+        weights = SEARCH_SOURCES[collection][1]
+        projection = {
+            "_id": 0, "id": 1, "session_id": 1, "timestamp": 1,
+            "score": {"$meta": "textScore"}, **{field: 1 for field in weights},
+        }
+        cursor = database.db[collection].find({"$text": {"$search": query}, **scope}, projection)
+        docs = await cursor.sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit)
+        return [(doc.pop("score"), collection, doc) for doc in docs]
+    
+    results = await asyncio.gather(*(run(collection) for collection in collections))
+    return [hit for hits in results for hit in hits]
@@ -1,57 +1,101 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
-from fastapi import Request
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from fastapi import Request, Response, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
-from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
-import uuid
+from typing import List, Optional
 from datetime import datetime
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from emergentintegrations.llm.chat import UserMessage
 import asyncio
+import time
 import json
 import base64
-import aiohttp
-from google.cloud import speech
-from google.oauth2 import service_account
-import io
+import signal
 from functools import wraps
-import hashlib
-import hmac
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+import config  # noqa: F401  (loads .env before the settings below)
+from models import (
+    APIKeysModel, InterviewSession, InterviewSessionCreate, TranscriptEntry, TranscriptCreate,
+    AIResponse, AIResponseRequest, QuestionScoreRequest, QuestionScore, SearchHit, SearchResults,
+    AudioTranscriptionRequest, AudioTranscriptionResponse, StatusCheck, StatusCheckCreate
+)
+from metrics import (
+    METRICS_ENABLED, time_stage, count_upstream_error, MetricsMiddleware, render_metrics,
+    rate_limit_exceeded
+)
+import shared_state
+from shared_state import REDIS_URL, state_key
+import database
+from database import DatabaseConfigError, check_indexes, bootstrap_database
+import sessions
+from sessions import session_cache, get_cached_session, invalidate_session
+from auth import (
+    SESSION_TOKEN_PREFIX, SESSION_TOKEN_TTL, KEY_VALIDATION_TTL, secret_digest,
+    issue_session_token, resolve_api_keys, get_api_keys, get_optional_api_keys
+)
+import http_pool
+from http_pool import http_pool_stats
+import upstream
+from upstream import (
+    AI_REQUEST_BUDGET_MS, TRANSCRIBE_REQUEST_BUDGET_MS, UPSTREAM_RESERVE_MS, GEMINI_TIMEOUT,
+    latency_budget
+)
+from speech import MAX_AUDIO_FRAME_BYTES, is_base64, speech_encoding, recognize_speech
+from vad import VAD_ENABLED, vad
+from aggregation import (
+    AGGREGATION_MAX_MS, AudioFlush, AudioAggregator, audio_aggregator, WebMFrameAssembler
+)
+import audio_socket
+from audio_socket import (
+    WS_CLOSE_UNAUTHORIZED, WS_CLOSE_NOT_FOUND, WS_CLOSE_BAD_REQUEST, WS_CLOSE_ENDED,
+    WS_CLOSE_RATE_LIMITED, MessageThrottle, SessionEnded
+)
+from listing import render_model, FAST_SERIALIZATION, row_shape, render_documents, list_documents
+import write_behind
+from question_detector import question_classifier
+import llm
+from llm import create_gemini_chat, stream_llm_tokens, format_sse
+from context import transcript_buffer, summarizer, bump_context_version, build_ai_prompt
+from search import (
+    SEARCH_PAGE_MAX, SEARCH_OFFSET_MAX, SEARCH_SOURCES, search_terms, highlight, search_index,
+    index_for_search, mongo_search
+)
+import question_cache
+from question_cache import (
+    ANSWER_CACHE_WARM_FILE, answer_cache, answer_scope, lookup_cached_answer, remember_answer
+)
+from speculative import speculation
+from archive import session_archiver, ensure_restored
+from transcription import transcribe_session_audio, store_transcript
+from singleflight import ai_singleflight
+from ai_responses import (
+    NotAQuestion, validate_ai_response_request, ai_request_key, produce_ai_response
+)
 
 # Rate limiting setup
-limiter = Limiter(key_func=get_remote_address)
-
-# MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'interview_copilot')]
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=REDIS_URL or "memory://",
+    in_memory_fallback_enabled=bool(REDIS_URL),
+)
 
 # Security configuration
-JWT_SECRET = os.environ.get('JWT_SECRET_KEY', 'your-super-secret-jwt-key-here')
 CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
 # Create the main app without a prefix
 app = FastAPI(title="Interview Copilot API", version="1.0.0")
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded)
+app.state.ready = False
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Security
-security = HTTPBearer(auto_error=False)
-
 # Input validation decorator
 def validate_session_id(func):
     @wraps(func)
@@ -62,84 +106,15 @@ def validate_session_id(func):
         return await func(*args, **kwargs)
     return wrapper
 
-# Models
-class APIKeysModel(BaseModel):
-    google_speech_api_key: str
-    gemini_api_key: str
-
-class InterviewSession(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    is_active: bool = True
-    user_id: Optional[str] = None
-
-class InterviewSessionCreate(BaseModel):
-    user_id: Optional[str] = None
-
-class TranscriptEntry(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    session_id: str
-    text: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    speaker: str = "interviewer"
-    confidence: Optional[float] = None
-
-class TranscriptCreate(BaseModel):
-    session_id: str
-    text: str
-    speaker: str = "interviewer"
-    confidence: Optional[float] = None
-
-class AIResponse(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    session_id: str
-    question: str
-    response: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-
-class AIResponseRequest(BaseModel):
-    session_id: str
-    question: str
-
-class AudioTranscriptionRequest(BaseModel):
-    session_id: str
-    audio_data: str  # Base64 encoded audio
-    audio_format: str = "webm"
-    sample_rate: int = 16000
-
-class AudioTranscriptionResponse(BaseModel):
-    transcript: str
-    confidence: float
-    session_id: str
-
-class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    client_name: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-
-class StatusCheckCreate(BaseModel):
-    client_name: str
-
-# Global storage for API keys (in production, use proper session management)
-user_api_keys: Dict[str, APIKeysModel] = {}
-
-async def get_api_keys(credentials: HTTPAuthorizationCredentials = Depends(security)) -> APIKeysModel:
-    """Extract API keys from request headers or session"""
-    if not credentials:
-        raise HTTPException(status_code=401, detail="API keys required")
-    
-    # In this implementation, we'll pass API keys in the Authorization header as JSON
-    try:
-        keys_data = json.loads(base64.b64decode(credentials.credentials).decode())
-        return APIKeysModel(**keys_data)
-    except Exception as e:
-        raise HTTPException(status_code=401, detail="Invalid API keys format")
-
 # API Key validation endpoint
 @api_router.post("/validate-keys")
 @limiter.limit("10/minute")
 async def validate_api_keys(request: Request, keys: APIKeysModel):
-    """Validate provided API keys"""
+    """Validate provided API keys and issue a session token for them.
+
+    A successful Gemini check is remembered by HMAC of the key for
+    KEY_VALIDATION_TTL, so re-validating the same key skips the upstream call.
+    """
     # Input validation
     if not keys.google_speech_api_key or len(keys.google_speech_api_key) < 20:
         raise HTTPException(status_code=400, detail="Invalid Google Speech API key format")
@@ -148,123 +123,375 @@ async def validate_api_keys(request: Request, keys: APIKeysModel):
         raise HTTPException(status_code=400, detail="Invalid Gemini API key format")
     
     try:
-        # Test Gemini API key
-        try:
-            chat = LlmChat(
-                api_key=keys.gemini_api_key,
-                session_id="test",
-                system_message="Test message"
-            ).with_model("gemini", "gemini-2.5-flash").with_max_tokens(10)
-            
-            test_message = UserMessage(text="Hello")
-            await chat.send_message(test_message)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid Gemini API key: {str(e)}")
-        
-        # Test Google Speech API key (basic validation)
-        if not keys.google_speech_api_key or len(keys.google_speech_api_key) < 20:
-            raise HTTPException(status_code=400, detail="Invalid Google Speech API key format")
+        validation_key = state_key("valid", "gemini", secret_digest(keys.gemini_api_key))
+        if await shared_state.state_store.get(validation_key) is None:
+            # Test Gemini API key
+            try:
+                chat = llm.llm_chat_factory(
+                    api_key=keys.gemini_api_key,
+                    session_id="test",
+                    system_message="Test message"
+                ).with_model("gemini", "gemini-2.5-flash").with_max_tokens(10)
+                
+                test_message = UserMessage(text="Hello")
+                await chat.send_message(test_message)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Invalid Gemini API key: {str(e)}")
+            await shared_state.state_store.set(validation_key, "1", ttl=KEY_VALIDATION_TTL)
         
-        return {"status": "valid", "message": "API keys validated successfully"}
+        token = await issue_session_token(keys)
+        return {
+            "status": "valid",
+            "message": "API keys validated successfully",
+            "token": token,
+            "expires_in": int(SESSION_TOKEN_TTL)
+        }
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Validation error: {str(e)}")
 
-# Audio transcription endpoint
 @api_router.post("/transcribe-audio", response_model=AudioTranscriptionResponse)
 @limiter.limit("30/minute")
-async def transcribe_audio(http_request: Request, request: AudioTranscriptionRequest, api_keys: APIKeysModel = Depends(get_api_keys)):
+async def transcribe_audio(request: Request, input: AudioTranscriptionRequest, background_tasks: BackgroundTasks, api_keys: APIKeysModel = Depends(get_api_keys)):
     """Transcribe audio using Google Speech-to-Text API"""
     # Input validation
-    if not request.session_id or len(request.session_id) < 10:
+    if not input.session_id or len(input.session_id) < 10:
         raise HTTPException(status_code=400, detail="Invalid session ID")
     
-    if not request.audio_data or len(request.audio_data) < 100:
+    if not input.audio_data or len(input.audio_data) < 100:
         raise HTTPException(status_code=400, detail="Invalid audio data")
     
+    # The client already sent base64, which is what Speech expects, so the
+    # string is validated and forwarded without a decode/encode round trip
+    with time_stage("base64"):
+        valid = is_base64(input.audio_data)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid audio data: not valid base64")
+    
+    with latency_budget(TRANSCRIBE_REQUEST_BUDGET_MS):
+        return await transcribe_session_audio(
+            input.session_id,
+            input.audio_data.encode('ascii'),
+            input.sample_rate,
+            api_keys,
+            persist=input.persist,
+            speaker=input.speaker,
+            background_tasks=background_tasks if input.persist_in_background else None,
+            encoding=speech_encoding(input.audio_format),
+            energy=input.energy,
+            energy_frame_ms=input.energy_frame_ms,
+            aggregate=input.aggregate,
+            flush=input.flush
+        )
+
+@api_router.post("/transcribe-audio/raw", response_model=AudioTranscriptionResponse)
+@limiter.limit("30/minute")
+async def transcribe_audio_raw(
+    request: Request,
+    session_id: str,
+    background_tasks: BackgroundTasks,
+    sample_rate: int = 16000,
+    audio_format: str = "webm",
+    energy: Optional[str] = None,
+    energy_frame_ms: int = Query(100, gt=0),
+    aggregate: bool = False,
+    flush: bool = False,
+    persist: bool = False,
+    persist_in_background: bool = False,
+    speaker: str = "interviewer",
+    api_keys: APIKeysModel = Depends(get_api_keys)
+):
+    """Transcribe binary audio sent as application/octet-stream or multipart.
+
+    For multipart uploads the audio is read from the ``audio`` file field.
+    The bytes are base64 encoded exactly once, for the Speech request (PCM
+    after VAD trimming). Options mirror the JSON endpoint and are passed as
+    query parameters; ``energy`` is a comma-separated list of RMS levels.
+    ``aggregate`` buffers in this process, so with several workers a
+    session's uploads need sticky routing; the WebSocket does not.
+    """
+    if not session_id or len(session_id) < 10:
+        raise HTTPException(status_code=400, detail="Invalid session ID")
+    
+    encoding = speech_encoding(audio_format)
     try:
-        # Verify session exists
-        session = await db.interview_sessions.find_one({"id": request.session_id})
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Decode base64 audio data
+        levels = [float(level) for level in energy.split(",")] if energy else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid energy summary")
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_AUDIO_FRAME_BYTES:
+        raise HTTPException(status_code=413, detail="Audio data too large")
+    
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("audio")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing audio file field")
+        audio_data = await upload.read()
+        await form.close()
+    else:
+        audio_data = await request.body()
+    
+    if len(audio_data) < 75:
+        raise HTTPException(status_code=400, detail="Invalid audio data")
+    if len(audio_data) > MAX_AUDIO_FRAME_BYTES:
+        raise HTTPException(status_code=413, detail="Audio data too large")
+    
+    if encoding == "LINEAR16" or aggregate:
+        # Encoded once trimming or aggregation has decided what to send
+        audio_content = None
+    else:
+        with time_stage("base64"):
+            audio_content = base64.b64encode(audio_data)
+    
+    with latency_budget(TRANSCRIBE_REQUEST_BUDGET_MS):
+        return await transcribe_session_audio(
+            session_id,
+            audio_content,
+            sample_rate,
+            api_keys,
+            persist=persist,
+            speaker=speaker,
+            background_tasks=background_tasks if persist_in_background else None,
+            encoding=encoding,
+            energy=levels,
+            energy_frame_ms=energy_frame_ms,
+            raw_audio=audio_data if encoding == "LINEAR16" or aggregate else None,
+            aggregate=aggregate,
+            flush=flush
+        )
+
+@api_router.websocket("/interview/ws/{session_id}")
+async def audio_websocket(websocket: WebSocket, session_id: str):
+    """Persistent audio ingestion socket for one interview session.
+
+    The first message must be ``{"type": "auth", "token": ...}`` carrying a
+    session token from /api/validate-keys; clients that can set headers may
+    send it as ``Authorization: Bearer`` instead. Raw keys and tokens in the
+    URL are refused. Binary
+    frames are raw Opus/WebM audio; each one is answered with a
+    ``transcript`` event, which includes the saved ``entry`` when the socket
+    was opened with ``?persist=true``. Text frames accept ``{"type": "config",
+    "sample_rate": ...}``, ``{"type": "ping"}`` and ``{"type": "energy",
+    "levels": [...], "frame_ms": 100}`` describing the next binary frame, which
+    is skipped without a Speech call when the levels show silence. With
+    ``?aggregate=true`` frames are buffered and transcribed on pauses, at the
+    latency budget or on ``{"type": "flush"}``; events then carry
+    ``flush_reason``. A connection sending faster than WS_MESSAGES_PER_SECOND
+    is closed with 4429, and one whose session has ended with 4409.
+    """
+    await websocket.accept()
+    
+    async def reject(code: int, detail: str):
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=code)
+    
+    # Authenticate once for the lifetime of the socket
+    if "token" in websocket.query_params:
+        await reject(WS_CLOSE_UNAUTHORIZED, "Send the session token in an auth message, not the URL")
+        return
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    else:
         try:
-            audio_data = base64.b64decode(request.audio_data)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid audio data: {str(e)}")
-        
-        # Create Google Speech client with API key
+            auth = json.loads(await asyncio.wait_for(websocket.receive_text(), timeout=audio_socket.WS_AUTH_TIMEOUT_SECONDS))
+        except asyncio.TimeoutError:
+            await reject(WS_CLOSE_UNAUTHORIZED, "API keys required")
+            return
+        except WebSocketDisconnect:
+            return
+        except (ValueError, KeyError, RuntimeError):
+            await reject(WS_CLOSE_UNAUTHORIZED, "Expected an auth message")
+            return
+        token = auth.get("token") if isinstance(auth, dict) and auth.get("type") == "auth" else None
+    if not isinstance(token, str) or not token:
+        await reject(WS_CLOSE_UNAUTHORIZED, "API keys required")
+        return
+    if not token.startswith(SESSION_TOKEN_PREFIX):
+        await reject(WS_CLOSE_UNAUTHORIZED, "Session token required")
+        return
+    try:
+        api_keys = await resolve_api_keys(token)
+    except HTTPException as e:
+        await reject(WS_CLOSE_UNAUTHORIZED, e.detail)
+        return
+    
+    if not session_id or len(session_id) < 10:
+        await reject(WS_CLOSE_BAD_REQUEST, "Invalid session ID")
+        return
+    
+    # Verify session exists once at connect
+    session = await get_cached_session(session_id)
+    if not session:
+        await reject(WS_CLOSE_NOT_FOUND, "Session not found")
+        return
+    if not session.get("is_active", True):
+        await reject(WS_CLOSE_ENDED, "Session has ended")
+        return
+    
+    try:
+        sample_rate = int(websocket.query_params.get("sample_rate", 16000))
+    except ValueError:
+        await reject(WS_CLOSE_BAD_REQUEST, "Invalid sample rate")
+        return
+    persist = websocket.query_params.get("persist", "false").lower() == "true"
+    speaker = websocket.query_params.get("speaker", "interviewer")
+    
+    aggregate = websocket.query_params.get("aggregate", "false").lower() == "true"
+    
+    assembler = WebMFrameAssembler()
+    sequence = 0
+    pending_energy = None
+    throttle = MessageThrottle(audio_socket.WS_MESSAGES_PER_SECOND, audio_socket.WS_MESSAGE_BURST)
+    checked_at = time.monotonic()
+    
+    async def ensure_active():
+        """Re-read is_active, at most once per WS_SESSION_RECHECK_SECONDS"""
+        nonlocal checked_at
+        if time.monotonic() - checked_at < audio_socket.WS_SESSION_RECHECK_SECONDS:
+            return
+        current = await database.db.interview_sessions.find_one({"id": session_id}, {"_id": 0, "is_active": 1})
+        checked_at = time.monotonic()
+        if not current or not current.get("is_active", True):
+            raise SessionEnded()
+    
+    async def send_transcript(audio: bytes, flush: Optional[AudioFlush] = None):
+        await ensure_active()
         try:
-            # For API key authentication, we'll use the REST API directly
-            async with aiohttp.ClientSession() as session:
-                url = f"https://speech.googleapis.com/v1/speech:recognize?key={api_keys.google_speech_api_key}"
-                
-                # Prepare the request payload
-                payload = {
-                    "config": {
-                        "encoding": "WEBM_OPUS",
-                        "sampleRateHertz": request.sample_rate,
-                        "languageCode": "en-US",
-                        "enableAutomaticPunctuation": True,
-                        "model": "latest_long"
-                    },
-                    "audio": {
-                        "content": base64.b64encode(audio_data).decode('utf-8')
-                    }
-                }
-                
-                async with session.post(url, json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise HTTPException(status_code=400, detail=f"Google Speech API error: {error_text}")
-                    
-                    result = await response.json()
-                    
-                    # Extract transcript and confidence
-                    transcript = ""
-                    confidence = 0.0
-                    
-                    if "results" in result and result["results"]:
-                        for result_item in result["results"]:
-                            if "alternatives" in result_item and result_item["alternatives"]:
-                                alternative = result_item["alternatives"][0]
-                                transcript += alternative.get("transcript", "")
-                                confidence = max(confidence, alternative.get("confidence", 0.0))
-                    
-                    if not transcript.strip():
-                        transcript = ""
-                        confidence = 0.0
-                    
-                    return AudioTranscriptionResponse(
-                        transcript=transcript.strip(),
-                        confidence=confidence,
-                        session_id=request.session_id
-                    )
-                    
-        except aiohttp.ClientError as e:
-            raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
+            with latency_budget(TRANSCRIBE_REQUEST_BUDGET_MS):
+                transcript, confidence = await recognize_speech(
+                    api_keys.google_speech_api_key,
+                    base64.b64encode(audio),
+                    sample_rate
+                )
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "sequence": sequence, "detail": e.detail})
+            return
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
+            logging.error(f"WebSocket transcription error: {str(e)}")
+            await websocket.send_json({"type": "error", "sequence": sequence, "detail": f"Transcription error: {str(e)}"})
+            return
+        if flush is not None:
+            transcript = audio_aggregator.finish(session_id, flush, transcript)
+        
+        event = {
+            "type": "transcript",
+            "sequence": sequence,
+            "session_id": session_id,
+            "transcript": transcript,
+            "confidence": confidence
+        }
+        if flush is not None:
+            event["flush_reason"] = flush.reason
+        if persist and transcript:
+            await ensure_active()
+            entry = TranscriptEntry(session_id=session_id, text=transcript, speaker=speaker, confidence=confidence)
+            try:
+                await store_transcript(entry, api_keys)
+                event["entry"] = jsonable_encoder(entry)
+            except Exception as e:
+                logging.error(f"Failed to save WebSocket transcript: {str(e)}")
+                event["persist_error"] = "Failed to save transcript"
+        await websocket.send_json(event)
+    
+    async def send_silence():
+        await websocket.send_json({
+            "type": "transcript",
+            "sequence": sequence,
+            "session_id": session_id,
+            "transcript": "",
+            "confidence": 0.0,
+            "skipped_silence": True
+        })
+    
+    await websocket.send_json({"type": "ready", "session_id": session_id})
+    
+    try:
+        while True:
+            # Buffered audio waits at most one latency budget for the next frame
+            if aggregate and audio_aggregator.pending_ms(session_id):
+                try:
+                    message = await asyncio.wait_for(websocket.receive(), timeout=AGGREGATION_MAX_MS / 1000)
+                except asyncio.TimeoutError:
+                    flush = audio_aggregator.flush(session_id, "idle")
+                    if flush is not None:
+                        await send_transcript(flush.audio, flush)
+                    continue
+            else:
+                message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if not throttle.allow():
+                await reject(WS_CLOSE_RATE_LIMITED, "Too many messages")
+                break
             
-    except HTTPException:
-        raise
-    except Exception as e:
-        logging.error(f"Transcription error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to transcribe audio: {str(e)}")
+            if message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    await websocket.send_json({"type": "error", "detail": "Invalid control message"})
+                    continue
+                if control.get("type") == "ping":
+                    await websocket.send_json({"type": "pong"})
+                elif control.get("type") == "config" and isinstance(control.get("sample_rate"), int):
+                    sample_rate = control["sample_rate"]
+                elif control.get("type") == "energy" and isinstance(control.get("levels"), list):
+                    levels = control["levels"]
+                    frame_ms = control.get("frame_ms", 100)
+                    if all(isinstance(level, (int, float)) for level in levels) and isinstance(frame_ms, int) and frame_ms > 0:
+                        pending_energy = (levels, frame_ms)
+                elif control.get("type") == "flush" and aggregate:
+                    flush = audio_aggregator.flush(session_id)
+                    if flush is not None:
+                        await send_transcript(flush.audio, flush)
+                continue
+            
+            frame = message.get("bytes")
+            if not frame or len(frame) < 75:
+                continue
+            if len(frame) > MAX_AUDIO_FRAME_BYTES:
+                await websocket.send_json({"type": "error", "detail": "Audio frame too large"})
+                continue
+            
+            sequence += 1
+            energy, pending_energy = pending_energy, None
+            if aggregate:
+                levels, frame_ms = energy if energy is not None else (None, 100)
+                flush = audio_aggregator.add(session_id, frame, "WEBM_OPUS", sample_rate, levels, frame_ms)
+                if flush is AudioAggregator.SILENT:
+                    await send_silence()
+                elif flush is not AudioAggregator.PENDING:
+                    await send_transcript(flush.audio, flush)
+                continue
+            
+            # Always assemble so the stream header is captured even from a silent first frame
+            audio = assembler.assemble(frame)
+            if energy is not None and VAD_ENABLED and not vad.screen_energy(*energy):
+                await send_silence()
+                continue
+            await send_transcript(audio)
+    except WebSocketDisconnect:
+        pass
+    except SessionEnded:
+        session_cache.pop(session_id)
+        await reject(WS_CLOSE_ENDED, "Session has ended")
+    finally:
+        if aggregate:
+            audio_aggregator.discard(session_id)
 
 # Interview Session Management
 @api_router.post("/interview/session", response_model=InterviewSession)
 @limiter.limit("10/minute")
 async def create_interview_session(request: Request, input: InterviewSessionCreate):
     session_obj = InterviewSession(**input.dict())
-    await db.interview_sessions.insert_one(session_obj.dict())
-    
-    # Create indexes for better performance
-    await db.interview_sessions.create_index("id")
-    await db.interview_sessions.create_index("created_at")
+    await database.db.interview_sessions.insert_one(session_obj.dict())
+    invalidate_session(session_obj.id)
+    transcript_buffer.prime(session_obj.id, [])
     
     return session_obj
 
@@ -274,21 +501,53 @@ async def get_interview_session(request: Request, session_id: str):
     if not session_id or len(session_id) < 10:
         raise HTTPException(status_code=400, detail="Invalid session ID")
         
-    session = await db.interview_sessions.find_one({"id": session_id})
+    session = await database.db.interview_sessions.find_one({"id": session_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return InterviewSession(**session)
+
+@api_router.post("/interview/session/{session_id}/end", response_model=InterviewSession)
+@limiter.limit("10/minute")
+async def end_interview_session(request: Request, session_id: str):
+    if not session_id or len(session_id) < 10:
+        raise HTTPException(status_code=400, detail="Invalid session ID")
+    
+    await database.db.interview_sessions.update_one(
+        {"id": session_id, "is_active": True},
+        {"$set": {"is_active": False, "ended_at": datetime.utcnow()}}
+    )
+    session = await database.db.interview_sessions.find_one({"id": session_id}, {"_id": 0})
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    invalidate_session(session_id)
+    await bump_context_version(session_id)
     return InterviewSession(**session)
 
 @api_router.get("/interview/sessions", response_model=List[InterviewSession])
 @limiter.limit("20/minute")
-async def get_all_sessions(request: Request):
-    sessions = await db.interview_sessions.find().to_list(100)
-    return [InterviewSession(**session) for session in sessions]
+async def get_all_sessions(
+    request: Request,
+    response: Response,
+    user_id: Optional[str] = None,
+    limit: Optional[int] = 100,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+    order: str = "desc"
+):
+    """Sessions newest first unless ``order=asc``"""
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    query = {"user_id": user_id} if user_id else {}
+    return await list_documents(
+        database.db.interview_sessions, query, InterviewSession, "created_at",
+        response, limit, after, fields, format, descending=order == "desc"
+    )
 
 # Transcript Management
 @api_router.post("/interview/transcript", response_model=TranscriptEntry)
 @limiter.limit("100/minute")
-async def add_transcript(request: Request, input: TranscriptCreate):
+async def add_transcript(request: Request, input: TranscriptCreate, api_keys: Optional[APIKeysModel] = Depends(get_optional_api_keys)):
     # Input validation
     if not input.session_id or len(input.session_id) < 10:
         raise HTTPException(status_code=400, detail="Invalid session ID")
@@ -300,112 +559,339 @@ async def add_transcript(request: Request, input: TranscriptCreate):
         raise HTTPException(status_code=400, detail="Transcript text too long")
     
     # Verify session exists
-    session = await db.interview_sessions.find_one({"id": input.session_id})
+    session = await get_cached_session(input.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    if not session.get("is_active", True):
+        raise HTTPException(status_code=409, detail="Session has ended")
     
     transcript_obj = TranscriptEntry(**input.dict())
-    await db.transcripts.insert_one(transcript_obj.dict())
-    
-    # Create indexes for better performance
-    await db.transcripts.create_index([("session_id", 1), ("timestamp", 1)])
+    await store_transcript(transcript_obj, api_keys)
     
     return transcript_obj
 
 @api_router.get("/interview/transcript/{session_id}", response_model=List[TranscriptEntry])
 @limiter.limit("60/minute")
-async def get_session_transcripts(request: Request, session_id: str):
+async def get_session_transcripts(
+    request: Request,
+    session_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json"
+):
     if not session_id or len(session_id) < 10:
         raise HTTPException(status_code=400, detail="Invalid session ID")
-        
-    transcripts = await db.transcripts.find({"session_id": session_id}).sort("timestamp", 1).to_list(1000)
-    return [TranscriptEntry(**transcript) for transcript in transcripts]
+    
+    await ensure_restored(session_id)
+    return await list_documents(
+        database.db.transcripts, {"session_id": session_id}, TranscriptEntry, "timestamp",
+        response, limit, after, fields, format,
+        pending=write_behind.transcript_writer.pending_for(session_id)
+    )
 
 # AI Response Generation
+@app.exception_handler(NotAQuestion)
+async def not_a_question(request: Request, exc: NotAQuestion):
+    # Distinct from request validation errors, which are also 422
+    return JSONResponse(status_code=422, content={"detail": "Not an interviewer question", "code": "not_a_question"})
+
 @api_router.post("/interview/ai-response", response_model=AIResponse)
 @limiter.limit("20/minute")
-async def generate_ai_response(http_request: Request, input: AIResponseRequest, api_keys: APIKeysModel = Depends(get_api_keys)):
+async def generate_ai_response(request: Request, input: AIResponseRequest, api_keys: APIKeysModel = Depends(get_api_keys)):
     # Input validation
-    if not input.session_id or len(input.session_id) < 10:
-        raise HTTPException(status_code=400, detail="Invalid session ID")
-    
-    if not input.question or len(input.question.strip()) < 5:
-        raise HTTPException(status_code=400, detail="Question must be at least 5 characters")
-    
-    if len(input.question) > 5000:
-        raise HTTPException(status_code=400, detail="Question too long")
+    validate_ai_response_request(input)
     
     try:
         # Verify session exists
-        session = await db.interview_sessions.find_one({"id": input.session_id})
+        session = await get_cached_session(input.session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
+        if not session.get("is_active", True):
+            raise HTTPException(status_code=409, detail="Session has ended")
         
-        # Get session context (recent transcripts)
-        recent_transcripts = await db.transcripts.find(
-            {"session_id": input.session_id}
-        ).sort("timestamp", -1).limit(5).to_list(5)
-        
-        # Prepare context for AI
-        context = "Recent interview conversation:\n"
-        for transcript in reversed(recent_transcripts):
-            context += f"{transcript['speaker']}: {transcript['text']}\n"
-        
-        # Create system message for interview assistance
-        system_message = """You are an expert interview copilot assistant. Your role is to help the interviewee answer questions professionally and effectively.
-
-When given an interview question, provide:
-1. A clear, concise, and professional answer
-2. Key points to emphasize
-3. Examples or experiences to mention if relevant
-
-Keep responses natural, authentic, and appropriate for a professional interview setting. 
-Format your response to be easy to read quickly during an interview.
-
-Structure your response as:
-**Main Answer:** [Direct response to the question]
-**Key Points:** [2-3 bullet points of important aspects to mention]
-**Example/Experience:** [If relevant, suggest a brief example to share]"""
-
-        # Initialize Gemini chat
-        chat = LlmChat(
-            api_key=api_keys.gemini_api_key,
-            session_id=input.session_id,
-            system_message=system_message
-        ).with_model("gemini", "gemini-2.5-flash").with_max_tokens(1024)
-        
-        # Create user message with context and question
-        full_prompt = f"{context}\n\nCurrent Question: {input.question}\n\nPlease provide a professional interview response:"
-        user_message = UserMessage(text=full_prompt)
-        
-        # Get AI response
-        ai_response_text = await chat.send_message(user_message)
-        
-        # Save the AI response
-        response_obj = AIResponse(
-            session_id=input.session_id,
-            question=input.question,
-            response=ai_response_text
-        )
-        await db.ai_responses.insert_one(response_obj.dict())
-        
-        # Create indexes for better performance
-        await db.ai_responses.create_index([("session_id", 1), ("timestamp", 1)])
-        
-        return response_obj
+        # Identical in-flight requests share one upstream call and stored result
+        with latency_budget(AI_REQUEST_BUDGET_MS):
+            response_obj = await ai_singleflight.do(ai_request_key(input), lambda: produce_ai_response(input, api_keys))
+        return render_model(response_obj)
         
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out waiting for an identical request in flight")
     except Exception as e:
         logging.error(f"Error generating AI response: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate AI response: {str(e)}")
 
+@api_router.post("/interview/ai-response/stream")
+@limiter.limit("20/minute")
+async def stream_ai_response(request: Request, input: AIResponseRequest, api_keys: APIKeysModel = Depends(get_api_keys)):
+    """Stream the AI response as Server-Sent Events.
+
+    Emits ``token`` events with partial text, then a ``done`` event carrying
+    the stored AIResponse plus time-to-first-token and total latency in ms.
+    Failures after the stream has started are reported as an ``error`` event.
+    A request identical to one already in flight waits for that result and
+    receives it as a single token.
+    """
+    # Input validation
+    validate_ai_response_request(input)
+    
+    # Verify session exists
+    session = await get_cached_session(input.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not session.get("is_active", True):
+        raise HTTPException(status_code=409, detail="Session has ended")
+    
+    started = time.perf_counter()
+    key = ai_request_key(input)
+    
+    async def coalesced_stream():
+        try:
+            response_obj = await ai_singleflight.do(key, lambda: produce_ai_response(input, api_keys))
+            yield format_sse("token", {"text": response_obj.response})
+            total_ms = round((time.perf_counter() - started) * 1000, 2)
+            yield format_sse("done", {
+                "response": response_obj.dict(),
+                "timings": {"ttft_ms": total_ms, "total_ms": total_ms},
+                "streamed": False,
+                "coalesced": True
+            })
+        except asyncio.TimeoutError:
+            yield format_sse("error", {"detail": "Timed out waiting for an identical request in flight"})
+        except Exception as e:
+            logging.error(f"Error streaming AI response: {str(e)}")
+            yield format_sse("error", {"detail": f"Failed to generate AI response: {str(e)}"})
+    
+    if ai_singleflight.in_flight(key):
+        return StreamingResponse(
+            coalesced_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    shared = ai_singleflight.begin(key)
+    try:
+        scope = answer_scope(api_keys)
+        cached_answer = await lookup_cached_answer(input, scope)
+        speculated = None
+        if cached_answer is None:
+            speculated = await speculation.claim(input.session_id, input.question)
+            if speculated is not None:
+                await remember_answer(input.question, *speculated, scope)
+        
+        ready_text = cached_answer.response if cached_answer is not None else (speculated[0] if speculated else None)
+        streamed = False
+        if ready_text is None:
+            gemini_health = upstream.gemini_guard.check(api_keys.gemini_api_key)
+            # Streams are not hedged; the deadline covers the whole stream
+            deadline = time.monotonic() + min(GEMINI_TIMEOUT, (AI_REQUEST_BUDGET_MS - UPSTREAM_RESERVE_MS) / 1000)
+            full_prompt = await build_ai_prompt(input.session_id, input.question, api_keys)
+            tokens, streamed = stream_llm_tokens(
+                create_gemini_chat(api_keys.gemini_api_key, input.session_id), api_keys.gemini_api_key, full_prompt
+            )
+    except BaseException:
+        shared.cancel()
+        raise
+    
+    async def event_stream():
+        chunks: List[str] = []
+        first_token_at = None
+        try:
+            if ready_text is not None:
+                first_token_at = time.perf_counter()
+                chunks.append(ready_text)
+                yield format_sse("token", {"text": ready_text})
+            else:
+                try:
+                    with time_stage("gemini"):
+                        async for chunk in upstream.gemini_guard.stream(gemini_health, tokens, deadline):
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            chunks.append(chunk)
+                            yield format_sse("token", {"text": chunk})
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    count_upstream_error("gemini", type(e).__name__)
+                    raise
+                await remember_answer(input.question, "".join(chunks), (time.perf_counter() - started) * 1000, scope)
+            
+            # Save the AI response once the stream has completed
+            response_obj = AIResponse(
+                session_id=input.session_id,
+                question=input.question,
+                response="".join(chunks),
+                cached=cached_answer is not None
+            )
+            with time_stage("mongo_write"):
+                await database.db.ai_responses.insert_one(response_obj.dict())
+            index_for_search("ai_responses", response_obj.dict())
+            if not shared.done():
+                shared.set_result(response_obj)
+            
+            finished = time.perf_counter()
+            timings = {
+                "ttft_ms": round(((first_token_at or finished) - started) * 1000, 2),
+                "total_ms": round((finished - started) * 1000, 2),
+            }
+            yield format_sse("done", {
+                "response": response_obj.dict(),
+                "timings": timings,
+                "streamed": streamed
+            })
+        except Exception as e:
+            if not shared.done():
+                shared.set_exception(e)
+            logging.error(f"Error streaming AI response: {str(e)}")
+            yield format_sse("error", {"detail": f"Failed to generate AI response: {str(e)}"})
+        finally:
+            # Client went away before the result was stored
+            if not shared.done():
+                shared.cancel()
+    
+    def abandon():
+        # The body's finally never runs if the client disconnects before the
+        # first chunk, so release waiters once the response is over
+        if not shared.done():
+            shared.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(abandon)
+    )
+
 @api_router.get("/interview/ai-responses/{session_id}", response_model=List[AIResponse])
 @limiter.limit("60/minute")
-async def get_session_ai_responses(request: Request, session_id: str):
+async def get_session_ai_responses(
+    request: Request,
+    session_id: str,
+    response: Response,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json"
+):
     if not session_id or len(session_id) < 10:
         raise HTTPException(status_code=400, detail="Invalid session ID")
-        
-    responses = await db.ai_responses.find({"session_id": session_id}).sort("timestamp", 1).to_list(1000)
-    return [AIResponse(**response) for response in responses]
+    
+    await ensure_restored(session_id)
+    return await list_documents(
+        database.db.ai_responses, {"session_id": session_id}, AIResponse, "timestamp",
+        response, limit, after, fields, format
+    )
+
+@api_router.get("/interview/search", response_model=SearchResults)
+@limiter.limit("60/minute")
+async def search_interviews(
+    request: Request,
+    q: str,
+    session_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    types: str = "transcripts,ai_responses",
+    limit: int = 20,
+    offset: int = 0
+):
+    """Ranked full-text search within one session or all of a user's sessions"""
+    if not q.strip() or len(q) > 200:
+        raise HTTPException(status_code=400, detail="q must be 1-200 characters")
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Query has no searchable terms")
+    if not session_id and not user_id:
+        raise HTTPException(status_code=400, detail="session_id or user_id is required")
+    collections = [collection.strip() for collection in types.split(",") if collection.strip()]
+    if not collections or set(collections) - set(SEARCH_SOURCES):
+        raise HTTPException(status_code=400, detail=f"types must be a subset of {', '.join(SEARCH_SOURCES)}")
+    if limit < 1 or limit > SEARCH_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SEARCH_PAGE_MAX}")
+    if offset < 0 or offset > SEARCH_OFFSET_MAX:
+        raise HTTPException(status_code=400, detail=f"offset must be between 0 and {SEARCH_OFFSET_MAX}")
+    
+    if session_id:
+        session = await get_cached_session(session_id)
+        if not session or (user_id and session.get("user_id") != user_id):
+            return SearchResults(results=[])
+        await ensure_restored(session_id)
+        session_ids = [session_id]
+    else:
+        with time_stage("mongo_read"):
+            session_ids = [doc["id"] async for doc in database.db.interview_sessions.find({"user_id": user_id}, {"_id": 0, "id": 1})]
+        if not session_ids:
+            return SearchResults(results=[])
+    
+    wanted = offset + limit + 1
+    with time_stage("search"):
+        if database.SEARCH_BACKEND == "memory":
+            await search_index.ensure_loaded()
+            hits = search_index.search(terms, set(session_ids), collections, wanted)
+        else:
+            scope = {"session_id": session_ids[0] if len(session_ids) == 1 else {"$in": session_ids}}
+            hits = await mongo_search(q, scope, collections, wanted)
+        hits.sort(key=lambda hit: (-hit[0], hit[2]["id"]))
+    
+    term_set = set(terms)
+    results = []
+    for score, collection, doc in hits[offset:offset + limit]:
+        kind, weights = SEARCH_SOURCES[collection]
+        # Snippet from the field with the most matches, heavier fields first on ties
+        best = None
+        for field in sorted(weights, key=lambda name: -weights[name]):
+            snippet, spans = highlight(doc.get(field) or "", term_set)
+            if best is None or len(spans) > len(best[2]):
+                best = (field, snippet, spans)
+        field, snippet, spans = best
+        results.append(SearchHit(
+            type=kind, id=doc["id"], session_id=doc["session_id"], timestamp=doc["timestamp"],
+            score=round(score, 4), field=field, snippet=snippet, highlights=spans,
+        ))
+    next_offset = offset + limit if len(hits) > offset + limit and offset + limit <= SEARCH_OFFSET_MAX else None
+    return SearchResults(results=results, next_offset=next_offset)
+
+@api_router.post("/question-score", response_model=QuestionScore)
+@limiter.limit("300/minute")
+async def score_question(request: Request, input: QuestionScoreRequest):
+    """Score text with the local question classifier (no upstream calls)"""
+    if len(input.text) > 5000:
+        raise HTTPException(status_code=400, detail="Text too long")
+    
+    score = question_classifier.score(input.text)
+    return QuestionScore(
+        score=round(score, 4),
+        is_question=score >= question_classifier.threshold,
+        threshold=question_classifier.threshold,
+        features=[name for name in question_classifier.features(input.text) if name != "bias"]
+    )
+
+@api_router.get("/stats")
+@limiter.limit("60/minute")
+async def get_runtime_stats(request: Request):
+    """Runtime counters for capacity planning"""
+    return {
+        "shared_state": {"backend": shared_state.state_store.backend, "rate_limit_storage": "redis" if REDIS_URL else "memory"},
+        "http_pool": http_pool_stats.snapshot(http_pool.http_client.connector if http_pool.http_client else None),
+        "session_cache": {**session_cache.stats(), "negative_hits": sessions.session_cache_negative_hits},
+        "transcript_buffer": transcript_buffer.stats(),
+        "transcript_writer": write_behind.transcript_writer.stats(),
+        "archiver": session_archiver.stats(),
+        "upstreams": {
+            "gemini": upstream.gemini_guard.stats(),
+            "gemini_summary": upstream.summary_guard.stats(),
+            "speech": upstream.speech_guard.stats(),
+        },
+        "search": {"backend": database.SEARCH_BACKEND, **(search_index.stats() if database.SEARCH_BACKEND == "memory" else {})},
+        "summaries": summarizer.stats(),
+        "answer_cache": {**answer_cache.stats(), "enabled": question_cache.ANSWER_CACHE_ENABLED, "shared_hits": question_cache.answer_cache_shared_hits},
+        "speculation": speculation.stats(),
+        "question_classifier": question_classifier.stats(),
+        "vad": vad.stats(),
+        "audio_aggregation": audio_aggregator.stats(),
+        "ai_singleflight": ai_singleflight.stats(),
+    }
 
 # Original status endpoints
 @api_router.get("/")
@@ -418,15 +904,27 @@ async def root(request: Request):
 async def create_status_check(request: Request, input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await database.db.status_checks.insert_one(status_obj.dict())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 @limiter.limit("60/minute")
 async def get_status_checks(request: Request):
-    status_checks = await db.status_checks.find().to_list(1000)
+    if FAST_SERIALIZATION:
+        status_checks = await database.db.status_checks.find({}, row_shape(StatusCheck)[0]).to_list(1000)
+        return render_documents(status_checks, StatusCheck)
+    status_checks = await database.db.status_checks.find({}, {"_id": 0}).to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
+@api_router.get("/ready")
+async def readiness(request: Request):
+    """Readiness probe: green only once indexes exist and the Mongo pool is warm"""
+    if getattr(app.state, "bootstrap_error", None):
+        return JSONResponse(status_code=503, content={"status": "failed", "detail": app.state.bootstrap_error})
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -436,8 +934,20 @@ app.add_middleware(
     allow_origins=CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Listing pagination cursor, unreadable cross-origin unless exposed
+    expose_headers=["X-Next-Cursor"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint; 404 unless METRICS_ENABLED is set"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -445,10 +955,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_database():
+    # Runs in the background so an unreachable Mongo does not block startup;
+    # /api/ready stays red until it completes
+    async def bootstrap():
+        try:
+            await bootstrap_database()
+        except DatabaseConfigError as e:
+            # Retrying cannot fix this; stop instead of serving without indexes
+            app.state.bootstrap_error = str(e)
+            logger.critical(f"Database configuration error, shutting down: {str(e)}")
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+        app.state.ready = True
+    
+    app.state.bootstrap_task = asyncio.create_task(bootstrap())
+
+@app.on_event("startup")
+async def startup_http_client():
+    http_pool.get_http_client()
+
+@app.on_event("startup")
+async def startup_answer_cache():
+    if question_cache.ANSWER_CACHE_ENABLED and ANSWER_CACHE_WARM_FILE:
+        try:
+            count = answer_cache.load_file(ANSWER_CACHE_WARM_FILE)
+            logger.info(f"Pre-warmed answer cache with {count} answers")
+        except Exception as e:
+            logger.error(f"Failed to pre-warm answer cache: {str(e)}")
+
+@app.on_event("startup")
+async def startup_transcript_writer():
+    if write_behind.TRANSCRIPT_WRITE_MODE != "direct":
+        write_behind.transcript_writer.start()
+
+@app.on_event("startup")
+async def startup_session_archiver():
+    if session_archiver.needed:
+        session_archiver.start()
+
+# Registered before the Mongo client is closed so queued writes drain first
+@app.on_event("shutdown")
+async def shutdown_transcript_writer():
+    await write_behind.transcript_writer.close()
+
+@app.on_event("shutdown")
+async def shutdown_session_archiver():
+    await session_archiver.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    bootstrap_task = getattr(app.state, "bootstrap_task", None)
+    if bootstrap_task is not None and not bootstrap_task.done():
+        bootstrap_task.cancel()
+    database.client.close()
+
+@app.on_event("shutdown")
+async def shutdown_state_store():
+    await shared_state.state_store.close()
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    if http_pool.http_client is not None:
+        await http_pool.http_client.close()
 
 if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Interview Copilot API")
+    parser.add_argument("--check-indexes", action="store_true",
+                        help="report missing or extra MongoDB indexes and exit (status 1 if any are missing)")
+    args = parser.parse_args()
+    
+    if args.check_indexes:
+        report = asyncio.run(check_indexes())
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if any(entry["missing"] for entry in report.values()) else 0)
+    
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
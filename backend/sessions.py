@@ -0,0 +1,45 @@
+"""Session lookups cached in a bounded TTL LRU, and per-session state invalidation"""
+import os
+from typing import Optional, Dict, Any
+from metrics import time_stage
+import database
+from ttl_cache import TTLCache
+from aggregation import audio_aggregator
+from context import transcript_buffer, summarizer
+from speculative import speculation
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Session lookup cache. Existence checks run several times per second per
+# live interview; unknown IDs are cached too, for a shorter TTL.
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '10000'))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '300'))
+SESSION_CACHE_NEGATIVE_TTL = float(os.environ.get('SESSION_CACHE_NEGATIVE_TTL', '5'))
+session_cache = TTLCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
+session_cache_negative_hits = 0
+
+async def get_cached_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """Return the session document, or None if it does not exist"""
+    global session_cache_negative_hits
+    with time_stage("session_lookup"):
+        cached = session_cache.get(session_id)
+        if cached is not None:
+            if cached is False:
+                session_cache_negative_hits += 1
+                return None
+            return cached
+        
+        with time_stage("mongo_read"):
+            session = await database.db.interview_sessions.find_one({"id": session_id}, {"_id": 0})
+        if session:
+            session_cache.set(session_id, session)
+        else:
+            session_cache.set(session_id, False, ttl=SESSION_CACHE_NEGATIVE_TTL)
+        return session
+
+def invalidate_session(session_id: str):
+    """Drop any cached state for a session after it is created or ended"""
+    session_cache.pop(session_id)
+    transcript_buffer.discard(session_id)
+    summarizer.discard(session_id)
+    speculation.discard(session_id)
+    audio_aggregator.discard(session_id)
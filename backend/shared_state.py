@@ -0,0 +1,88 @@
+"""Cross-request state shared by all workers: Redis when configured, else process memory"""
+import os
+from typing import Optional, Dict, Tuple
+import time
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Shared state. With REDIS_URL set, rate-limit counters and cross-request
+# state live in Redis so every worker and pod sees the same values;
+# otherwise both fall back to process memory.
+REDIS_URL = os.environ.get('REDIS_URL')
+STATE_KEY_PREFIX = os.environ.get('STATE_KEY_PREFIX', 'icp:')
+
+class InMemoryStateStore:
+    """Process-local state store, used when Redis is not configured and in tests"""
+    
+    backend = "memory"
+    shared = False
+    
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+    
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+    
+    async def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+    
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+    
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+    
+    async def incr(self, key: str, ttl: float) -> int:
+        value = int(self._live(key) or 0) + 1
+        expires_at = self._data[key][0] if value > 1 else time.monotonic() + ttl
+        self._data[key] = (expires_at, str(value))
+        return value
+    
+    async def close(self):
+        self._data.clear()
+
+class RedisStateStore:
+    """Redis-backed state store shared by all workers"""
+    
+    backend = "redis"
+    shared = True
+    
+    # INCR and first-write EXPIRE in one atomic round trip
+    INCR_SCRIPT = """
+local value = redis.call('INCR', KEYS[1])
+if value == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return value
+"""
+    
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self._incr = self._redis.register_script(self.INCR_SCRIPT)
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+    
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+    
+    async def delete(self, key: str):
+        await self._redis.delete(key)
+    
+    async def incr(self, key: str, ttl: float) -> int:
+        return int(await self._incr(keys=[key], args=[int(ttl * 1000)]))
+    
+    async def close(self):
+        await self._redis.aclose()
+
+state_store = RedisStateStore(REDIS_URL) if REDIS_URL else InMemoryStateStore()
+
+def state_key(*parts: str) -> str:
+    return STATE_KEY_PREFIX + ":".join(parts)
@@ -0,0 +1,99 @@
+"""Collapse concurrent identical requests onto one in-flight computation"""
+from typing import Optional, Dict, Any
+import asyncio
+import time
+from upstream import AI_REQUEST_BUDGET_MS
+
+class SingleFlight:
+    """Collapse concurrent identical AI requests onto one upstream call.
+
+    The first caller for a key runs the work as a task so its own
+    cancellation does not abort the shared result; later callers await the
+    same task. If a leader abandons its future (a closed stream), waiting
+    callers run the work themselves. Nothing waits longer than ``timeout``
+    seconds: a future from ``begin`` still pending by then is cancelled, and
+    ``wait`` gives up with asyncio.TimeoutError.
+    """
+    
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self.leaders = 0
+        self.collapsed = 0
+        self.expired = 0
+        self.wait_timeouts = 0
+    
+    def in_flight(self, key) -> bool:
+        return key in self._inflight
+    
+    def begin(self, key) -> asyncio.Future:
+        """Register the caller as leader and return the future to resolve.
+
+        The caller resolves it from code that may never run (a response body
+        the client disconnects from), so it is cancelled after ``timeout``.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._register(key, future)
+        expiry = loop.call_later(self.timeout, self._expire, future)
+        future.add_done_callback(lambda _: expiry.cancel())
+        return future
+    
+    def _expire(self, future: asyncio.Future):
+        if not future.done():
+            self.expired += 1
+            future.cancel()
+    
+    def _register(self, key, future: asyncio.Future):
+        self._inflight[key] = future
+        self.leaders += 1
+        
+        def release(done: asyncio.Future):
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            if not done.cancelled():
+                done.exception()  # mark retrieved; waiters re-raise it themselves
+        
+        future.add_done_callback(release)
+    
+    async def wait(self, key, timeout: Optional[float] = None):
+        """Await an in-flight result for key; returns None if there is none.
+
+        Raises asyncio.TimeoutError after ``timeout`` seconds (the instance
+        default), leaving the shared call running for everyone else.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            shared = self._inflight.get(key)
+            if shared is None:
+                return None
+            try:
+                result = await asyncio.wait_for(asyncio.shield(shared), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                self.wait_timeouts += 1
+                raise
+            except asyncio.CancelledError:
+                if shared.cancelled():
+                    continue
+                raise
+            self.collapsed += 1
+            return result
+    
+    async def do(self, key, work):
+        result = await self.wait(key)
+        if result is not None:
+            return result
+        task = asyncio.ensure_future(work())
+        self._register(key, task)
+        return await asyncio.shield(task)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "expired": self.expired,
+            "wait_timeouts": self.wait_timeouts,
+        }
+
+ai_singleflight = SingleFlight(AI_REQUEST_BUDGET_MS / 1000)
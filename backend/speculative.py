@@ -0,0 +1,117 @@
+"""Speculative answers started for likely questions before they are asked"""
+import os
+import logging
+from typing import Optional, Dict, Any, Tuple
+from emergentintegrations.llm.chat import UserMessage
+import asyncio
+import time
+from models import APIKeysModel
+import upstream
+from upstream import request_deadline
+from question_detector import question_classifier
+from llm import create_gemini_chat
+from context import build_ai_prompt
+from question_cache import normalize_question
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Speculative answer generation
+SPECULATIVE_ANSWERS = os.environ.get('SPECULATIVE_ANSWERS', 'false').lower() == 'true'
+SPECULATION_TTL = float(os.environ.get('SPECULATION_TTL', '30'))
+
+class SpeculativeAnswer:
+    __slots__ = ("normalized", "task", "started_at")
+    
+    def __init__(self, normalized: str, task: asyncio.Task):
+        self.normalized = normalized
+        self.task = task
+        self.started_at = time.monotonic()
+
+class SpeculationManager:
+    """Starts answering a likely question before the client commits it.
+
+    At most one speculation runs per session. New speech for the session
+    cancels it (or drops its finished result); a committed question that
+    normalizes to the same text claims it instead of calling Gemini again.
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._pending: Dict[str, SpeculativeAnswer] = {}
+        self.started = 0
+        self.claimed = 0
+        self.cancelled = 0
+        self.discarded = 0
+        self.failed = 0
+        self.latency_saved_ms = 0.0
+    
+    def on_speech(self, session_id: str, text: str, api_keys: Optional[APIKeysModel]):
+        """Called for every new utterance in a session"""
+        self.discard(session_id)
+        if api_keys is None or not question_classifier.is_question(text):
+            return
+        normalized = normalize_question(text)
+        task = asyncio.create_task(self._generate(session_id, text, api_keys))
+        task.add_done_callback(self._task_done)
+        self._pending[session_id] = SpeculativeAnswer(normalized, task)
+        self.started += 1
+    
+    async def _generate(self, session_id: str, question: str, api_keys: APIKeysModel):
+        # Not bound by the budget of the request that happened to start it
+        request_deadline.set(None)
+        started = time.perf_counter()
+        full_prompt = await build_ai_prompt(session_id, question, api_keys)
+        message = UserMessage(text=full_prompt)
+        gemini_api_key = api_keys.gemini_api_key
+        text = await upstream.gemini_guard.call(gemini_api_key, lambda: create_gemini_chat(gemini_api_key, session_id).send_message(message))
+        return text, (time.perf_counter() - started) * 1000
+    
+    def _task_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            logging.warning(f"Speculative answer failed: {str(task.exception())}")
+    
+    def discard(self, session_id: str):
+        speculative = self._pending.pop(session_id, None)
+        if speculative is None:
+            return
+        if speculative.task.done():
+            self.discarded += 1
+        else:
+            speculative.task.cancel()
+            self.cancelled += 1
+    
+    async def claim(self, session_id: str, question: str) -> Optional[Tuple[str, float]]:
+        """Hand over (text, generation latency ms) if the speculation matches"""
+        speculative = self._pending.get(session_id)
+        if speculative is None:
+            return None
+        if (speculative.normalized != normalize_question(question)
+                or time.monotonic() - speculative.started_at > self.ttl):
+            self.discard(session_id)
+            return None
+        del self._pending[session_id]
+        
+        claimed_at = time.perf_counter()
+        try:
+            text, latency_ms = await asyncio.shield(speculative.task)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return None
+        self.claimed += 1
+        self.latency_saved_ms += max(latency_ms - (time.perf_counter() - claimed_at) * 1000, 0.0)
+        return text, latency_ms
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": SPECULATIVE_ANSWERS,
+            "pending": len(self._pending),
+            "started": self.started,
+            "claimed": self.claimed,
+            "cancelled": self.cancelled,
+            "discarded": self.discarded,
+            "failed": self.failed,
+            "latency_saved_ms": round(self.latency_saved_ms, 2),
+        }
+
+speculation = SpeculationManager(SPECULATION_TTL)
@@ -0,0 +1,98 @@
+"""Google Speech-to-Text REST calls and audio payload checks"""
+from fastapi import HTTPException
+import asyncio
+import json
+import aiohttp
+import re
+from metrics import time_stage, count_upstream_error
+import http_pool
+import upstream
+
+# Audio transcription
+SPEECH_API_URL = "https://speech.googleapis.com/v1/speech:recognize"
+MAX_AUDIO_FRAME_BYTES = 10 * 1024 * 1024
+
+BASE64_PATTERN = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
+def is_base64(data: str) -> bool:
+    """Check base64 syntax without materialising the decoded bytes"""
+    return len(data) % 4 == 0 and BASE64_PATTERN.fullmatch(data) is not None
+
+# Speech API encodings per accepted audio_format
+SPEECH_ENCODINGS = {
+    "webm": "WEBM_OPUS",
+    "ogg": "OGG_OPUS",
+    "pcm": "LINEAR16",
+    "linear16": "LINEAR16",
+}
+
+def speech_encoding(audio_format: str) -> str:
+    encoding = SPEECH_ENCODINGS.get((audio_format or "webm").lower())
+    if encoding is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported audio format: {audio_format}")
+    return encoding
+
+def build_speech_payload(audio_content: bytes, sample_rate: int, encoding: str = "WEBM_OPUS") -> bytes:
+    """Serialize a recognize request around already base64 encoded audio.
+
+    The audio is spliced in as-is instead of going through json.dumps, which
+    would scan and copy the (largest) string field again.
+    """
+    config = json.dumps({
+        "encoding": encoding,
+        "sampleRateHertz": sample_rate,
+        "languageCode": "en-US",
+        "enableAutomaticPunctuation": True,
+        "model": "latest_long"
+    })
+    return b"".join((b'{"config": ', config.encode(), b', "audio": {"content": "', audio_content, b'"}}'))
+
+async def recognize_speech(api_key: str, audio_content: bytes, sample_rate: int = 16000, encoding: str = "WEBM_OPUS"):
+    """Send base64 encoded audio to Google Speech and return (transcript, confidence)"""
+    # For API key authentication, we'll use the REST API directly
+    url = f"{SPEECH_API_URL}?key={api_key}"
+    
+    # Prepare the request payload
+    payload = build_speech_payload(audio_content, sample_rate, encoding)
+    
+    async def post():
+        async with http_pool.get_http_client().post(url, data=payload, headers={"Content-Type": "application/json"}) as response:
+            if response.status != 200:
+                count_upstream_error("speech", f"http_{response.status}")
+                error_text = await response.text()
+                # Upstream trouble (5xx) is a 502 and counts against the key's breaker;
+                # quota errors are the key's own and are passed on as 429
+                if response.status >= 500:
+                    status_code = 502
+                elif response.status == 429:
+                    status_code = 429
+                else:
+                    status_code = 400
+                raise HTTPException(status_code=status_code, detail=f"Google Speech API error: {error_text}")
+            return await response.json()
+    
+    try:
+        with time_stage("speech"):
+            result = await upstream.speech_guard.call(api_key, post)
+    except asyncio.TimeoutError:
+        count_upstream_error("speech", "timeout")
+        raise HTTPException(status_code=504, detail="Google Speech API timed out")
+    except aiohttp.ClientError:
+        count_upstream_error("speech", "network")
+        raise
+    
+    # Extract transcript and confidence
+    transcript = ""
+    confidence = 0.0
+    
+    if "results" in result and result["results"]:
+        for result_item in result["results"]:
+            if "alternatives" in result_item and result_item["alternatives"]:
+                alternative = result_item["alternatives"][0]
+                transcript += alternative.get("transcript", "")
+                confidence = max(confidence, alternative.get("confidence", 0.0))
+    
+    if not transcript.strip():
+        return "", 0.0
+    
+    return transcript.strip(), confidence
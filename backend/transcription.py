@@ -0,0 +1,154 @@
+"""Transcript storage and per-session audio transcription shared by the HTTP and WebSocket paths"""
+from fastapi import HTTPException, BackgroundTasks
+import logging
+from typing import List, Optional
+import base64
+import aiohttp
+from models import APIKeysModel, TranscriptEntry, AudioTranscriptionResponse
+from metrics import time_stage
+import database
+from sessions import get_cached_session
+from speech import recognize_speech
+from vad import VAD_ENABLED, vad, screen_audio
+from aggregation import AudioAggregator, audio_aggregator
+from listing import render_model
+import write_behind
+from context import transcript_buffer, summarizer, bump_context_version
+from search import index_for_search
+import speculative
+from speculative import speculation
+
+async def store_transcript(transcript_obj: TranscriptEntry, api_keys: Optional[APIKeysModel] = None):
+    """Save a transcript and update the session's in-memory state"""
+    if write_behind.TRANSCRIPT_WRITE_MODE == "direct":
+        with time_stage("mongo_write"):
+            await database.db.transcripts.insert_one(transcript_obj.dict())
+    else:
+        await write_behind.transcript_writer.write(transcript_obj.dict())
+    index_for_search("transcripts", transcript_obj.dict())
+    dropped = transcript_buffer.append(
+        transcript_obj.session_id, transcript_obj.speaker, transcript_obj.text, transcript_obj.timestamp
+    )
+    version = await bump_context_version(transcript_obj.session_id)
+    if version is not None:
+        transcript_buffer.advance(transcript_obj.session_id, version)
+    if dropped is not None:
+        line, timestamp = dropped
+        summarizer.add(transcript_obj.session_id, line, api_keys, timestamp)
+    if speculative.SPECULATIVE_ANSWERS and transcript_obj.speaker == "interviewer":
+        speculation.on_speech(transcript_obj.session_id, transcript_obj.text, api_keys)
+
+async def store_transcript_in_background(transcript_obj: TranscriptEntry, api_keys: Optional[APIKeysModel] = None):
+    try:
+        await store_transcript(transcript_obj, api_keys)
+    except Exception as e:
+        logging.error(f"Failed to save transcript {transcript_obj.id}: {str(e)}")
+
+async def transcribe_session_audio(
+    session_id: str,
+    audio_content: Optional[bytes],
+    sample_rate: int,
+    api_keys: APIKeysModel,
+    persist: bool = False,
+    speaker: str = "interviewer",
+    background_tasks: Optional[BackgroundTasks] = None,
+    encoding: str = "WEBM_OPUS",
+    energy: Optional[List[float]] = None,
+    energy_frame_ms: int = 100,
+    raw_audio: Optional[bytes] = None,
+    aggregate: bool = False,
+    flush: bool = False
+) -> AudioTranscriptionResponse:
+    """Transcribe base64 encoded audio for an existing session.
+
+    With ``persist`` a non-empty transcript is also saved as a
+    TranscriptEntry, inline or via ``background_tasks`` when given, and the
+    entry is returned so the client needs no follow-up POST. Chunks the VAD
+    judges silent get an empty transcript without a Speech call. With
+    ``aggregate`` the chunk joins the session's audio buffer and the response
+    is ``pending`` until the buffer is flushed. Callers that hold the decoded
+    bytes pass them as ``raw_audio`` to avoid a base64 round trip.
+    """
+    try:
+        # Verify session exists
+        session = await get_cached_session(session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if not session.get("is_active", True):
+            raise HTTPException(status_code=409, detail="Session has ended")
+        
+        aggregated = None
+        if aggregate:
+            if raw_audio is None:
+                with time_stage("base64"):
+                    raw_audio = base64.b64decode(audio_content)
+            with time_stage("vad"):
+                aggregated = audio_aggregator.add(session_id, raw_audio, encoding, sample_rate, energy, energy_frame_ms, flush)
+                if aggregated is AudioAggregator.PENDING:
+                    return render_model(AudioTranscriptionResponse(
+                        transcript="",
+                        confidence=0.0,
+                        session_id=session_id,
+                        pending=True
+                    ))
+                audio = None
+                if aggregated is not AudioAggregator.SILENT:
+                    audio = aggregated.audio
+                    if encoding == "LINEAR16" and VAD_ENABLED:
+                        audio = vad.trim_pcm(audio, sample_rate)
+            audio_content = None
+            if audio is not None:
+                with time_stage("base64"):
+                    audio_content = base64.b64encode(audio)
+        else:
+            audio_content = screen_audio(audio_content, encoding, sample_rate, energy, energy_frame_ms, raw_audio)
+        
+        if audio_content is None:
+            return render_model(AudioTranscriptionResponse(
+                transcript="",
+                confidence=0.0,
+                session_id=session_id,
+                skipped_silence=True
+            ))
+        
+        try:
+            transcript, confidence = await recognize_speech(
+                api_keys.google_speech_api_key,
+                audio_content,
+                sample_rate,
+                encoding
+            )
+            if aggregated is not None:
+                transcript = audio_aggregator.finish(session_id, aggregated, transcript)
+            entry = None
+            if persist and transcript:
+                entry = TranscriptEntry(
+                    session_id=session_id,
+                    text=transcript,
+                    speaker=speaker,
+                    confidence=confidence
+                )
+                if background_tasks is not None:
+                    background_tasks.add_task(store_transcript_in_background, entry, api_keys)
+                else:
+                    await store_transcript(entry, api_keys)
+            
+            return render_model(AudioTranscriptionResponse(
+                transcript=transcript,
+                confidence=confidence,
+                session_id=session_id,
+                entry=entry
+            ))
+                    
+        except HTTPException:
+            raise
+        except aiohttp.ClientError as e:
+            raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Transcription error: {str(e)}")
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Transcription error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to transcribe audio: {str(e)}")
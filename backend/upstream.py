@@ -0,0 +1,314 @@
+"""Per-request latency budgets, circuit breakers and hedging for upstream calls"""
+from fastapi import HTTPException
+import os
+from typing import Optional, Dict, Any, Callable, Awaitable
+from collections import deque
+import asyncio
+import time
+import math
+import contextvars
+from contextlib import contextmanager
+from metrics import count_upstream_error
+from ttl_cache import TTLCache
+from auth import secret_digest
+from http_pool import SPEECH_REQUEST_TIMEOUT
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Upstream guards. Each request gets a latency budget; every Gemini or
+# Speech call is bounded by what is left of it (minus a reserve for storing
+# the result), capped per upstream. A call still running past the
+# key's recent p95 can be hedged with a second, identical call, and the
+# first success wins. After repeated timeouts or 5xx responses a key's
+# circuit breaker fails its calls fast with 503 until a probe call succeeds.
+# Breakers and latencies are per API key, since every user brings their own.
+AI_REQUEST_BUDGET_MS = float(os.environ.get('AI_REQUEST_BUDGET_MS', '30000'))
+TRANSCRIBE_REQUEST_BUDGET_MS = float(os.environ.get('TRANSCRIBE_REQUEST_BUDGET_MS', '15000'))
+UPSTREAM_RESERVE_MS = float(os.environ.get('UPSTREAM_RESERVE_MS', '250'))
+GEMINI_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT', '30'))
+HEDGE_UPSTREAMS = {name.strip() for name in os.environ.get('HEDGE_UPSTREAMS', '').split(',') if name.strip()}
+HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', '20'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+BREAKER_MAX_KEYS = int(os.environ.get('BREAKER_MAX_KEYS', '10000'))
+BREAKER_KEY_IDLE_SECONDS = float(os.environ.get('BREAKER_KEY_IDLE_SECONDS', '3600'))
+
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+@contextmanager
+def latency_budget(budget_ms: float):
+    """Set the deadline upstream calls in this block must finish by"""
+    token = request_deadline.set(time.monotonic() + budget_ms / 1000)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+def upstream_timeout(cap: float) -> float:
+    """Seconds left for an upstream call: the request budget minus the reserve, at most ``cap``"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return cap
+    return min(cap, deadline - time.monotonic() - UPSTREAM_RESERVE_MS / 1000)
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+    
+    def __init__(self, window: int = 200):
+        self.samples: deque = deque(maxlen=window)
+    
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half_open -> closed"""
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started = 0.0
+        self.opened = 0
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back (abandoned stream) expires
+            now = time.monotonic()
+            if not self.probe_in_flight or now - self.probe_started >= self.reset_seconds:
+                self.probe_in_flight = True
+                self.probe_started = now
+                return True
+        self.rejected += 1
+        return False
+    
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.reset_seconds - (time.monotonic() - self.opened_at)))
+    
+    def record_success(self):
+        # Stragglers dispatched before the breaker opened do not close it early
+        if self.state == self.OPEN:
+            return
+        self.failures = 0
+        self.probe_in_flight = False
+        self.state = self.CLOSED
+    
+    def record_failure(self):
+        if self.state == self.OPEN:
+            return
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+def upstream_failed(error: BaseException) -> bool:
+    """Only timeouts and upstream 5xx count against a key's breaker.
+
+    Auth and quota errors (401/403/429) are about the caller's own key and
+    say nothing about the upstream's health.
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return isinstance(status, int) and status >= 500
+
+class KeyHealth:
+    """Breaker and recent latencies of one API key against one upstream"""
+    
+    def __init__(self):
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        self.latency = LatencyTracker()
+
+class UpstreamGuard:
+    """Deadline, optional hedging and per-key circuit breakers around one upstream.
+
+    Every user calls Gemini and Speech with their own key, so breaker and
+    hedging state are kept per key (by HMAC): one user's broken or throttled
+    key must not fail calls made with anyone else's.
+    """
+    
+    def __init__(self, name: str, label: str, timeout_cap: float, hedge: bool):
+        self.name = name
+        self.label = label
+        self.timeout_cap = timeout_cap
+        self.hedge = hedge
+        self._keys = TTLCache(maxsize=BREAKER_MAX_KEYS, ttl=BREAKER_KEY_IDLE_SECONDS)
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.opened = 0
+        self.rejected = 0
+    
+    def health(self, api_key: str) -> KeyHealth:
+        digest = secret_digest(api_key)
+        health = self._keys.get(digest)
+        if health is None:
+            health = KeyHealth()
+        # Refresh the idle TTL on every use
+        self._keys.set(digest, health)
+        return health
+    
+    def check(self, api_key: str) -> KeyHealth:
+        """Fail fast with 503 while this key's breaker is open"""
+        health = self.health(api_key)
+        if not health.breaker.allow():
+            self.rejected += 1
+            count_upstream_error(self.name, "circuit_open")
+            raise HTTPException(
+                status_code=503,
+                detail=f"{self.label} is temporarily unavailable",
+                headers={"Retry-After": str(health.breaker.retry_after())}
+            )
+        return health
+    
+    def record_failure(self, health: KeyHealth):
+        was_open = health.breaker.state == CircuitBreaker.OPEN
+        health.breaker.record_failure()
+        if not was_open and health.breaker.state == CircuitBreaker.OPEN:
+            self.opened += 1
+    
+    def record_outcome(self, health: KeyHealth, error: BaseException):
+        if upstream_failed(error):
+            self.record_failure(health)
+        else:
+            # The upstream answered; the key itself is the problem
+            health.breaker.record_success()
+    
+    def remaining(self) -> float:
+        timeout = upstream_timeout(self.timeout_cap)
+        if timeout <= 0:
+            count_upstream_error(self.name, "budget_exhausted")
+            raise HTTPException(status_code=504, detail="Request latency budget exhausted")
+        return timeout
+    
+    def hedge_delay(self, health: KeyHealth) -> Optional[float]:
+        if not self.hedge or len(health.latency.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return health.latency.percentile(0.95)
+    
+    def timed_out(self, health: KeyHealth) -> HTTPException:
+        self.timeouts += 1
+        self.record_failure(health)
+        count_upstream_error(self.name, "timeout")
+        return HTTPException(status_code=504, detail=f"{self.label} timed out")
+    
+    async def call(self, api_key: str, attempt: Callable[[], Awaitable[Any]]):
+        """Run ``attempt`` (a factory, so a hedge can start a fresh call) within the deadline"""
+        health = self.check(api_key)
+        try:
+            timeout = self.remaining()
+        except HTTPException:
+            health.breaker.probe_in_flight = False
+            raise
+        self.calls += 1
+        started = time.monotonic()
+        deadline = started + timeout
+        delay = self.hedge_delay(health)
+        hedge_at = started + delay if delay is not None else None
+        tasks: Dict[asyncio.Future, float] = {asyncio.ensure_future(attempt()): started}
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise self.timed_out(health)
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(tasks, timeout=max(0.0, wake - now), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if hedge_at is not None and time.monotonic() >= hedge_at:
+                        # At most one hedge; the primary keeps running
+                        hedge_at = None
+                        self.hedges += 1
+                        tasks[asyncio.ensure_future(attempt())] = time.monotonic()
+                    continue
+                for task in done:
+                    task_started = tasks.pop(task)
+                    if task.exception() is None:
+                        elapsed = time.monotonic() - task_started
+                        health.latency.observe(elapsed)
+                        self.latency.observe(elapsed)
+                        health.breaker.record_success()
+                        if task_started != started:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+                # A primary that fails before the hedge point is not retried
+                hedge_at = None
+            self.record_outcome(health, error)
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            # A cancelled half-open probe must not block the next one
+            health.breaker.probe_in_flight = False
+    
+    async def stream(self, health: KeyHealth, chunks, deadline: float):
+        """Relay a token stream admitted by ``check``, failing with 504 at ``deadline``"""
+        self.calls += 1
+        iterator = chunks.__aiter__()
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self.timed_out(health)
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise self.timed_out(health)
+                yield chunk
+            health.breaker.record_success()
+        except HTTPException:
+            raise
+        except Exception as e:
+            self.record_outcome(health, e)
+            raise
+        finally:
+            health.breaker.probe_in_flight = False
+    
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        breakers = [health.breaker for _, health in self._keys._data.values()]
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "breakers": {
+                "keys": len(breakers),
+                "open": sum(1 for breaker in breakers if breaker.state != CircuitBreaker.CLOSED),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            },
+        }
+
+gemini_guard = UpstreamGuard("gemini", "Gemini", GEMINI_TIMEOUT, "gemini" in HEDGE_UPSTREAMS)
+# Background summaries get their own breakers so they never trip the answer path
+summary_guard = UpstreamGuard("gemini_summary", "Gemini", GEMINI_TIMEOUT, False)
+speech_guard = UpstreamGuard("speech", "Google Speech API", SPEECH_REQUEST_TIMEOUT, "speech" in HEDGE_UPSTREAMS)
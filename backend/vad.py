@@ -0,0 +1,138 @@
+"""Energy-based voice activity detection for incoming audio"""
+from fastapi import HTTPException
+import os
+from typing import List, Optional, Dict, Any, Tuple
+import base64
+import numpy as np
+from metrics import time_stage
+import config  # noqa: F401  (loads .env before the settings below)
+
+# Voice activity detection. Silent chunks are answered with an empty
+# transcript without calling Speech. Opus/WebM is judged from the RMS
+# summary the client computes while recording (decoding Opus here would need
+# a native codec); 16-bit PCM is analysed directly and also trimmed.
+VAD_ENABLED = os.environ.get('VAD_ENABLED', 'true').lower() == 'true'
+VAD_ENERGY_THRESHOLD = float(os.environ.get('VAD_ENERGY_THRESHOLD', '0.01'))
+VAD_MIN_SPEECH_MS = float(os.environ.get('VAD_MIN_SPEECH_MS', '200'))
+VAD_PAD_MS = float(os.environ.get('VAD_PAD_MS', '200'))
+VAD_PCM_FRAME_MS = 20
+
+class VoiceActivityDetector:
+    """Energy-threshold VAD with counters for what it saved"""
+    
+    def __init__(self, threshold: float, min_speech_ms: float, pad_ms: float):
+        self.threshold = threshold
+        self.min_speech_ms = min_speech_ms
+        self.pad_ms = pad_ms
+        self.chunks = 0
+        self.chunks_skipped = 0
+        self.chunks_unanalyzed = 0
+        self.seconds = 0.0
+        self.seconds_skipped = 0.0
+        self.seconds_trimmed = 0.0
+    
+    def voiced_span(self, levels, frame_ms: float) -> Optional[Tuple[int, int]]:
+        """(first, last) voiced frame, or None when there is too little speech"""
+        voiced = np.flatnonzero(np.asarray(levels, dtype=np.float32) >= self.threshold)
+        if len(voiced) * frame_ms < self.min_speech_ms:
+            return None
+        return int(voiced[0]), int(voiced[-1])
+    
+    def trailing_silence_ms(self, levels, frame_ms: float) -> float:
+        voiced = np.flatnonzero(np.asarray(levels, dtype=np.float32) >= self.threshold)
+        if len(voiced) == 0:
+            return len(levels) * frame_ms
+        return (len(levels) - 1 - int(voiced[-1])) * frame_ms
+    
+    def record(self, duration: float, skipped: bool):
+        self.chunks += 1
+        self.seconds += duration
+        if skipped:
+            self.chunks_skipped += 1
+            self.seconds_skipped += duration
+    
+    def screen_energy(self, levels: List[float], frame_ms: int) -> bool:
+        """Judge a compressed chunk from its client energy summary; True means speech"""
+        speech = self.voiced_span(levels, frame_ms) is not None
+        self.record(len(levels) * frame_ms / 1000, not speech)
+        return speech
+    
+    def trim_pcm(self, pcm: bytes, sample_rate: int) -> Optional[bytes]:
+        """The PCM without leading/trailing silence, or None if it has no speech"""
+        levels = pcm_levels(pcm, sample_rate)
+        span = self.voiced_span(levels, VAD_PCM_FRAME_MS)
+        if span is None:
+            return None
+        
+        frame = max(1, sample_rate * VAD_PCM_FRAME_MS // 1000)
+        pad = int(self.pad_ms / VAD_PCM_FRAME_MS)
+        start = max(0, span[0] - pad) * frame * 2
+        end = min(len(pcm) // 2, (span[1] + 1 + pad) * frame) * 2
+        if end - start < len(pcm):
+            self.seconds_trimmed += (len(pcm) - (end - start)) / 2 / sample_rate
+        return pcm[start:end]
+    
+    def screen_pcm(self, pcm: bytes, sample_rate: int) -> Optional[bytes]:
+        """Return the PCM with leading/trailing silence trimmed, or None if silent"""
+        trimmed = self.trim_pcm(pcm, sample_rate)
+        self.record(len(pcm) / 2 / sample_rate, trimmed is None)
+        return trimmed
+    
+    def count_unanalyzed(self):
+        self.chunks += 1
+        self.chunks_unanalyzed += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": VAD_ENABLED,
+            "chunks": self.chunks,
+            "chunks_skipped": self.chunks_skipped,
+            "chunks_unanalyzed": self.chunks_unanalyzed,
+            "chunk_skip_fraction": round(self.chunks_skipped / self.chunks, 4) if self.chunks else 0.0,
+            "audio_seconds": round(self.seconds, 3),
+            "audio_seconds_skipped": round(self.seconds_skipped, 3),
+            "audio_seconds_trimmed": round(self.seconds_trimmed, 3),
+            "seconds_skip_fraction": round(self.seconds_skipped / self.seconds, 4) if self.seconds else 0.0,
+        }
+
+def pcm_levels(pcm: bytes, sample_rate: int) -> np.ndarray:
+    """RMS level (0..1) per VAD_PCM_FRAME_MS frame of 16-bit little-endian PCM"""
+    samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+    frame = max(1, sample_rate * VAD_PCM_FRAME_MS // 1000)
+    count = len(samples) // frame
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float32) / 32768.0
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+vad = VoiceActivityDetector(VAD_ENERGY_THRESHOLD, VAD_MIN_SPEECH_MS, VAD_PAD_MS)
+
+def screen_audio(
+    audio_content: Optional[bytes],
+    encoding: str,
+    sample_rate: int,
+    energy: Optional[List[float]] = None,
+    energy_frame_ms: int = 100,
+    pcm: Optional[bytes] = None
+) -> Optional[bytes]:
+    """Run VAD over the audio; None for silence, else the base64 audio to send.
+
+    Callers holding raw PCM pass it as ``pcm`` (``audio_content`` may then be
+    None) so it is base64 encoded only once, after trimming.
+    """
+    if not VAD_ENABLED:
+        return audio_content if audio_content is not None else base64.b64encode(pcm)
+    with time_stage("vad"):
+        if encoding == "LINEAR16":
+            if sample_rate <= 0:
+                raise HTTPException(status_code=400, detail="Invalid sample rate")
+            if pcm is None:
+                pcm = base64.b64decode(audio_content)
+            trimmed = vad.screen_pcm(pcm, sample_rate)
+            if trimmed is None:
+                return None
+            if audio_content is None or len(trimmed) != len(pcm):
+                audio_content = base64.b64encode(trimmed)
+            return audio_content
+        if energy:
+            return audio_content if vad.screen_energy(energy, energy_frame_ms) else None
+        vad.count_unanalyzed()
+        return audio_content
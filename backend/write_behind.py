@@ -0,0 +1,357 @@
+"""Batched, optionally journaled transcript writes"""
+from pymongo.errors import BulkWriteError
+import os
+import logging
+from typing import List, Optional, Dict, Any, Tuple
+from collections import deque
+from datetime import datetime
+import asyncio
+import time
+import json
+import glob
+from config import ROOT_DIR
+from metrics import time_stage
+import database
+from listing import json_default
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; journaled mode needs it
+    fcntl = None
+
+# Transcript write-behind. In "direct" mode every transcript is an
+# insert_one inside the request. The other modes acknowledge from memory and
+# insert in insert_many batches, by size or after a short interval:
+#   fire_and_forget   ack immediately; a crash loses what is still queued
+#   flush_before_ack  ack once the batch holding the entry is in Mongo
+#   journaled         ack once the entry is fsynced to a local journal,
+#                     which is replayed on startup
+# Each worker journals to its own TRANSCRIPT_JOURNAL_PATH.<pid>, holding an
+# flock on it while alive. On startup a worker adopts, under
+# TRANSCRIPT_JOURNAL_PATH.lock, every journal nobody holds: journals of dead
+# workers, and the plain TRANSCRIPT_JOURNAL_PATH older versions wrote.
+TRANSCRIPT_WRITE_MODES = ("direct", "fire_and_forget", "flush_before_ack", "journaled")
+TRANSCRIPT_WRITE_MODE = os.environ.get('TRANSCRIPT_WRITE_MODE', 'direct')
+TRANSCRIPT_BATCH_SIZE = int(os.environ.get('TRANSCRIPT_BATCH_SIZE', '200'))
+TRANSCRIPT_FLUSH_INTERVAL_MS = float(os.environ.get('TRANSCRIPT_FLUSH_INTERVAL_MS', '50'))
+TRANSCRIPT_QUEUE_MAX = int(os.environ.get('TRANSCRIPT_QUEUE_MAX', '20000'))
+TRANSCRIPT_JOURNAL_PATH = os.environ.get('TRANSCRIPT_JOURNAL_PATH', str(ROOT_DIR / 'transcripts.journal'))
+if TRANSCRIPT_WRITE_MODE not in TRANSCRIPT_WRITE_MODES:
+    raise ValueError(f"TRANSCRIPT_WRITE_MODE must be one of {', '.join(TRANSCRIPT_WRITE_MODES)}")
+if TRANSCRIPT_WRITE_MODE == "journaled" and fcntl is None:
+    raise ValueError("TRANSCRIPT_WRITE_MODE=journaled needs fcntl file locks (POSIX)")
+
+def only_duplicates(error: Exception) -> bool:
+    """True for an unordered insert_many whose only failures were duplicate keys"""
+    return isinstance(error, BulkWriteError) and all(
+        write_error.get("code") == 11000 for write_error in error.details.get("writeErrors", [])
+    ) and not error.details.get("writeConcernErrors")
+
+class WriteBehindQueue:
+    """Batches inserts into one collection off the request path.
+
+    Entries stay visible through ``pending_for`` until Mongo has confirmed
+    them, so reads can merge them in. Failed batches are retried with
+    backoff, except in flush_before_ack mode where the waiting requests get
+    the error instead.
+    """
+    
+    def __init__(
+        self,
+        collection_name: str,
+        mode: str,
+        batch_size: int,
+        flush_interval: float,
+        max_queued: int,
+        journal_path: Optional[str] = None,
+        datetime_fields: Tuple[str, ...] = ("timestamp",)
+    ):
+        self.collection_name = collection_name
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.journal_path = journal_path
+        self.datetime_fields = datetime_fields
+        self._queue: deque = deque()  # (doc, future or None)
+        self._unconfirmed: Dict[str, Dict[str, Dict[str, Any]]] = {}  # session_id -> id -> doc
+        self._unconfirmed_count = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._journal_lines: List[Tuple[bytes, asyncio.Future]] = []
+        self._journal_task: Optional[asyncio.Task] = None
+        self._journal_file = None
+        self._journal_opened: Optional[asyncio.Task] = None
+        self._truncate_requested = False
+        self._accepting = 0  # writers journaled but not yet queued
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.replayed = 0
+        self.adopted_journals = 0
+        self.max_depth = 0
+        self.flush_latencies_ms: deque = deque(maxlen=1000)
+    
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        if self.mode == "journaled":
+            self._journal_opened = asyncio.create_task(asyncio.to_thread(self._open_journal))
+        self._task = asyncio.create_task(self._run())
+    
+    async def write(self, doc: Dict[str, Any]):
+        """Queue a document, returning when the mode's durability is reached"""
+        if self._task is None:
+            self.start()
+        self._accepting += 1
+        try:
+            if self.mode == "journaled":
+                await self._journal(doc)
+            while len(self._queue) >= self.max_queued:
+                # Backpressure instead of unbounded memory when Mongo falls behind
+                self._space.clear()
+                await self._space.wait()
+        finally:
+            self._accepting -= 1
+        
+        future = asyncio.get_running_loop().create_future() if self.mode == "flush_before_ack" else None
+        self._queue.append((doc, future))
+        self._track(doc)
+        self.max_depth = max(self.max_depth, len(self._queue))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        if future is not None:
+            await future
+    
+    def pending_for(self, session_id: str) -> List[Dict[str, Any]]:
+        """Queued or in-flight documents for a session, not yet confirmed by Mongo"""
+        return list(self._unconfirmed.get(session_id, {}).values())
+    
+    def _track(self, doc: Dict[str, Any]):
+        self._unconfirmed.setdefault(doc["session_id"], {})[doc["id"]] = doc
+        self._unconfirmed_count += 1
+    
+    def _confirm(self, doc: Dict[str, Any]):
+        docs = self._unconfirmed.get(doc["session_id"])
+        if docs is not None and docs.pop(doc["id"], None) is not None:
+            self._unconfirmed_count -= 1
+            if not docs:
+                del self._unconfirmed[doc["session_id"]]
+    
+    async def _run(self):
+        if self._journal_opened is not None:
+            try:
+                self._replay(await self._journal_opened)
+            except Exception as e:
+                logging.error(f"Failed to open the {self.collection_name} journal: {str(e)}")
+        backoff = 0.5
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue:
+                if await self._flush_batch():
+                    backoff = 0.5
+                else:
+                    # close() gives up after its timeout; journaled entries survive that
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+            if self._closing:
+                return
+    
+    async def _flush_batch(self) -> bool:
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+        self._space.set()
+        started = time.perf_counter()
+        try:
+            with time_stage("mongo_write"):
+                # Copies: insert_many adds an ObjectId _id to the documents it is given
+                await database.db[self.collection_name].insert_many([dict(doc) for doc, _ in batch], ordered=False)
+        except Exception as e:
+            if not only_duplicates(e):
+                self.failures += 1
+                logging.error(f"Write-behind flush of {len(batch)} {self.collection_name} failed: {str(e)}")
+                if self.mode == "flush_before_ack":
+                    for doc, future in batch:
+                        self._confirm(doc)
+                        if not future.done():
+                            future.set_exception(e)
+                    return False
+                self._queue.extendleft(reversed(batch))
+                return False
+        
+        self.flush_latencies_ms.append((time.perf_counter() - started) * 1000)
+        self.batches += 1
+        self.flushed += len(batch)
+        for doc, future in batch:
+            self._confirm(doc)
+            if future is not None and not future.done():
+                future.set_result(None)
+        if self.mode == "journaled" and self._journal_idle():
+            self._truncate_requested = True
+            self._kick_journal()
+        return True
+    
+    async def _journal(self, doc: Dict[str, Any]):
+        """Group commit: concurrent writers share one write + fsync"""
+        future = asyncio.get_running_loop().create_future()
+        self._journal_lines.append((json.dumps(doc, default=json_default).encode() + b"\n", future))
+        self._kick_journal()
+        await future
+    
+    def _journal_idle(self) -> bool:
+        """Nothing journaled is still waiting for Mongo"""
+        return not (self._unconfirmed_count or self._accepting or self._journal_lines)
+    
+    def _kick_journal(self):
+        if self._journal_task is None or self._journal_task.done():
+            self._journal_task = asyncio.create_task(self._sync_journal())
+    
+    async def _sync_journal(self):
+        """The only task touching the journal file, so appends and truncation never overlap"""
+        try:
+            await self._journal_opened
+        except Exception as e:
+            lines, self._journal_lines = self._journal_lines, []
+            for _, future in lines:
+                future.set_exception(e)
+            return
+        while self._journal_lines or self._truncate_requested:
+            if not self._journal_lines:
+                self._truncate_requested = False
+                # Re-checked here: an entry acknowledged since the request must survive
+                if self._journal_idle():
+                    try:
+                        await asyncio.to_thread(self._truncate_journal)
+                    except Exception as e:
+                        logging.warning(f"Failed to truncate {self.journal_path}: {str(e)}")
+                continue
+            lines, self._journal_lines = self._journal_lines, []
+            try:
+                await asyncio.to_thread(self._append_journal, b"".join(line for line, _ in lines))
+            except Exception as e:
+                for _, future in lines:
+                    future.set_exception(e)
+                continue
+            for _, future in lines:
+                future.set_result(None)
+    
+    def _append_journal(self, data: bytes):
+        self._journal_file.write(data)
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+    
+    def _truncate_journal(self):
+        self._journal_file.truncate(0)
+    
+    def _open_journal(self) -> List[bytes]:
+        """Open and lock this worker's journal, adopting journals nobody holds.
+
+        Adopted lines are copied into our own journal and fsynced before the
+        orphan is removed, so a crash mid-adoption loses nothing. Returns
+        every line to requeue.
+        """
+        own_path = f"{self.journal_path}.{os.getpid()}"
+        with open(self.journal_path + ".lock", "ab") as guard:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            self._journal_file = open(own_path, "ab")
+            fcntl.flock(self._journal_file, fcntl.LOCK_EX)
+            # Left by an earlier process with the same pid (a restarted container)
+            with open(own_path, "rb") as journal:
+                data = journal.read()
+            candidates = [self.journal_path] + sorted(glob.glob(glob.escape(self.journal_path) + ".*"))
+            for path in candidates:
+                if path == own_path or not os.path.isfile(path):
+                    continue
+                if path != self.journal_path and not path.rsplit(".", 1)[1].isdigit():
+                    continue
+                with open(path, "rb") as orphan:
+                    try:
+                        fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # a live worker's journal
+                    adopted = orphan.read()
+                if adopted:
+                    # A torn last line must not run into the next entry
+                    if data and not data.endswith(b"\n"):
+                        adopted = b"\n" + adopted
+                    self._append_journal(adopted)
+                    data += adopted
+                os.unlink(path)
+                self.adopted_journals += 1
+            if data and not data.endswith(b"\n"):
+                self._append_journal(b"\n")
+        return data.splitlines()
+    
+    def _close_journal(self, remove: bool):
+        if self._journal_file is None:
+            return
+        if remove:
+            os.unlink(self._journal_file.name)
+        self._journal_file.close()
+        self._journal_file = None
+    
+    def _replay(self, lines: List[bytes]):
+        """Requeue journaled entries left by a previous process"""
+        for line in lines:
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue  # torn final line from a crash mid-write
+            for field in self.datetime_fields:
+                if isinstance(doc.get(field), str):
+                    doc[field] = datetime.fromisoformat(doc[field])
+            self._queue.append((doc, None))
+            self._track(doc)
+            self.replayed += 1
+        if self.replayed:
+            logging.info(f"Replaying {self.replayed} journaled {self.collection_name}")
+            self._wakeup.set()
+    
+    async def close(self, timeout: float = 10.0):
+        """Flush everything queued, then stop"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Write-behind drain timed out with {len(self._queue)} {self.collection_name} queued")
+            self._task.cancel()
+        if self._journal_task is not None and not self._journal_task.done():
+            await asyncio.wait({self._journal_task}, timeout=timeout)
+        if self._journal_file is not None and (self._journal_task is None or self._journal_task.done()):
+            # A drained journal goes away; anything left is adopted on the next start
+            await asyncio.to_thread(self._close_journal, self._journal_idle())
+    
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.flush_latencies_ms)
+        pick = lambda pct: round(latencies[min(len(latencies) - 1, int(len(latencies) * pct))], 2) if latencies else 0.0
+        return {
+            "mode": self.mode,
+            "queue_depth": len(self._queue),
+            "unconfirmed": self._unconfirmed_count,
+            "max_queue_depth": self.max_depth,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "avg_batch_size": round(self.flushed / self.batches, 2) if self.batches else 0.0,
+            "failures": self.failures,
+            "replayed": self.replayed,
+            "adopted_journals": self.adopted_journals,
+            "flush_latency_ms": {"p50": pick(0.5), "p95": pick(0.95), "max": latencies[-1] if latencies else 0.0},
+        }
+
+transcript_writer = WriteBehindQueue(
+    "transcripts",
+    TRANSCRIPT_WRITE_MODE,
+    TRANSCRIPT_BATCH_SIZE,
+    TRANSCRIPT_FLUSH_INTERVAL_MS / 1000,
+    TRANSCRIPT_QUEUE_MAX,
+    TRANSCRIPT_JOURNAL_PATH,
+)
@@ -31,6 +31,12 @@ function App() {
     apiKeyManager.storeKeys(keys);
   };
 
+  // A session token re-minted after a 401 replaces the stored one
+  const handleKeysRefreshed = (keys) => {
+    setApiKeys(keys);
+    apiKeyManager.storeKeys(keys);
+  };
+
   const handleShowSetup = () => {
     setShowSetup(true);
   };
@@ -59,6 +65,7 @@ function App() {
           apiKeys={apiKeys}
           onShowSetup={handleShowSetup}
           onResetSetup={handleResetSetup}
+          onKeysRefreshed={handleKeysRefreshed}
         />
       )}
 
@@ -4,7 +4,7 @@ import { Mic, MicOff, Eye, EyeOff, Settings, Volume2, VolumeX, RotateCcw } from
 import axios from 'axios';
 import API_CONFIG from '../config/api';
 
-const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
+const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup, onKeysRefreshed }) => {
   const [isListening, setIsListening] = useState(false);
   const [transcript, setTranscript] = useState('');
   const [currentSession, setCurrentSession] = useState(null);
@@ -17,19 +17,76 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
   const [isRecording, setIsRecording] = useState(false);
   
   const mediaRecorderRef = useRef(null);
-  const audioChunksRef = useRef([]);
   const streamRef = useRef(null);
   const silenceTimeoutRef = useRef(null);
+  const audioContextRef = useRef(null);
+  const energyLevelsRef = useRef([]);
+  const energyIntervalRef = useRef(null);
+  
+  // RMS level sampled every ENERGY_FRAME_MS while recording; sent with each
+  // chunk so the backend can skip silent chunks without calling Speech
+  const ENERGY_FRAME_MS = 100;
+  
+  // One continuous recording sliced every CHUNK_MS and streamed over the
+  // session's audio WebSocket; the backend stitches the slices and
+  // transcribes on pauses. One socket keeps the slices in order on the
+  // worker holding the session's aggregation buffer, and is not subject to
+  // the per-request rate limit of /api/transcribe-audio.
+  const CHUNK_MS = 1000;
+  // How long to wait for the final flush before closing the socket
+  const FLUSH_TIMEOUT_MS = 5000;
+  const socketRef = useRef(null);
+  const closingRef = useRef(false);
+  
+  const refreshRef = useRef(null);
   
   // Create axios instance with configuration
   const apiClient = axios.create(API_CONFIG);
 
-  // Create authorization header with API keys
+  // Session tokens expire after SESSION_TOKEN_TTL and, with the default
+  // in-memory state store, do not survive a backend restart: mint a new one
+  // from the stored keys (one request for concurrent callers)
+  const refreshSessionToken = () => {
+    if (!refreshRef.current) {
+      refreshRef.current = axios.create(API_CONFIG).post('/api/validate-keys', {
+        google_speech_api_key: apiKeys.google_speech_api_key,
+        gemini_api_key: apiKeys.gemini_api_key
+      }).then((response) => {
+        const refreshed = { ...apiKeys, session_token: response.data.token };
+        if (onKeysRefreshed) {
+          onKeysRefreshed(refreshed);
+        }
+        return refreshed.session_token;
+      }).finally(() => {
+        refreshRef.current = null;
+      });
+    }
+    return refreshRef.current;
+  };
+
+  // Retry a request rejected with 401 once, with a fresh session token
+  apiClient.interceptors.response.use(null, async (error) => {
+    const config = error.config;
+    if (error.response?.status !== 401 || !apiKeys.session_token || !config || config.retriedAuth) {
+      throw error;
+    }
+    const token = await refreshSessionToken();
+    return apiClient({
+      ...config,
+      retriedAuth: true,
+      headers: { ...config.headers, Authorization: `Bearer ${token}` }
+    });
+  });
+
+  // Create authorization header: the session token from key validation,
+  // or the base64 encoded keys for setups stored before tokens existed
   const getAuthHeader = () => {
-    const keysString = JSON.stringify(apiKeys);
-    const encodedKeys = btoa(keysString);
+    const credential = apiKeys.session_token || btoa(JSON.stringify({
+      google_speech_api_key: apiKeys.google_speech_api_key,
+      gemini_api_key: apiKeys.gemini_api_key
+    }));
     return {
-      'Authorization': `Bearer ${encodedKeys}`,
+      'Authorization': `Bearer ${credential}`,
       'Content-Type': 'application/json'
     };
   };
@@ -88,88 +145,90 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
     }
   };
 
-  // Convert audio blob to base64
-  const audioToBase64 = (audioBlob) => {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onload = () => {
-        const base64 = reader.result.split(',')[1];
-        resolve(base64);
-      };
-      reader.onerror = reject;
-      reader.readAsDataURL(audioBlob);
-    });
+  // The token travels in the socket's first message, never in the URL
+  const audioSocketUrl = (sessionId) => {
+    const url = new URL(`/api/interview/ws/${sessionId}`, API_CONFIG.baseURL);
+    url.protocol = url.protocol === 'https:' ? 'wss:' : 'ws:';
+    url.searchParams.set('aggregate', 'true');
+    url.searchParams.set('persist', 'true');
+    return url.toString();
   };
 
-  // Process audio chunk for transcription
-  const processAudioChunk = async (audioBlob) => {
-    if (!currentSession || !audioBlob) return;
-
-    try {
-      setDebugInfo('🔄 Processing audio...');
-      
-      const base64Audio = await audioToBase64(audioBlob);
-      
-      const response = await axios.post(`${backendUrl}/api/transcribe-audio`, {
-      }
-      )
-      const response = await apiClient.post('/api/transcribe-audio', {
-        session_id: currentSession.id,
-        audio_data: base64Audio,
-        audio_format: 'webm',
-        sample_rate: 16000
-      }, {
-        headers: getAuthHeader()
-      });
+  // Open the session's audio socket, authenticate and wait for the server's
+  // ready event. The socket accepts only session tokens, so setups stored
+  // before tokens existed mint one first.
+  const openAudioSocket = async (session, token) => {
+    const credential = token || apiKeys.session_token || await refreshSessionToken();
+    return connectAudioSocket(session, credential);
+  };
 
-      const { transcript: newTranscript, confidence } = response.data;
-      
-      if (newTranscript && newTranscript.trim()) {
-        setTranscript(newTranscript);
-        setDebugInfo(`📝 Transcribed (${Math.round(confidence * 100)}%): ${newTranscript.slice(0, 50)}...`);
-        
-        // Save transcript to backend
-        await saveTranscript(newTranscript, confidence);
-        
-        // Reset silence timeout
-        if (silenceTimeoutRef.current) {
-          clearTimeout(silenceTimeoutRef.current);
+  const connectAudioSocket = (session, token) => new Promise((resolve, reject) => {
+    const socket = new WebSocket(audioSocketUrl(session.id));
+    let ready = false;
+    let failure = null;
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ type: 'auth', token }));
+    };
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'ready') {
+        ready = true;
+        resolve(socket);
+      } else if (message.type === 'transcript') {
+        handleTranscript(session, message);
+        if (message.flush_reason && closingRef.current) {
+          socket.close();
         }
-        
-        // Set new silence timeout (3 seconds of silence)
-        silenceTimeoutRef.current = setTimeout(() => {
-          if (newTranscript && currentSession) {
-            processQuestion(newTranscript);
-          }
-        }, 3000);
+      } else if (message.type === 'error') {
+        failure = message.detail;
+        setDebugInfo(`❌ Transcription failed: ${message.detail}`);
       }
-    } catch (error) {
-      console.error('Failed to transcribe audio:', error);
-      setDebugInfo(`❌ Transcription failed: ${error.response?.data?.detail || error.message}`);
-    }
-  };
+    };
+    socket.onclose = (event) => {
+      if (!ready) {
+        const error = new Error(failure || 'Audio connection refused');
+        error.code = event.code;
+        reject(error);
+      } else if (event.code === 4409) {
+        setDebugInfo('⏹️ Session has ended');
+      } else if (event.code === 4429) {
+        setDebugInfo('❌ Audio connection closed: too many messages');
+      }
+      if (socketRef.current === socket) {
+        socketRef.current = null;
+      }
+    };
+  });
 
-  // Save transcript to backend
-  const saveTranscript = async (text, confidence) => {
-    if (!currentSession || !text.trim()) return;
+  // Handle a transcript event from the audio socket
+  const handleTranscript = (session, { transcript: newTranscript, confidence, skipped_silence: skippedSilence }) => {
+    if (skippedSilence) {
+      setDebugInfo('🔇 Silence skipped');
+      return;
+    }
     
-    try {
-      await apiClient.post('/api/interview/transcript', {
-        session_id: currentSession.id,
-        text: text.trim(),
-        speaker: 'interviewer',
-        confidence: confidence
-      }, {
-        headers: getAuthHeader()
-      });
+    if (newTranscript && newTranscript.trim()) {
+      setTranscript(newTranscript);
+      setDebugInfo(`📝 Transcribed (${Math.round(confidence * 100)}%): ${newTranscript.slice(0, 50)}...`);
       
-      setTranscriptHistory(prev => [...prev, { 
-        text: text.trim(), 
+      // The backend saved the transcript as part of transcription
+      setTranscriptHistory(prev => [...prev, {
+        text: newTranscript.trim(),
         timestamp: new Date(),
-        confidence: confidence 
+        confidence: confidence
       }]);
-    } catch (error) {
-      console.error('Failed to save transcript:', error);
+      
+      // Reset silence timeout
+      if (silenceTimeoutRef.current) {
+        clearTimeout(silenceTimeoutRef.current);
+      }
+      
+      // Set new silence timeout (3 seconds of silence)
+      silenceTimeoutRef.current = setTimeout(() => {
+        if (newTranscript && session) {
+          processQuestion(newTranscript);
+        }
+      }, 3000);
     }
   };
 
@@ -183,7 +242,8 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
     try {
       const response = await apiClient.post('/api/interview/ai-response', {
         session_id: currentSession.id,
-        question: question.trim()
+        question: question.trim(),
+        require_question: true
       }, {
         headers: getAuthHeader()
       });
@@ -192,6 +252,11 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
       setAiResponse(aiResponseData.response);
       setDebugInfo('✅ AI response generated');
     } catch (error) {
+      if (error.response?.data?.code === 'not_a_question') {
+        // The backend's question detector judged this utterance not to be a question
+        setDebugInfo('💬 Not a question, skipped');
+        return;
+      }
       console.error('Failed to get AI response:', error);
       setAiResponse('Error: Could not generate response. Please try again.');
       setDebugInfo(`❌ AI response failed: ${error.response?.data?.detail || error.message}`);
@@ -201,8 +266,19 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
   };
 
   // Start audio recording
-  const startRecording = async () => {
+  const startRecording = async (session) => {
     try {
+      closingRef.current = false;
+      let socket;
+      try {
+        socket = await openAudioSocket(session);
+      } catch (error) {
+        // 4401: the session token expired or the backend restarted
+        if (error.code !== 4401) throw error;
+        socket = await openAudioSocket(session, await refreshSessionToken());
+      }
+      socketRef.current = socket;
+      
       const stream = await navigator.mediaDevices.getUserMedia({ 
         audio: {
           sampleRate: 16000,
@@ -213,7 +289,25 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
       });
       
       streamRef.current = stream;
-      audioChunksRef.current = [];
+      energyLevelsRef.current = [];
+      
+      const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+      if (AudioContextClass) {
+        const audioContext = new AudioContextClass();
+        const analyser = audioContext.createAnalyser();
+        analyser.fftSize = 2048;
+        audioContext.createMediaStreamSource(stream).connect(analyser);
+        const samples = new Float32Array(analyser.fftSize);
+        audioContextRef.current = audioContext;
+        energyIntervalRef.current = setInterval(() => {
+          analyser.getFloatTimeDomainData(samples);
+          let sum = 0;
+          for (let i = 0; i < samples.length; i++) {
+            sum += samples[i] * samples[i];
+          }
+          energyLevelsRef.current.push(Math.round(Math.sqrt(sum / samples.length) * 10000) / 10000);
+        }, ENERGY_FRAME_MS);
+      }
       
       const mediaRecorder = new MediaRecorder(stream, {
         mimeType: 'audio/webm;codecs=opus'
@@ -221,42 +315,38 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
       
       mediaRecorderRef.current = mediaRecorder;
       
+      // Slices go out in order on the one socket: only the first carries
+      // the WebM header and the backend appends the rest to it
       mediaRecorder.ondataavailable = (event) => {
+        const energyLevels = energyLevelsRef.current;
+        energyLevelsRef.current = [];
+        if (socket.readyState !== WebSocket.OPEN) return;
         if (event.data.size > 0) {
-          audioChunksRef.current.push(event.data);
+          if (energyLevels.length) {
+            socket.send(JSON.stringify({ type: 'energy', levels: energyLevels, frame_ms: ENERGY_FRAME_MS }));
+          }
+          socket.send(event.data);
         }
-      };
-      
-      mediaRecorder.onstop = () => {
-        const audioBlob = new Blob(audioChunksRef.current, { type: 'audio/webm' });
-        if (audioBlob.size > 0) {
-          processAudioChunk(audioBlob);
+        if (mediaRecorder.state === 'inactive') {
+          // Last slice: transcribe what is buffered, then close
+          closingRef.current = true;
+          socket.send(JSON.stringify({ type: 'flush' }));
+          setTimeout(() => socket.close(), FLUSH_TIMEOUT_MS);
         }
       };
       
-      // Record in 3-second chunks
-      mediaRecorder.start();
+      mediaRecorder.start(CHUNK_MS);
       setIsRecording(true);
       
-      const recordingInterval = setInterval(() => {
-        if (mediaRecorderRef.current && mediaRecorderRef.current.state === 'recording') {
-          mediaRecorderRef.current.stop();
-          setTimeout(() => {
-            if (isListening && mediaRecorderRef.current) {
-              audioChunksRef.current = [];
-              mediaRecorderRef.current.start();
-            }
-          }, 100);
-        } else {
-          clearInterval(recordingInterval);
-        }
-      }, 3000);
-      
-      return recordingInterval;
+      return mediaRecorder;
       
     } catch (error) {
       console.error('Failed to start recording:', error);
       setDebugInfo(`❌ Recording failed: ${error.message}`);
+      if (socketRef.current) {
+        socketRef.current.close();
+        socketRef.current = null;
+      }
       setIsListening(false);
       return null;
     }
@@ -268,6 +358,16 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
       mediaRecorderRef.current.stop();
     }
     
+    if (energyIntervalRef.current) {
+      clearInterval(energyIntervalRef.current);
+      energyIntervalRef.current = null;
+    }
+    
+    if (audioContextRef.current) {
+      audioContextRef.current.close();
+      audioContextRef.current = null;
+    }
+    
     if (streamRef.current) {
       streamRef.current.getTracks().forEach(track => track.stop());
       streamRef.current = null;
@@ -291,18 +391,16 @@ const InterviewCopilot = ({ apiKeys, onShowSetup, onResetSetup }) => {
       }
     }
     
-    if (!currentSession) {
-      const session = await createSession();
-      if (!session) return;
-    }
+    const session = currentSession || await createSession();
+    if (!session) return;
     
     if (isListening) {
       stopRecording();
       setIsListening(false);
       setDebugInfo('🔴 Stopped listening');
     } else {
-      const interval = await startRecording();
-      if (interval) {
+      const recorder = await startRecording(session);
+      if (recorder) {
         setIsListening(true);
         setDebugInfo('🎤 Started listening...');
       }
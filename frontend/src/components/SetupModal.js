@@ -37,7 +37,8 @@ const SetupModal = ({ onComplete, onClose, existingKeys }) => {
         setTimeout(() => {
           onComplete({
             google_speech_api_key: googleApiKey.trim(),
-            gemini_api_key: geminiApiKey.trim()
+            gemini_api_key: geminiApiKey.trim(),
+            session_token: response.data.token
           });
         }, 1000);
         return true;
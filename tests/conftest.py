@@ -0,0 +1,12 @@
+import os
+import sys
+
+from cryptography.fernet import Fernet
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+# The backend modules read these at import time; tests never reach a real MongoDB
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "interview_copilot_test")
+os.environ.setdefault("TOKEN_ENCRYPTION_KEY", Fernet.generate_key().decode())
@@ -0,0 +1,96 @@
+from aggregation import (
+    AudioAggregator, WebMFrameAssembler, dedupe_overlap, WEBM_CLUSTER_ID, WEBM_EBML_MAGIC
+)
+
+HEADER = WEBM_EBML_MAGIC + b"header-and-tracks"
+SPEECH = [0.2] * 5
+PAUSE = [0.2] * 3 + [0.0] * 6
+
+
+def first_slice(payload: bytes = b"one") -> bytes:
+    return HEADER + WEBM_CLUSTER_ID + payload
+
+
+def cluster(payload: bytes) -> bytes:
+    return WEBM_CLUSTER_ID + payload
+
+
+def aggregator(max_ms: float = 10000) -> AudioAggregator:
+    return AudioAggregator(max_ms, pause_ms=500, overlap_ms=500, idle_seconds=60, max_sessions=10)
+
+
+def test_webm_slices_are_stitched_behind_the_first_header():
+    audio = aggregator()
+    assert audio.add("s", first_slice(), "WEBM_OPUS", 48000) is AudioAggregator.PENDING
+    assert audio.add("s", cluster(b"two"), "WEBM_OPUS", 48000) is AudioAggregator.PENDING
+    flushed = audio.flush("s")
+    assert flushed.reason == "client"
+    assert flushed.audio == HEADER + cluster(b"one") + cluster(b"two")
+    # Later flushes still carry the header
+    audio.add("s", cluster(b"three"), "WEBM_OPUS", 48000)
+    assert audio.flush("s").audio == HEADER + cluster(b"three")
+
+
+def test_new_recording_flushes_the_previous_one():
+    audio = aggregator()
+    audio.add("s", first_slice(b"old"), "WEBM_OPUS", 48000)
+    flushed = audio.add("s", WEBM_EBML_MAGIC + b"other-header" + cluster(b"new"), "WEBM_OPUS", 48000)
+    assert flushed.reason == "new_stream"
+    assert flushed.audio == HEADER + cluster(b"old")
+    assert audio.flush("s").audio == WEBM_EBML_MAGIC + b"other-header" + cluster(b"new")
+
+
+def test_assembler_prefixes_continuation_frames():
+    assembler = WebMFrameAssembler()
+    assert assembler.assemble(cluster(b"orphan")) == cluster(b"orphan")
+    assert assembler.assemble(first_slice()) == first_slice()
+    assert assembler.assemble(cluster(b"two")) == HEADER + cluster(b"two")
+
+
+def test_pause_flushes_buffered_speech():
+    audio = aggregator()
+    assert audio.add("s", first_slice(), "WEBM_OPUS", 48000, SPEECH, 100) is AudioAggregator.PENDING
+    flushed = audio.add("s", cluster(b"two"), "WEBM_OPUS", 48000, PAUSE, 100)
+    assert flushed.reason == "pause"
+    assert flushed.audio == HEADER + cluster(b"one") + cluster(b"two")
+    assert audio.pending_ms("s") == 0
+
+
+def test_silence_only_flushes_when_speech_is_buffered():
+    audio = aggregator()
+    silence = [0.0] * 10
+    assert audio.add("s", first_slice(), "WEBM_OPUS", 48000, silence, 100) is AudioAggregator.SILENT
+    audio.add("s", cluster(b"two"), "WEBM_OPUS", 48000, SPEECH, 100)
+    flushed = audio.add("s", cluster(b"three"), "WEBM_OPUS", 48000, silence, 100)
+    # The silent chunk itself is not sent
+    assert flushed.reason == "pause" and flushed.audio == HEADER + cluster(b"two")
+
+
+def test_budget_flush_keeps_overlap_and_dedupes_it():
+    audio = aggregator(max_ms=1000)
+    audio.add("s", first_slice(), "WEBM_OPUS", 48000, SPEECH, 100)
+    first = audio.add("s", cluster(b"two"), "WEBM_OPUS", 48000, SPEECH, 100)
+    assert first.reason == "budget" and first.previous_text is None
+    assert audio.finish("s", first, "we used kafka for the") == "we used kafka for the"
+
+    second = audio.add("s", cluster(b"three"), "WEBM_OPUS", 48000, SPEECH, 100)
+    # The last chunk of the budget flush is sent again as overlap
+    assert second.audio == HEADER + cluster(b"two") + cluster(b"three")
+    assert audio.finish("s", second, "For the event stream.") == "event stream."
+    assert audio.stats()["words_deduped"] == 2
+
+
+def test_dedupe_overlap():
+    assert dedupe_overlap("so we sharded by customer", "Customer, and then by region") == "and then by region"
+    assert dedupe_overlap("we used kafka", "then we moved on") == "then we moved on"
+    assert dedupe_overlap(None, "hello there") == "hello there"
+    assert dedupe_overlap("it", "") == ""
+
+
+def test_buffers_are_per_process():
+    """HTTP aggregate=true needs a session's uploads routed to one worker"""
+    worker_a, worker_b = aggregator(), aggregator()
+    worker_a.add("s", first_slice(), "WEBM_OPUS", 48000)
+    worker_b.add("s", cluster(b"two"), "WEBM_OPUS", 48000)
+    # Worker B never saw the header, so its audio cannot be decoded
+    assert worker_b.flush("s").audio == cluster(b"two")
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import uuid
+
+import httpx
+import pytest
+
+import ai_responses
+import auth
+import database
+import http_pool
+import llm
+import models
+import server
+import upstream
+from singleflight import ai_singleflight
+from benchmark import FAKE_KEYS, FaultInjector, make_fake_llm
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def fake_upstreams(monkeypatch):
+    """Fake Gemini, an in-memory Mongo and a fresh breaker, as the benchmark sets them up"""
+
+    def install(error_rate: float = 0.0, tokens: int = 5):
+        fault = FaultInjector("gemini", 1.0, error_rate=error_rate)
+        monkeypatch.setattr(llm, "llm_chat_factory", make_fake_llm(fault, tokens, token_interval_ms=1))
+        monkeypatch.setattr(database, "db", mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"])
+        monkeypatch.setattr(upstream, "gemini_guard", upstream.UpstreamGuard("gemini", "Gemini", upstream.GEMINI_TIMEOUT, False))
+        monkeypatch.setattr(server.limiter, "enabled", False)
+        return fault
+
+    return install
+
+
+def parse_events(body: str):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def stream_answer(question: str):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        token = await auth.issue_session_token(models.APIKeysModel(**FAKE_KEYS))
+        session = (await client.post("/api/interview/session", json={"user_id": "test"})).json()
+        response = await client.post(
+            "/api/interview/ai-response/stream",
+            json={"session_id": session["id"], "question": question},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.headers["content-type"].startswith("text/event-stream")
+        return session, parse_events(response.text)
+
+
+def test_stream_sends_tokens_then_done(fake_upstreams):
+    fake_upstreams(tokens=5)
+    question = f"How would you design a rate limiter? ({uuid.uuid4().hex})"
+    session, events = asyncio.run(stream_answer(question))
+
+    names = [name for name, _ in events]
+    assert names == ["token"] * 5 + ["done"]
+    done = events[-1][1]
+    assert done["streamed"] is True
+    assert done["response"]["session_id"] == session["id"]
+    assert done["response"]["response"] == "".join(data["text"] for _, data in events[:-1])
+    assert 0 <= done["timings"]["ttft_ms"] <= done["timings"]["total_ms"]
+
+
+def test_stream_reports_upstream_failure_as_error_event(fake_upstreams):
+    fake_upstreams(error_rate=1.0)
+    _, events = asyncio.run(stream_answer(f"Why do you want to work here? ({uuid.uuid4().hex})"))
+
+    assert [name for name, _ in events] == ["error"]
+    assert "Failed to generate AI response" in events[0][1]["detail"]
+
+
+async def disconnect_before_first_chunk(question: str):
+    """Drive the stream endpoint over raw ASGI; the client leaves while headers are sent"""
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        token = await auth.issue_session_token(models.APIKeysModel(**FAKE_KEYS))
+        session = (await client.post("/api/interview/session", json={"user_id": "test"})).json()
+    request = models.AIResponseRequest(session_id=session["id"], question=question)
+    body = request.model_dump_json().encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/interview/ai-response/stream",
+        "raw_path": b"/api/interview/ai-response/stream", "query_string": b"", "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"authorization", f"Bearer {token}".encode()),
+        ],
+        "client": ("127.0.0.1", 1234), "server": ("test", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message["type"])
+        if message["type"] == "http.response.start":
+            # Slow enough that the disconnect lands before the body is iterated
+            await asyncio.sleep(1)
+
+    await server.app(scope, receive, send)
+    return ai_responses.ai_request_key(request), sent
+
+
+def test_disconnect_before_streaming_releases_followers(fake_upstreams):
+    fake_upstreams(tokens=5)
+    key, sent = asyncio.run(disconnect_before_first_chunk(f"Tell me about a hard bug ({uuid.uuid4().hex})"))
+
+    assert "http.response.body" not in sent
+    assert not ai_singleflight.in_flight(key)
+
+
+class FakeStreamResponse:
+    def __init__(self, lines):
+        self.content = self._iterate(lines)
+
+    @staticmethod
+    async def _iterate(lines):
+        for line in lines:
+            yield line
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeStreamCall:
+    def __init__(self, lines):
+        self.lines = lines
+
+    async def __aenter__(self):
+        return FakeStreamResponse(self.lines)
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def test_rest_stream_skips_lines_that_are_not_json(monkeypatch):
+    lines = [
+        b": keep-alive\n",
+        b"data: {\"candidates\": [{\"content\": {\"parts\": [{\"text\": \"Hello \"}]}}]}\n",
+        b"data: {\"candidates\": [{\"content\"\n",
+        b"data: [DONE]\n",
+        b"data: {\"candidates\": [{\"content\": {\"parts\": [{\"text\": \"world\"}]}}]}\n",
+    ]
+
+    class Client:
+        def post(self, *args, **kwargs):
+            return FakeStreamCall(lines)
+
+    monkeypatch.setattr(http_pool, "get_http_client", lambda: Client())
+
+    async def run():
+        return [chunk async for chunk in llm.stream_gemini_rest("key", "prompt")]
+
+    assert asyncio.run(run()) == ["Hello ", "world"]
@@ -0,0 +1,188 @@
+import asyncio
+
+import question_cache
+import shared_state
+from models import AIResponseRequest
+from question_cache import AnswerCache, normalize_question
+from singleflight import SingleFlight
+from speculative import SpeculationManager
+
+
+def test_normalization_folds_filler_and_lead_ins():
+    assert normalize_question("Um, could you please tell me about Kafka?") == "tell me about kafka"
+    assert normalize_question("So... what's   your biggest WEAKNESS") == "what's your biggest weakness"
+
+
+def test_exact_and_near_duplicate_hits():
+    cache = AnswerCache(maxsize=10, threshold=0.7)
+    cache.store("What is your biggest weakness?", "Perfectionism", latency_ms=900)
+
+    assert cache.lookup("um, what is your biggest weakness").response == "Perfectionism"
+    assert cache.lookup("What is your single biggest weakness?").response == "Perfectionism"
+    assert cache.lookup("What is your biggest strength?") is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["latency_saved_ms"] > 0
+
+
+def test_context_dependent_questions_are_never_cached():
+    cache = AnswerCache(maxsize=10, threshold=0.7)
+    assert cache.store("Can you elaborate on that?", "Sure") is None
+    assert cache.lookup("Can you elaborate on that?") is None
+    assert cache.stats()["skipped_context_dependent"] == 1
+
+
+def test_learned_answers_stay_in_their_scope():
+    cache = AnswerCache(maxsize=10, threshold=0.7)
+    cache.store("Why do you want to work here?", "Global answer")
+    cache.store("Walk me through your resume", "Alice's resume", scope="alice")
+
+    assert cache.lookup("Walk me through your resume", "alice").response == "Alice's resume"
+    assert cache.lookup("Walk me through your resume", "bob") is None
+    assert cache.lookup("Walk me through your resume!", None) is None
+    # Near-duplicates respect the scope too
+    assert cache.lookup("Walk me through your whole resume", "bob") is None
+    # Global entries are served to everyone
+    assert cache.lookup("Why do you want to work here", "bob").response == "Global answer"
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = AnswerCache(maxsize=2, threshold=0.7)
+    cache.store("What motivates you?", "one")
+    cache.store("Where do you see yourself in five years?", "two")
+    cache.lookup("What motivates you?")
+    cache.store("Why should we hire you?", "three")
+    assert cache.lookup("Where do you see yourself in five years?") is None
+    assert cache.lookup("What motivates you?").response == "one"
+    assert not any(key[1].startswith("where") for keys in cache._bands.values() for key in keys)
+
+
+class SharedMemoryStore(shared_state.InMemoryStateStore):
+    """In-memory store standing in for Redis"""
+    shared = True
+
+
+def test_shared_tier_serves_other_workers_until_its_ttl(monkeypatch):
+    monkeypatch.setattr(shared_state, "state_store", SharedMemoryStore())
+    monkeypatch.setattr(question_cache, "ANSWER_CACHE_SHARED_TTL", 0.05)
+    request = AIResponseRequest(session_id="session-0001", question="How do you handle pressure?")
+
+    async def run():
+        monkeypatch.setattr(question_cache, "answer_cache", AnswerCache(10, 0.7))
+        await question_cache.remember_answer(request.question, "Calmly", 800, "alice")
+        # Another worker with an empty local cache
+        monkeypatch.setattr(question_cache, "answer_cache", AnswerCache(10, 0.7))
+        shared_hit = await question_cache.lookup_cached_answer(request, "alice")
+        other_scope = await question_cache.lookup_cached_answer(request, "bob")
+        await asyncio.sleep(0.1)
+        monkeypatch.setattr(question_cache, "answer_cache", AnswerCache(10, 0.7))
+        expired = await question_cache.lookup_cached_answer(request, "alice")
+        return shared_hit, other_scope, expired
+
+    shared_hit, other_scope, expired = asyncio.run(run())
+    assert shared_hit.response == "Calmly"
+    assert other_scope is None
+    assert expired is None
+
+
+class FakeSpeculation(SpeculationManager):
+    """Speculates without calling Gemini"""
+
+    def __init__(self, ttl, delay=0.0):
+        super().__init__(ttl)
+        self.delay = delay
+
+    async def _generate(self, session_id, question, api_keys):
+        await asyncio.sleep(self.delay)
+        return f"answer to {question}", 500.0
+
+
+def test_matching_question_claims_the_speculation():
+    manager = FakeSpeculation(ttl=30)
+
+    async def run():
+        manager.on_speech("s", "How would you design a rate limiter?", object())
+        claimed = await manager.claim("s", "how would you design a rate limiter")
+        again = await manager.claim("s", "How would you design a rate limiter?")
+        return claimed, again
+
+    claimed, again = asyncio.run(run())
+    assert claimed == ("answer to How would you design a rate limiter?", 500.0)
+    assert again is None
+    assert manager.stats()["claimed"] == 1
+
+
+def test_new_speech_cancels_and_mismatches_discard():
+    manager = FakeSpeculation(ttl=30, delay=1)
+
+    async def run():
+        manager.on_speech("s", "What is your biggest weakness?", object())
+        task = manager._pending["s"].task
+        manager.on_speech("s", "Actually, let me rephrase that.", object())
+        await asyncio.sleep(0)
+        manager.on_speech("s", "Why did you leave your last job?", object())
+        mismatch = await manager.claim("s", "Why do you want this job?")
+        return task.cancelled(), mismatch
+
+    cancelled, mismatch = asyncio.run(run())
+    assert cancelled and mismatch is None
+    stats = manager.stats()
+    assert (stats["started"], stats["cancelled"], stats["pending"]) == (2, 2, 0)
+
+
+def test_speculation_needs_keys_and_a_question():
+    manager = FakeSpeculation(ttl=30)
+    manager.on_speech("s", "Why do you want to work here?", None)
+    manager.on_speech("s", "I worked at a bank for three years.", object())
+    assert manager.stats()["started"] == 0
+
+
+def test_stale_speculation_is_not_claimed():
+    manager = FakeSpeculation(ttl=0)
+
+    async def run():
+        manager.on_speech("s", "What motivates you?", object())
+        await asyncio.sleep(0.01)
+        return await manager.claim("s", "What motivates you?")
+
+    assert asyncio.run(run()) is None
+    assert manager.stats()["discarded"] == 1
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        flight = SingleFlight(timeout=5)
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        other = await flight.do("other", work)
+        return results, other, flight.stats()
+
+    results, other, stats = asyncio.run(run())
+    assert results == ["answer"] * 5 and other == "answer"
+    assert len(calls) == 2
+    assert (stats["leaders"], stats["collapsed"], stats["inflight"]) == (2, 4, 0)
+
+
+def test_a_failed_call_fails_every_waiter_once():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        flight = SingleFlight(timeout=5)
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+        return results, flight.in_flight("key")
+
+    results, in_flight = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not in_flight
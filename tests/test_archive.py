@@ -0,0 +1,179 @@
+import asyncio
+import json
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import archive
+import database
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def test_merge_archive_keeps_purged_rows_and_prefers_hot_copies():
+    archived = {
+        "transcripts": [{"id": "t1", "text": "old"}, {"id": "t2", "text": "purged from hot"}],
+        "ai_responses": [],
+        "session_summaries": [{"session_id": "s", "summary": "v1"}],
+    }
+    hot = {
+        "transcripts": [{"id": "t1", "text": "edited"}, {"id": "t3", "text": "new"}],
+        "ai_responses": [{"id": "a1"}],
+        "session_summaries": [{"session_id": "s", "summary": "v2"}],
+    }
+    merged = archive.merge_archive(archived, hot)
+
+    assert sorted((doc["id"], doc["text"]) for doc in merged["transcripts"]) == [
+        ("t1", "edited"), ("t2", "purged from hot"), ("t3", "new")
+    ]
+    assert merged["ai_responses"] == [{"id": "a1"}]
+    assert merged["session_summaries"] == [{"session_id": "s", "summary": "v2"}]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongo = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    monkeypatch.setattr(database, "db", mongo)
+    return mongo
+
+
+async def ended_session(db, transcripts=2):
+    session_id = str(uuid.uuid4())
+    long_ago = datetime.utcnow() - timedelta(days=2)
+    await db.interview_sessions.insert_one({
+        "id": session_id, "user_id": "u", "created_at": long_ago, "is_active": False, "ended_at": long_ago,
+    })
+    await db.transcripts.insert_many([
+        {"id": str(uuid.uuid4()), "session_id": session_id, "text": f"turn {i}", "timestamp": long_ago}
+        for i in range(transcripts)
+    ])
+    await db.ai_responses.insert_one({"id": str(uuid.uuid4()), "session_id": session_id, "question": "q", "response": "r", "timestamp": long_ago})
+    await db.session_summaries.insert_one({"session_id": session_id, "summary": "so far", "updated_at": long_ago})
+    return session_id
+
+
+async def hot_counts(db, session_id):
+    return [await db[name].count_documents({"session_id": session_id}) for name in archive.ARCHIVED_COLLECTIONS]
+
+
+def test_archive_then_restore_round_trip(db):
+    archiver = archive.SessionArchiver(True, 0, 60, 10, 0)
+
+    async def run():
+        session_id = await ended_session(db)
+        assert await archiver.run_once() == 1
+        archived_counts = await hot_counts(db, session_id)
+        session = await db.interview_sessions.find_one({"id": session_id})
+        assert session["archive_state"] == "archived" and session["archived_at"] is not None
+
+        assert await archiver.restore(session_id)
+        restored = await db.transcripts.find({"session_id": session_id}).to_list(None)
+        session = await db.interview_sessions.find_one({"id": session_id})
+        return archived_counts, restored, session, await hot_counts(db, session_id)
+
+    archived_counts, restored, session, restored_counts = asyncio.run(run())
+    assert archived_counts == [0, 0, 0]
+    assert restored_counts == [2, 1, 1]
+    assert all(isinstance(doc["timestamp"], datetime) for doc in restored)
+    assert "archived_at" not in session and "archive_state" not in session
+
+
+def test_rearchiving_a_restored_session_merges_into_its_archive(db):
+    archiver = archive.SessionArchiver(True, 0, 60, 10, 0)
+
+    async def run():
+        session_id = await ended_session(db, transcripts=3)
+        await archiver.run_once()
+        await archiver.restore(session_id)
+        # HOT_RETENTION_DAYS purged one restored row; a new one arrived
+        await db.transcripts.delete_one({"session_id": session_id, "text": "turn 0"})
+        await db.transcripts.insert_one({"id": str(uuid.uuid4()), "session_id": session_id, "text": "late", "timestamp": datetime.utcnow()})
+        await db.interview_sessions.update_one({"id": session_id}, {"$set": {"restored_at": datetime.utcnow() - timedelta(days=1)}})
+        assert await archiver.run_once() == 1
+        stored = await db.session_archives.find_one({"session_id": session_id})
+        return json.loads(zlib.decompress(stored["data"]))
+
+    contents = asyncio.run(run())
+    assert sorted(doc["text"] for doc in contents["transcripts"]) == ["late", "turn 0", "turn 1", "turn 2"]
+
+
+def test_auto_end_without_archiving(db):
+    archiver = archive.SessionArchiver(False, 0, 60, 10, 1)
+
+    async def run():
+        started = datetime.utcnow() - timedelta(hours=2)
+        await db.interview_sessions.insert_one({"id": "stale-session", "created_at": started, "is_active": True})
+        archived = await archiver.run_once()
+        return archived, await db.interview_sessions.find_one({"id": "stale-session"})
+
+    archived, session = asyncio.run(run())
+    assert archived == 0
+    assert session["is_active"] is False and "archived_at" not in session
+    assert archiver.needed and not archive.SessionArchiver(False, 0, 60, 10, 0).needed
+
+
+class IndexedCollection:
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.dropped = []
+
+    async def index_information(self):
+        return dict(self.indexes)
+
+    async def drop_index(self, name):
+        self.dropped.append(name)
+
+
+class IndexedDatabase:
+    """Records the index commands ensure_indexes issues"""
+
+    def __init__(self, indexes):
+        self.collection = IndexedCollection(indexes)
+        self.commands = []
+
+    def __getitem__(self, name):
+        return self.collection
+
+    async def command(self, command):
+        self.commands.append(command)
+
+
+def test_changed_retention_is_applied_with_collmod(monkeypatch):
+    fake = IndexedDatabase({"timestamp_ttl": {"key": [("timestamp", 1)], "expireAfterSeconds": 86400}})
+    monkeypatch.setattr(database, "db", fake)
+
+    asyncio.run(database.reconcile_ttl_indexes("transcripts", database.ttl_index("timestamp", 2)))
+    assert fake.commands == [{"collMod": "transcripts", "index": {"name": "timestamp_ttl", "expireAfterSeconds": 172800}}]
+
+    # Unchanged retention issues nothing
+    fake.collection.indexes["timestamp_ttl"]["expireAfterSeconds"] = 172800
+    asyncio.run(database.reconcile_ttl_indexes("transcripts", database.ttl_index("timestamp", 2)))
+    assert len(fake.commands) == 1
+
+
+def test_disabled_retention_drops_the_ttl_index(monkeypatch):
+    fake = IndexedDatabase({"timestamp_ttl": {"key": [("timestamp", 1)], "expireAfterSeconds": 86400}})
+    monkeypatch.setattr(database, "db", fake)
+
+    asyncio.run(database.reconcile_ttl_indexes("transcripts", database.ttl_index("timestamp", 0)))
+    assert fake.collection.dropped == ["timestamp_ttl"]
+
+
+def test_conflicting_index_is_a_configuration_error(monkeypatch):
+    fake = IndexedDatabase({"timestamp_ttl": {"key": [("timestamp", 1)]}})
+    monkeypatch.setattr(database, "db", fake)
+
+    with pytest.raises(database.DatabaseConfigError):
+        asyncio.run(database.reconcile_ttl_indexes("transcripts", database.ttl_index("timestamp", 1)))
+
+
+def test_bootstrap_does_not_retry_configuration_errors(monkeypatch):
+    async def conflict():
+        raise OperationFailure("Index with name: timestamp_ttl already exists with different options", code=85)
+
+    monkeypatch.setattr(database, "ensure_indexes", conflict)
+    with pytest.raises(database.DatabaseConfigError):
+        asyncio.run(asyncio.wait_for(database.bootstrap_database(), 1))
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import audio_socket
+import auth
+import database
+import models
+import server
+import sessions
+from benchmark import FAKE_KEYS
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(database, "db", mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"])
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    sessions.session_cache.clear()
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def token():
+    return asyncio.run(auth.issue_session_token(models.APIKeysModel(**FAKE_KEYS)))
+
+
+def new_session(client) -> str:
+    return client.post("/api/interview/session", json={"user_id": "test"}).json()["id"]
+
+
+def close_code(ws) -> tuple:
+    """The error detail sent before the close, and the close code"""
+    detail = ws.receive_json()["detail"]
+    with pytest.raises(WebSocketDisconnect) as closed:
+        ws.receive_json()
+    return detail, closed.value.code
+
+
+def test_first_message_authenticates(client, token):
+    session_id = new_session(client)
+    with client.websocket_connect(f"/api/interview/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        assert ws.receive_json() == {"type": "ready", "session_id": session_id}
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_token_in_url_is_refused(client, token):
+    session_id = new_session(client)
+    with client.websocket_connect(f"/api/interview/ws/{session_id}?token={token}") as ws:
+        assert close_code(ws) == ("Send the session token in an auth message, not the URL", 4401)
+
+
+def test_raw_keys_are_refused(client):
+    session_id = new_session(client)
+    with client.websocket_connect(f"/api/interview/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": "bm90LWEtc2Vzc2lvbi10b2tlbg=="})
+        assert close_code(ws) == ("Session token required", 4401)
+
+
+def test_unknown_token_is_refused(client):
+    session_id = new_session(client)
+    with client.websocket_connect(f"/api/interview/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": auth.SESSION_TOKEN_PREFIX + "expired"})
+        assert close_code(ws)[1] == 4401
+
+
+def test_auth_times_out(client, monkeypatch):
+    monkeypatch.setattr(audio_socket, "WS_AUTH_TIMEOUT_SECONDS", 0.05)
+    session_id = new_session(client)
+    with client.websocket_connect(f"/api/interview/ws/{session_id}") as ws:
+        assert close_code(ws) == ("API keys required", 4401)
+
+
+def test_ended_session_is_refused_at_connect(client, token):
+    session_id = new_session(client)
+    assert client.post(f"/api/interview/session/{session_id}/end").json()["is_active"] is False
+    with client.websocket_connect(f"/api/interview/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        assert close_code(ws) == ("Session has ended", 4409)
+
+
+def test_session_ended_mid_stream_closes_the_socket(client, token, monkeypatch):
+    monkeypatch.setattr(audio_socket, "WS_SESSION_RECHECK_SECONDS", 0)
+    session_id = new_session(client)
+    with client.websocket_connect(f"/api/interview/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        ws.receive_json()
+        asyncio.run(database.db.interview_sessions.update_one({"id": session_id}, {"$set": {"is_active": False}}))
+        ws.send_bytes(b"\x00" * 100)
+        assert close_code(ws) == ("Session has ended", 4409)
+
+
+def test_flooding_connection_is_closed(client, token, monkeypatch):
+    monkeypatch.setattr(audio_socket, "WS_MESSAGE_BURST", 3)
+    monkeypatch.setattr(audio_socket, "WS_MESSAGES_PER_SECOND", 0.01)
+    session_id = new_session(client)
+    with client.websocket_connect(f"/api/interview/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        ws.receive_json()
+        for _ in range(4):
+            ws.send_json({"type": "ping"})
+        assert [ws.receive_json() for _ in range(3)] == [{"type": "pong"}] * 3
+        assert close_code(ws) == ("Too many messages", 4429)
+
+
+def test_throttle_refills_at_its_rate(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    throttle = audio_socket.MessageThrottle(rate=2, burst=2)
+    assert [throttle.allow() for _ in range(3)] == [True, True, False]
+    clock[0] += 0.5
+    assert [throttle.allow() for _ in range(2)] == [True, False]
+    clock[0] += 10
+    assert [throttle.allow() for _ in range(3)] == [True, True, False]
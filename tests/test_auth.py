@@ -0,0 +1,82 @@
+import asyncio
+import base64
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import auth
+import llm
+import server
+import shared_state
+from benchmark import FAKE_KEYS, FaultInjector, make_fake_llm
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Fake Gemini for the key check, a fresh state store and no rate limits"""
+
+    def install(error_rate: float = 0.0):
+        fault = FaultInjector("gemini", 0.0, error_rate=error_rate)
+        monkeypatch.setattr(llm, "llm_chat_factory", make_fake_llm(fault, 1, token_interval_ms=0))
+        monkeypatch.setattr(shared_state, "state_store", shared_state.InMemoryStateStore())
+        monkeypatch.setattr(server.limiter, "enabled", False)
+        return fault
+
+    return install
+
+
+async def post(path: str, body: dict, headers: dict = None):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(path, json=body, headers=headers or {})
+
+
+def test_validation_issues_tokens_and_is_remembered(gemini):
+    fault = gemini()
+
+    async def run():
+        first = await post("/api/validate-keys", FAKE_KEYS)
+        second = await post("/api/validate-keys", FAKE_KEYS)
+        return first.json(), second.json()
+
+    first, second = asyncio.run(run())
+    assert first["status"] == second["status"] == "valid"
+    assert first["token"].startswith(auth.SESSION_TOKEN_PREFIX)
+    assert first["token"] != second["token"]
+    assert first["expires_in"] == int(auth.SESSION_TOKEN_TTL)
+    # The second validation of the same Gemini key skips the upstream check
+    assert fault.calls == 1
+    keys = asyncio.run(auth.resolve_api_keys(second["token"]))
+    assert keys.gemini_api_key == FAKE_KEYS["gemini_api_key"]
+
+
+def test_failed_validation_is_not_remembered(gemini):
+    fault = gemini(error_rate=1.0)
+
+    async def run():
+        return [(await post("/api/validate-keys", FAKE_KEYS)).status_code for _ in range(2)]
+
+    assert asyncio.run(run()) == [400, 400]
+    assert fault.calls == 2
+
+
+def test_unknown_session_token_is_rejected(gemini):
+    gemini()
+    response = asyncio.run(post(
+        "/api/interview/ai-response",
+        {"session_id": "session-0001", "question": "Why this role?"},
+        {"Authorization": f"Bearer {auth.SESSION_TOKEN_PREFIX}not-a-real-token"},
+    ))
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid or expired session token"
+
+
+def test_legacy_key_blob_is_still_accepted():
+    blob = base64.b64encode(json.dumps(FAKE_KEYS).encode()).decode()
+    keys = asyncio.run(auth.resolve_api_keys(blob))
+    assert keys.google_speech_api_key == FAKE_KEYS["google_speech_api_key"]
+    with pytest.raises(HTTPException) as invalid:
+        asyncio.run(auth.resolve_api_keys("not base64 json"))
+    assert invalid.value.status_code == 401
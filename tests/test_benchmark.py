@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+import benchmark
+import database
+import http_pool
+import llm
+import server
+
+pytest.importorskip("mongomock_motor")
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert benchmark.percentile(values, 50) == 50.0
+    assert benchmark.percentile(values, 99) == 99.0
+    assert benchmark.percentile([], 95) == 0.0
+
+
+def test_summary_counts_non_2xx_as_errors():
+    result = benchmark.summarize([10.0, 20.0, 30.0, 40.0], {"200": 3, "503": 1}, 2.0)
+    assert result["requests"] == 4
+    assert result["errors"] == 1
+    assert result["error_rate"] == 0.25
+    assert result["throughput_rps"] == 2.0
+    assert result["latency_ms"]["min"] == 10.0
+    assert result["latency_ms"]["max"] == 40.0
+
+
+def test_fault_injector_fails_at_its_error_rate():
+    fault = benchmark.FaultInjector("gemini", 0.0, error_rate=1.0)
+    assert all(fault.should_fail() for _ in range(5))
+    assert fault.calls == fault.injected_errors == 5
+    assert not benchmark.FaultInjector("speech", 0.0).should_fail()
+
+
+def test_endpoints_smoke_run_writes_a_comparable_report(monkeypatch, tmp_path, capsys):
+    # run_endpoints swaps these for fakes; restore them afterwards
+    for module, name in ((llm, "llm_chat_factory"), (http_pool, "get_http_client"),
+                         (database, "client"), (database, "db"), (server.limiter, "enabled")):
+        monkeypatch.setattr(module, name, getattr(module, name))
+    output = tmp_path / "report.json"
+    args = benchmark.build_parser().parse_args([
+        "endpoints", "--mongo", "mock", "--requests", "6", "--concurrency", "2", "--sessions", "2",
+        "--seed-transcripts", "2", "--llm-latency-ms", "0", "--speech-latency-ms", "0",
+        "--llm-tokens", "3", "--llm-token-interval-ms", "0", "--output", str(output),
+    ])
+
+    report = asyncio.run(benchmark.run_endpoints(args))
+    assert set(report["results"]) == set(benchmark.SCENARIOS)
+    for scenario, result in report["results"].items():
+        assert result["requests"] == 6, scenario
+        assert result["errors"] == 0, (scenario, result["status_counts"])
+    assert report["fakes"]["gemini"]["calls"] > 0
+
+    benchmark.write_report(report, args)
+    saved = json.loads(output.read_text())
+    assert saved["meta"]["config"]["concurrency"] == 2
+    args.output, args.compare = None, str(output)
+    benchmark.write_report(report, args)
+    assert "Compared with" in capsys.readouterr().out
@@ -0,0 +1,196 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import context
+import database
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+STARTED = datetime(2026, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongo = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    monkeypatch.setattr(database, "db", mongo)
+    monkeypatch.setattr(context, "TRANSCRIPT_BUFFER_TURNS", 5)
+    monkeypatch.setattr(context, "transcript_buffer", context.TranscriptBuffer(5, 100, 10**6, 3600, 400))
+    monkeypatch.setattr(context, "summarizer", context.RollingSummarizer(300, 3, 100))
+    return mongo
+
+
+def turns(session_id, count):
+    return [
+        {"id": str(uuid.uuid4()), "session_id": session_id, "speaker": "interviewer",
+         "text": f"What about question {i}?", "timestamp": STARTED + timedelta(seconds=i)}
+        for i in range(count)
+    ]
+
+
+async def settle(session_id):
+    summary = context.summarizer._summaries.get(session_id)
+    if summary is not None and summary.task is not None:
+        await summary.task
+
+
+def test_context_keeps_the_newest_turns_within_the_budget():
+    buffer = context.TranscriptBuffer(5, 100, 10**6, 3600, 10)
+    buffer.prime("s", [("interviewer", "x" * 200, None)])
+    assert buffer.get_context("s") == f"interviewer: {'x' * 18} … {'x' * 18}\n"
+
+    buffer.prime("s", [("interviewer", "a" * 20, None), ("candidate", "b" * 20, None), ("interviewer", "c" * 20, None)])
+    # The turns estimate at 9, 8 and 9 tokens: two fit in 17, and the newest always goes in
+    assert buffer.get_context("s", 17) == f"candidate: {'b' * 20}\ninterviewer: {'c' * 20}\n"
+    assert buffer.get_context("s", 1) == f"interviewer: {'c' * 20}\n"
+
+
+def test_summary_goes_first_and_shrinks_the_verbatim_budget(db, monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_TOKEN_BUDGET", 20)
+    monkeypatch.setattr(context, "CONTEXT_TURN_MAX_TOKENS", 5)
+    context.transcript_buffer.prime("s", [("interviewer", "a" * 20, None), ("candidate", "b" * 20, None)])
+    context.summarizer.load("s", "- Asked: " + "z" * 30)
+
+    prompt = asyncio.run(context.get_recent_context("s"))
+    summary, recent = prompt.split("\n\n")
+    assert summary == "Summary of the earlier conversation:\n- Asked: " + "z" * 30
+    # 10 tokens of summary leave 10 for turns: only the newest fits
+    assert recent == f"Recent interview conversation:\ncandidate: {'b' * 20}\n"
+
+
+def test_rolled_out_turns_are_summarized_with_a_watermark(db):
+    history = turns("s", 8)
+
+    async def run():
+        context.transcript_buffer.prime("s", [])
+        for doc in history:
+            dropped = context.transcript_buffer.append("s", doc["speaker"], doc["text"], doc["timestamp"])
+            if dropped is not None:
+                line, timestamp = dropped
+                context.summarizer.add("s", line, None, timestamp)
+        await settle("s")
+        return await db.session_summaries.find_one({"session_id": "s"})
+
+    stored = asyncio.run(run())
+    assert stored["summarized_through"] == history[2]["timestamp"]
+    assert stored["summary"].splitlines() == [f"- Asked: What about question {i}?" for i in range(3)]
+
+
+def test_priming_folds_turns_that_never_reached_the_summarizer(db):
+    """Turns saved on another worker, or before a restart, roll out unseen"""
+    history = turns("s", 11)
+
+    async def run():
+        await db.transcripts.insert_many([dict(doc) for doc in history])
+        await db.session_summaries.insert_one({
+            "session_id": "s", "summary": "- Asked: What about question 0?",
+            "summarized_through": history[0]["timestamp"], "updated_at": STARTED,
+        })
+        await context.get_recent_context("s")
+        await settle("s")
+        stored = await db.session_summaries.find_one({"session_id": "s"})
+
+        # Loading again, here or after a restart, queues nothing new
+        context.transcript_buffer.discard("s")
+        await context.load_session_context("s")
+        requeued = context.summarizer.stats()["pending_turns"]
+        restarted = context.RollingSummarizer(300, 3, 100)
+        context.summarizer = restarted
+        context.transcript_buffer.discard("s")
+        await context.load_session_context("s")
+        return stored, requeued, restarted.stats()["pending_turns"]
+
+    stored, requeued, after_restart = asyncio.run(run())
+    # The window holds turns 6-10; turns 1-5 were never summarized
+    assert stored["summarized_through"] == history[5]["timestamp"]
+    assert stored["summary"].splitlines() == [f"- Asked: What about question {i}?" for i in range(6)]
+    assert requeued == 0
+    assert after_restart == 0
+
+
+def test_backfill_is_bounded_and_falls_back_to_updated_at(db, monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_SUMMARY_BACKFILL_TURNS", 2)
+    history = turns("s", 12)
+
+    async def run():
+        await db.transcripts.insert_many([dict(doc) for doc in history])
+        # Stored before summaries had a watermark
+        await db.session_summaries.insert_one({"session_id": "s", "summary": "", "updated_at": history[1]["timestamp"]})
+        await context.load_session_context("s")
+        return list(context.summarizer._summaries["s"].pending)
+
+    pending = asyncio.run(run())
+    # Turns 2-6 are candidates; only the newest two are queued
+    assert pending == ["interviewer: What about question 5?\n", "interviewer: What about question 6?\n"]
+
+
+def test_turns_at_or_before_the_watermark_are_not_queued_twice():
+    summarizer = context.RollingSummarizer(300, 10, 100)
+    summarizer.load("s", "", STARTED)
+    summarizer.add("s", "old\n", None, STARTED)
+    summarizer.add("s", "new\n", None, STARTED + timedelta(seconds=1))
+    summarizer.add("s", "new again\n", None, STARTED + timedelta(seconds=1))
+    assert summarizer._summaries["s"].pending == ["new\n"]
+    assert summarizer.stats()["duplicates"] == 2
+
+
+def test_buffer_keeps_the_last_turns_of_primed_sessions_only():
+    buffer = context.TranscriptBuffer(2, 100, 10**6, 3600, 400)
+    assert buffer.append("cold", "interviewer", "ignored") is None
+    assert buffer.get_context("cold") is None
+
+    buffer.prime("s", [])
+    assert buffer.get_context("s") == ""
+    buffer.append("s", "interviewer", "one", STARTED)
+    buffer.append("s", "candidate", "two")
+    assert buffer.append("s", "interviewer", "three") == ("interviewer: one\n", STARTED)
+    assert buffer.get_context("s") == "candidate: two\ninterviewer: three\n"
+    stats = buffer.stats()
+    assert (stats["hits"], stats["misses"], stats["buffered_chars"]) == (2, 1, len("candidate: two\ninterviewer: three\n"))
+
+
+def test_buffer_evicts_least_recently_used_sessions():
+    buffer = context.TranscriptBuffer(5, 2, 80, 3600, 400)
+    buffer.prime("a", [("interviewer", "first", None)])
+    buffer.prime("b", [("interviewer", "second", None)])
+    buffer.get_context("a")
+    buffer.prime("c", [("interviewer", "third", None)])
+    assert buffer.get_context("b") is None
+    # Over the character bound the oldest sessions go too
+    buffer.append("c", "candidate", "x" * 31)
+    assert buffer.get_context("a") is None and buffer.get_context("c") is not None
+    assert buffer.stats()["evictions"] == 2
+
+
+def test_buffer_behind_the_shared_version_is_stale():
+    buffer = context.TranscriptBuffer(5, 100, 10**6, 3600, 400)
+    buffer.prime("s", [("interviewer", "hello", None)], version=3)
+    assert buffer.get_context("s", version=3) == "interviewer: hello\n"
+    # Our own write bumped the version by one
+    buffer.advance("s", 4)
+    assert buffer.get_context("s", version=4) is not None
+    # Another worker wrote in between
+    buffer.advance("s", 6)
+    assert buffer.get_context("s", version=6) is None
+    assert buffer.stats()["stale"] == 1
+
+
+def test_cold_session_is_primed_from_mongo(db):
+    history = turns("s", 3)
+
+    async def run():
+        await db.transcripts.insert_many([dict(doc) for doc in history])
+        prompt = await context.build_ai_prompt("s", "What next?")
+        await db.transcripts.delete_many({})
+        # Served from memory now
+        return prompt, await context.build_ai_prompt("s", "What next?")
+
+    prompt, cached = asyncio.run(run())
+    assert prompt == cached
+    assert prompt == (
+        "Recent interview conversation:\n"
+        + "".join(f"interviewer: What about question {i}?\n" for i in range(3))
+        + "\n\nCurrent Question: What next?\n\nPlease provide a professional interview response:"
+    )
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+import database
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongo = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    monkeypatch.setattr(database, "db", mongo)
+    return mongo
+
+
+def test_ensure_indexes_creates_every_declared_index_once(db):
+    async def run():
+        before = await database.check_indexes()
+        await database.ensure_indexes()
+        # A second startup finds everything in place
+        await database.ensure_indexes()
+        return before, await database.check_indexes()
+
+    before, after = asyncio.run(run())
+    assert before["transcripts"]["missing"] == sorted(index.document["name"] for index in database.INDEX_SPECS["transcripts"])
+    assert all(report == {"missing": [], "extra": [], "changed": []} for report in after.values())
+
+
+def test_bootstrap_retries_until_mongo_answers(monkeypatch):
+    attempts = []
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def flaky_indexes():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("mongo unavailable")
+
+    async def no_wait(delay):
+        sleeps.append(delay)
+        await real_sleep(0)
+
+    async def warm():
+        pass
+
+    monkeypatch.setattr(database, "ensure_indexes", flaky_indexes)
+    monkeypatch.setattr(database, "warm_mongo_pool", warm)
+    monkeypatch.setattr(asyncio, "sleep", no_wait)
+    asyncio.run(database.bootstrap_database())
+    assert len(attempts) == 3
+    assert sleeps == [2.0, 4.0]
+
+
+async def ready_status():
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/api/ready")
+        return response.status_code, response.json()["status"]
+
+
+def test_readiness_follows_the_bootstrap(monkeypatch):
+    monkeypatch.setattr(server.app.state, "ready", False, raising=False)
+    monkeypatch.setattr(server.app.state, "bootstrap_error", None, raising=False)
+    assert asyncio.run(ready_status()) == (503, "starting")
+
+    server.app.state.ready = True
+    assert asyncio.run(ready_status()) == (200, "ready")
+
+    server.app.state.bootstrap_error = "Index transcripts.timestamp_ttl exists with a different definition"
+    assert asyncio.run(ready_status()) == (503, "failed")
@@ -0,0 +1,57 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import http_pool
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def test_client_is_shared_and_recreated_once_closed(monkeypatch):
+    monkeypatch.setattr(http_pool, "http_client", None)
+
+    async def run():
+        first = http_pool.get_http_client()
+        same = http_pool.get_http_client()
+        await first.close()
+        replacement = http_pool.get_http_client()
+        await replacement.close()
+        return first, same, replacement
+
+    first, same, replacement = asyncio.run(run())
+    assert first is same
+    assert replacement is not first
+
+
+def test_sequential_requests_reuse_a_pooled_connection(monkeypatch):
+    stats = http_pool.HTTPPoolStats()
+    monkeypatch.setattr(http_pool, "http_pool_stats", stats)
+    monkeypatch.setattr(http_pool, "http_client", None)
+
+    async def ok(request):
+        return web.json_response({"ok": True})
+
+    async def run():
+        server = await serve(ok)
+        client = http_pool.get_http_client()
+        try:
+            for _ in range(3):
+                async with client.post(server.make_url("/recognize"), data=b"{}") as response:
+                    assert await response.json() == {"ok": True}
+            return stats.snapshot(client.connector)
+        finally:
+            await client.close()
+            await server.close()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["requests"] == 3
+    assert snapshot["connections_created"] == 1
+    assert snapshot["connections_reused"] == 2
+    assert snapshot["open_connections"] == snapshot["idle_connections"] == 1
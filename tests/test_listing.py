@@ -0,0 +1,116 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import HTTPException, Response
+
+import database
+import listing
+import server
+from listing import decode_cursor, encode_cursor, list_documents
+from models import TranscriptEntry
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+START = datetime(2026, 1, 1, 9, 0)
+
+
+def entry(doc_id, seconds):
+    return TranscriptEntry(id=doc_id, session_id="session-0001", text=doc_id, timestamp=START + timedelta(seconds=seconds)).model_dump()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongo = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    monkeypatch.setattr(database, "db", mongo)
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    return mongo
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(START, "abc")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (START, "abc")
+    with pytest.raises(HTTPException) as invalid:
+        decode_cursor("not-a-cursor")
+    assert invalid.value.status_code == 400
+
+
+async def pages(collection, limit, descending=False, pending=None):
+    """Follow X-Next-Cursor to the end; returns the ids of each page"""
+    seen, after = [], None
+    while True:
+        response = await list_documents(
+            collection, {}, TranscriptEntry, "timestamp", Response(), limit, after, None, "json",
+            pending=pending, descending=descending
+        )
+        seen.append([row["id"] for row in json.loads(response.body)])
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            return seen
+
+
+def test_pages_break_timestamp_ties_by_id(db):
+    # c, a and b share a timestamp: they page in id order, none twice
+    docs = [entry("c", 1), entry("a", 1), entry("d", 0), entry("b", 1), entry("e", 2)]
+
+    async def run():
+        await db.transcripts.insert_many([dict(doc) for doc in docs])
+        return await pages(db.transcripts, 2), await pages(db.transcripts, 2, descending=True)
+
+    ascending, descending = asyncio.run(run())
+    assert ascending == [["d", "a"], ["b", "c"], ["e"]]
+    assert descending == [["e", "c"], ["b", "a"], ["d"]]
+
+
+def test_pending_writes_are_merged_in_order(db):
+    async def run():
+        await db.transcripts.insert_many([dict(entry("a", 0)), dict(entry("c", 2))])
+        pending = [entry("b", 1), entry("d", 3), entry("c", 2)]
+        return await pages(db.transcripts, 2, pending=pending), await pages(db.transcripts, 2, True, pending)
+
+    ascending, descending = asyncio.run(run())
+    assert ascending == [["a", "b"], ["c", "d"]]
+    assert descending == [["d", "c"], ["b", "a"]]
+
+
+def test_ndjson_cut_resumes_from_its_cursor(db):
+    async def run():
+        await db.transcripts.insert_many([dict(entry(name, i)) for i, name in enumerate("abc")])
+        response = await list_documents(db.transcripts, {}, TranscriptEntry, "timestamp", Response(), 2, None, None, "ndjson")
+        lines = [json.loads(line) async for line in response.body_iterator]
+        rest = await list_documents(
+            db.transcripts, {}, TranscriptEntry, "timestamp", Response(), 2, lines[-1]["next_cursor"], None, "ndjson"
+        )
+        return lines, [json.loads(line) async for line in rest.body_iterator]
+
+    first, rest = asyncio.run(run())
+    assert [row["id"] for row in first[:-1]] == ["a", "b"]
+    assert [row["id"] for row in rest] == ["c"]
+
+
+def test_sessions_default_to_newest_first(db, monkeypatch):
+    monkeypatch.setattr(listing, "FAST_SERIALIZATION", False)
+
+    async def run():
+        await db.interview_sessions.insert_many([
+            {"id": f"session-{i}", "user_id": "u", "created_at": START + timedelta(minutes=i % 3), "is_active": True}
+            for i in range(5)
+        ])
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            newest = await client.get("/api/interview/sessions", params={"user_id": "u", "limit": 3})
+            rest = await client.get(
+                "/api/interview/sessions", params={"user_id": "u", "limit": 3, "after": newest.headers["X-Next-Cursor"]}
+            )
+            oldest = await client.get("/api/interview/sessions", params={"user_id": "u", "order": "asc"})
+            invalid = await client.get("/api/interview/sessions", params={"order": "sideways"})
+        return newest.json(), rest.json(), oldest.json(), invalid.status_code
+
+    newest, rest, oldest, invalid = asyncio.run(run())
+    # created_at minutes: 0, 1, 2, 0, 1
+    assert [doc["id"] for doc in newest + rest] == ["session-2", "session-4", "session-1", "session-3", "session-0"]
+    assert [doc["id"] for doc in oldest] == ["session-0", "session-3", "session-1", "session-4", "session-2"]
+    assert invalid == 400
@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import metrics
+import server
+
+
+@pytest.fixture
+def fresh_metrics(monkeypatch):
+    """Metrics switched on with empty stage series"""
+    stage_duration = metrics.Histogram("test_stage_seconds", "stages", ("stage",))
+    stage_errors = metrics.Counter("test_stage_errors_total", "stage errors", ("stage",))
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "stage_duration", stage_duration)
+    monkeypatch.setattr(metrics, "stage_errors", stage_errors)
+    return stage_duration, stage_errors
+
+
+def test_stage_timer_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    assert metrics.time_stage("gemini") is metrics.NULL_TIMER
+
+
+def test_stage_timer_records_duration_and_errors(fresh_metrics):
+    stage_duration, stage_errors = fresh_metrics
+    with metrics.time_stage("mongo_read"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.time_stage("gemini"):
+            raise ValueError("upstream broke")
+    # Client errors are answers, not stage failures
+    with pytest.raises(HTTPException):
+        with metrics.time_stage("session"):
+            raise HTTPException(status_code=404)
+
+    assert {labels: sum(series[:-1]) for labels, series in stage_duration.values.items()} == {
+        ("mongo_read",): 1, ("gemini",): 1, ("session",): 1,
+    }
+    assert stage_errors.values == {("gemini",): 1.0}
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("demo_seconds", "demo", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5.0, "/a")
+
+    assert histogram.render() == [
+        "# HELP demo_seconds demo",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a",le="1.0"} 2',
+        'demo_seconds_bucket{route="/a",le="+Inf"} 3',
+        'demo_seconds_sum{route="/a"} 5.55',
+        'demo_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_label_values_are_escaped():
+    assert metrics.format_labels(("reason",), ('say "hi"\n',)) == '{reason="say \\"hi\\"\\n"}'
+
+
+def test_upstream_errors_are_counted_only_when_enabled(monkeypatch):
+    counter = metrics.Counter("test_upstream_errors_total", "upstream errors", ("upstream", "reason"))
+    monkeypatch.setattr(metrics, "upstream_errors", counter)
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    metrics.count_upstream_error("gemini", "TimeoutError")
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    metrics.count_upstream_error("gemini", "TimeoutError")
+    assert counter.values == {("gemini", "TimeoutError"): 1.0}
+
+
+async def scrape():
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/metrics")
+
+
+def test_metrics_endpoint_is_hidden_when_disabled(monkeypatch):
+    monkeypatch.setattr(server, "METRICS_ENABLED", False)
+    assert asyncio.run(scrape()).status_code == 404
+
+
+def test_metrics_endpoint_exposes_every_series(monkeypatch):
+    monkeypatch.setattr(server, "METRICS_ENABLED", True)
+    response = asyncio.run(scrape())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    for metric in metrics.METRICS:
+        assert f"# TYPE {metric.name} " in response.text
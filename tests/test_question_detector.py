@@ -0,0 +1,24 @@
+import json
+import os
+
+from question_detector import QuestionClassifier
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def load(name):
+    with open(os.path.join(BACKEND, name)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_holdout_shares_no_utterance_with_the_training_corpus():
+    training = {row["text"].strip().lower() for row in load("question_corpus.jsonl")}
+    assert [row["text"] for row in load("question_holdout.jsonl") if row["text"].strip().lower() in training] == []
+
+
+def test_directives_and_their_near_misses():
+    classifier = QuestionClassifier(0.5)
+    assert classifier.is_question("Go ahead and introduce yourself.")
+    assert classifier.is_question("Okay, next one: design a URL shortener")
+    assert not classifier.is_question("Design reviews were the most useful meetings we had.")
+    assert not classifier.is_question("Let me go ahead and introduce myself.")
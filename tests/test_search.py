@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+
+import database
+import search
+import server
+import sessions
+from search import InvertedIndex, SEARCH_SOURCES, highlight, search_terms
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+NOW = datetime(2026, 1, 1)
+
+
+def transcript(doc_id, session_id, text):
+    return {"id": doc_id, "session_id": session_id, "timestamp": NOW, "text": text}
+
+
+def answer(doc_id, session_id, question, response):
+    return {"id": doc_id, "session_id": session_id, "timestamp": NOW, "question": question, "response": response}
+
+
+def ranked(index, query, session_ids=frozenset({"s"}), collections=("transcripts", "ai_responses")):
+    return [doc["id"] for _, _, doc in index.search(search_terms(query), set(session_ids), list(collections), 10)]
+
+
+def test_bm25f_ranking():
+    index = InvertedIndex(SEARCH_SOURCES)
+    index.add("transcripts", transcript("once", "s", "we tuned the database once and moved on to other work"))
+    index.add("transcripts", transcript("twice", "s", "the database was slow so the database got an index and moved"))
+    index.add("transcripts", transcript("short", "s", "database indexing"))
+    index.add("transcripts", transcript("other", "s", "team conflict about deadlines"))
+    index.add("ai_responses", answer("question", "s", "How would you optimize a database?", "Start by measuring"))
+    index.add("ai_responses", answer("response", "s", "Tell me about yourself", "I worked on a database team"))
+
+    # The question field weighs three times the response; short fields beat long ones
+    assert ranked(index, "database")[:2] == ["question", "short"]
+    assert ranked(index, "database").index("twice") < ranked(index, "database").index("once")
+    # Stemming matches "indexing" with "index"; the rarer term decides
+    assert ranked(index, "index")[0] == "short"
+    assert ranked(index, "conflict") == ["other"]
+
+
+def test_search_is_scoped_to_sessions_and_sources():
+    index = InvertedIndex(SEARCH_SOURCES)
+    index.add("transcripts", transcript("a1", "a", "kafka consumer lag"))
+    index.add("transcripts", transcript("b1", "b", "kafka partitions"))
+    index.add("ai_responses", answer("a2", "a", "Why kafka?", "Ordering per partition"))
+
+    assert sorted(ranked(index, "kafka", {"a"})) == ["a1", "a2"]
+    assert ranked(index, "kafka", {"b"}) == ["b1"]
+    assert ranked(index, "kafka", {"a"}, ["transcripts"]) == ["a1"]
+    assert sorted(ranked(index, "kafka", {"a", "b"})) == ["a1", "a2", "b1"]
+
+    index.discard_session("a")
+    assert ranked(index, "kafka", {"a", "b"}) == ["b1"]
+    assert "consumer" not in index.postings
+
+
+def test_highlight_offsets_point_at_matches():
+    text = "The database layer: we optimized the Database queries."
+    snippet, spans = highlight(text, set(search_terms("database optimization")))
+    assert snippet == text
+    assert [text[start:end] for start, end in spans] == ["database", "optimized", "Database"]
+
+
+def test_long_text_is_windowed_around_the_matches():
+    text = "filler " * 60 + "the migration to postgres needed a careful migration plan " + "tail " * 40
+    snippet, spans = highlight(text, set(search_terms("migration")))
+    assert len(snippet) <= search.SEARCH_SNIPPET_CHARS + 4
+    assert snippet.startswith("… ") and snippet.endswith(" …")
+    assert [snippet[start:end] for start, end in spans] == ["migration", "migration"]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongo = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    monkeypatch.setattr(database, "db", mongo)
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    monkeypatch.setattr(server, "search_index", InvertedIndex(SEARCH_SOURCES))
+    monkeypatch.setattr(search, "search_index", server.search_index)
+    sessions.session_cache.clear()
+    return mongo
+
+
+async def search_request(params):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get("/api/interview/search", params=params)
+
+
+def test_memory_backend_serves_the_route(db, monkeypatch):
+    monkeypatch.setattr(database, "SEARCH_BACKEND", "memory")
+
+    async def run():
+        await db.interview_sessions.insert_many([
+            {"id": "session-one-0001", "user_id": "u"}, {"id": "session-two-0002", "user_id": "u"},
+        ])
+        await db.transcripts.insert_one(transcript("t1", "session-one-0001", "We sharded the database by tenant"))
+        response = await search_request({"q": "database", "user_id": "u"})
+        # Written after the index loaded from Mongo
+        search.index_for_search("transcripts", transcript("t2", "session-two-0002", "database failover drills"))
+        scoped = await search_request({"q": "database", "session_id": "session-two-0002"})
+        return response.json(), scoped.json()
+
+    everything, scoped = asyncio.run(run())
+    assert [hit["id"] for hit in everything["results"]] == ["t1"]
+    hit = everything["results"][0]
+    assert hit["field"] == "text" and hit["snippet"][slice(*hit["highlights"][0])] == "database"
+    assert [hit["id"] for hit in scoped["results"]] == ["t2"]
+
+
+def test_mongo_backend_uses_text_search(db, monkeypatch):
+    monkeypatch.setattr(database, "SEARCH_BACKEND", "mongo")
+    calls = []
+
+    async def fake_mongo_search(query, scope, collections, limit):
+        calls.append((query, scope, collections, limit))
+        return [(1.5, "ai_responses", answer("r1", "session-one-0001", "Why Redis?", "Because of latency"))]
+
+    monkeypatch.setattr(server, "mongo_search", fake_mongo_search)
+
+    async def run():
+        await db.interview_sessions.insert_one({"id": "session-one-0001", "user_id": "u"})
+        search.index_for_search("transcripts", transcript("t1", "session-one-0001", "redis"))
+        return (await search_request({"q": "redis", "session_id": "session-one-0001", "limit": 5})).json()
+
+    body = asyncio.run(run())
+    assert calls == [("redis", {"session_id": "session-one-0001"}, ["transcripts", "ai_responses"], 6)]
+    assert body["results"][0]["field"] == "question" and body["results"][0]["score"] == 1.5
+    # Only the memory backend indexes writes
+    assert server.search_index.documents == {}
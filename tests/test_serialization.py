@@ -0,0 +1,81 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+import database
+import listing
+import server
+from listing import document_rows, dumps_json
+from models import AIResponse, TranscriptEntry
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+SESSION = "session-0001"
+START = datetime(2026, 1, 1, 9, 0, 0, 250000)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mongo = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    monkeypatch.setattr(database, "db", mongo)
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    return mongo
+
+
+async def list_transcripts(mongo, docs):
+    await mongo.transcripts.insert_many(docs)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get(f"/api/interview/transcript/{SESSION}")
+        assert response.status_code == 200
+        return response.json()
+
+
+def stored_transcripts():
+    docs = [
+        TranscriptEntry(id=f"t{i}", session_id=SESSION, text=f"line {i} — café", confidence=0.5 + i / 10,
+                        timestamp=START + timedelta(seconds=i)).model_dump()
+        for i in range(3)
+    ]
+    # Written before speaker and confidence existed
+    docs.append({"id": "t3", "session_id": SESSION, "text": "legacy", "timestamp": START + timedelta(seconds=3)})
+    return docs
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_fast_path_matches_the_response_model(db, monkeypatch, fast):
+    expected = [
+        json.loads(TranscriptEntry(**doc).model_dump_json()) for doc in stored_transcripts()
+    ]
+    monkeypatch.setattr(listing, "FAST_SERIALIZATION", fast)
+    # Mongo adds _id, which never reaches the response
+    assert asyncio.run(list_transcripts(db, stored_transcripts())) == expected
+
+
+def test_document_rows_fill_optional_defaults():
+    legacy = {"id": "r1", "session_id": SESSION, "question": "Why?", "response": "Because", "timestamp": START}
+    full = AIResponse(id="r2", session_id=SESSION, question="How?", response="Carefully", cached=True).model_dump()
+    rows = document_rows([legacy, full], AIResponse)
+
+    assert rows[0] == {**legacy, "cached": False}
+    assert rows[1] is full
+
+
+def test_document_rows_send_incomplete_rows_through_the_model():
+    row = document_rows([{"session_id": SESSION, "text": "no id yet"}], TranscriptEntry)[0]
+    assert row["id"]
+    assert isinstance(row["timestamp"], datetime)
+    assert row["speaker"] == "interviewer"
+
+
+@pytest.mark.parametrize("with_orjson", [True, False])
+def test_dumps_json_is_compact_with_iso_datetimes(monkeypatch, with_orjson):
+    if not with_orjson:
+        monkeypatch.setattr(listing, "orjson", None)
+    elif listing.orjson is None:
+        pytest.skip("orjson not installed")
+    encoded = dumps_json([{"text": "café", "timestamp": START}])
+    assert encoded == '[{"text":"café","timestamp":"2026-01-01T09:00:00.250000"}]'.encode()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+import database
+import sessions
+from ttl_cache import TTLCache
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    cache.set("short", 4, ttl=1)
+    clock[0] += 5
+    assert cache.get("short") is None
+    assert cache.get("c") == 3
+    clock[0] += 10
+    assert cache.get("c") is None
+    stats = cache.stats()
+    assert (stats["evictions"], stats["hits"], stats["misses"]) == (2, 4, 3)
+
+
+class CountingSessions:
+    """interview_sessions that counts its reads"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.reads = 0
+
+    async def find_one(self, *args, **kwargs):
+        self.reads += 1
+        return await self.collection.find_one(*args, **kwargs)
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    mongo = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    counting = CountingSessions(mongo.interview_sessions)
+
+    class Database:
+        interview_sessions = counting
+
+    monkeypatch.setattr(database, "db", Database)
+    monkeypatch.setattr(sessions, "session_cache", TTLCache(100, 60))
+    asyncio.run(mongo.interview_sessions.insert_one({"id": "session-0001", "is_active": True}))
+    return mongo, counting
+
+
+def test_session_lookups_hit_mongo_once(counted):
+    _, counting = counted
+
+    async def run():
+        return [await sessions.get_cached_session("session-0001") for _ in range(3)]
+
+    found = asyncio.run(run())
+    assert all(session["id"] == "session-0001" for session in found)
+    assert counting.reads == 1
+
+
+def test_unknown_sessions_are_cached_briefly(counted, monkeypatch):
+    _, counting = counted
+    monkeypatch.setattr(sessions, "SESSION_CACHE_NEGATIVE_TTL", 0.05)
+
+    async def run():
+        first = await sessions.get_cached_session("session-missing")
+        second = await sessions.get_cached_session("session-missing")
+        await asyncio.sleep(0.1)
+        await sessions.get_cached_session("session-missing")
+        return first, second
+
+    assert asyncio.run(run()) == (None, None)
+    assert counting.reads == 2
+
+
+def test_invalidation_rereads_a_changed_session(counted):
+    mongo, counting = counted
+
+    async def run():
+        await sessions.get_cached_session("session-0001")
+        await mongo.interview_sessions.update_one({"id": "session-0001"}, {"$set": {"is_active": False}})
+        stale = await sessions.get_cached_session("session-0001")
+        sessions.invalidate_session("session-0001")
+        return stale, await sessions.get_cached_session("session-0001")
+
+    stale, fresh = asyncio.run(run())
+    assert stale["is_active"] is True
+    assert fresh["is_active"] is False
+    assert counting.reads == 2
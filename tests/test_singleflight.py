@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_wait_gives_up_at_its_deadline():
+    async def run():
+        flight = SingleFlight(timeout=10)
+        shared = flight.begin("key")
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.wait("key", timeout=0.05)
+        # The shared call is still running for everyone else
+        assert not shared.done() and flight.in_flight("key")
+        shared.set_result("answer")
+        return await flight.wait("key"), flight.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == "answer"
+    assert stats["wait_timeouts"] == 1
+
+
+def test_unresolved_leader_expires_and_releases_its_key():
+    async def run():
+        flight = SingleFlight(timeout=0.05)
+        flight.begin("key")
+        # The follower is released when the leader's future expires
+        result = await asyncio.wait_for(flight.wait("key", timeout=5), 1)
+        return result, flight.in_flight("key"), flight.stats()
+
+    result, in_flight, stats = asyncio.run(run())
+    assert result is None
+    assert not in_flight
+    assert stats["expired"] == 1
@@ -0,0 +1,88 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+import ai_responses
+import auth
+import database
+import llm
+import models
+import server
+import speculative
+import transcription
+import upstream
+from benchmark import FAKE_KEYS, FaultInjector, make_fake_llm
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def speculating(monkeypatch):
+    """Speculation switched on with a fresh manager, fake Gemini and an in-memory Mongo"""
+    fault = FaultInjector("gemini", 1.0)
+    manager = speculative.SpeculationManager(30.0)
+    monkeypatch.setattr(speculative, "SPECULATIVE_ANSWERS", True)
+    monkeypatch.setattr(transcription, "speculation", manager)
+    monkeypatch.setattr(ai_responses, "speculation", manager)
+    monkeypatch.setattr(llm, "llm_chat_factory", make_fake_llm(fault, 5, token_interval_ms=1))
+    monkeypatch.setattr(database, "db", mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"])
+    monkeypatch.setattr(upstream, "gemini_guard", upstream.UpstreamGuard("gemini", "Gemini", upstream.GEMINI_TIMEOUT, False))
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    return manager, fault
+
+
+async def ask_after_transcript(transcript_text: str, question: str):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        token = await auth.issue_session_token(models.APIKeysModel(**FAKE_KEYS))
+        headers = {"Authorization": f"Bearer {token}"}
+        session = (await client.post("/api/interview/session", json={"user_id": "test"})).json()
+        response = await client.post(
+            "/api/interview/transcript",
+            json={"session_id": session["id"], "text": transcript_text, "speaker": "interviewer"},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        response = await client.post(
+            "/api/interview/ai-response",
+            json={"session_id": session["id"], "question": question},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        return response.json()
+
+
+def test_committed_question_claims_the_speculation(speculating):
+    manager, fault = speculating
+    question = f"How would you shard the {uuid.uuid4().hex} table?"
+    answer = asyncio.run(ask_after_transcript(question, question))
+
+    assert answer["response"]
+    assert manager.started == 1
+    assert manager.claimed == 1
+    # The speculative call is the only Gemini call
+    assert fault.calls == 1
+
+
+def test_different_question_discards_the_speculation(speculating):
+    manager, fault = speculating
+    question = f"How would you shard the {uuid.uuid4().hex} table?"
+    other = f"What is your experience with {uuid.uuid4().hex} queues?"
+    asyncio.run(ask_after_transcript(question, other))
+
+    assert manager.started == 1
+    assert manager.claimed == 0
+    assert manager.cancelled + manager.discarded == 1
+    assert manager.stats()["pending"] == 0
+
+
+def test_speculation_needs_api_keys():
+    manager = speculative.SpeculationManager(30.0)
+
+    async def run():
+        manager.on_speech("session-without-keys", "How would you design a cache?", None)
+
+    asyncio.run(run())
+    assert manager.started == 0
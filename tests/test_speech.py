@@ -0,0 +1,121 @@
+import asyncio
+import base64
+import json
+
+import httpx
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import HTTPException
+
+import auth
+import database
+import http_pool
+import models
+import server
+import sessions
+import speech
+import transcription
+import upstream
+from benchmark import FAKE_KEYS
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+AUDIO = b"\x1a\x45\xdf\xa3" + bytes(range(256)) * 2
+
+
+def test_payload_is_valid_json_around_the_encoded_audio():
+    encoded = base64.b64encode(AUDIO)
+    payload = json.loads(speech.build_speech_payload(encoded, 48000, "OGG_OPUS"))
+    assert payload["audio"]["content"] == encoded.decode()
+    assert payload["config"]["encoding"] == "OGG_OPUS" and payload["config"]["sampleRateHertz"] == 48000
+
+
+def test_base64_and_format_checks():
+    assert speech.is_base64(base64.b64encode(AUDIO).decode())
+    assert not speech.is_base64("not base64!")
+    assert not speech.is_base64("abc")
+    assert speech.speech_encoding("PCM") == "LINEAR16"
+    with pytest.raises(HTTPException):
+        speech.speech_encoding("mp3")
+
+
+@pytest.fixture
+def speech_api(monkeypatch):
+    """A local stand-in for the Speech REST API answering with ``status`` and ``body``"""
+    monkeypatch.setattr(http_pool, "http_client", None)
+    monkeypatch.setattr(upstream, "speech_guard", upstream.UpstreamGuard("speech", "Google Speech API", 5, False))
+    received = []
+
+    def run(status, body):
+        async def recognize(request):
+            received.append(await request.json())
+            return web.json_response(body, status=status)
+
+        async def call():
+            app = web.Application()
+            app.router.add_post("/recognize", recognize)
+            test_server = TestServer(app)
+            await test_server.start_server()
+            monkeypatch.setattr(speech, "SPEECH_API_URL", str(test_server.make_url("/recognize")))
+            try:
+                return await speech.recognize_speech("key", base64.b64encode(AUDIO), 16000)
+            finally:
+                await http_pool.get_http_client().close()
+                await test_server.close()
+
+        return asyncio.run(call())
+
+    run.received = received
+    return run
+
+
+def test_results_are_joined_with_the_best_confidence(speech_api):
+    result = speech_api(200, {"results": [
+        {"alternatives": [{"transcript": "Tell me about", "confidence": 0.8}]},
+        {"alternatives": [{"transcript": " yourself.", "confidence": 0.9}]},
+    ]})
+    assert result == ("Tell me about yourself.", 0.9)
+    assert speech_api.received[0]["audio"]["content"] == base64.b64encode(AUDIO).decode()
+
+
+def test_no_speech_is_an_empty_transcript(speech_api):
+    assert speech_api(200, {}) == ("", 0.0)
+
+
+@pytest.mark.parametrize("upstream_status, status_code", [(500, 502), (429, 429), (400, 400)])
+def test_upstream_errors_map_to_status_codes(speech_api, upstream_status, status_code):
+    with pytest.raises(HTTPException) as error:
+        speech_api(upstream_status, {"error": "nope"})
+    assert error.value.status_code == status_code
+
+
+def test_audio_is_base64_encoded_once_on_the_way_to_speech(monkeypatch):
+    monkeypatch.setattr(database, "db", mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"])
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    sessions.session_cache.clear()
+    sent = []
+
+    async def fake_recognize(api_key, audio_content, sample_rate=16000, encoding="WEBM_OPUS"):
+        sent.append(audio_content)
+        return "hello", 0.9
+
+    monkeypatch.setattr(transcription, "recognize_speech", fake_recognize)
+    encoded = base64.b64encode(AUDIO)
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            token = await auth.issue_session_token(models.APIKeysModel(**FAKE_KEYS))
+            headers = {"Authorization": f"Bearer {token}"}
+            session_id = (await client.post("/api/interview/session", json={"user_id": "test"})).json()["id"]
+            raw = await client.post(f"/api/transcribe-audio/raw?session_id={session_id}", content=AUDIO, headers=headers)
+            posted = await client.post(
+                "/api/transcribe-audio", json={"session_id": session_id, "audio_data": encoded.decode()}, headers=headers
+            )
+            return raw.json(), posted.json()
+
+    raw, posted = asyncio.run(run())
+    assert raw["transcript"] == posted["transcript"] == "hello"
+    # Raw bytes are encoded exactly once; JSON uploads are forwarded as sent
+    assert sent == [encoded, encoded]
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+import models
+import shared_state
+import auth
+import context
+
+
+def test_in_memory_store_expires_values():
+    async def run():
+        store = shared_state.InMemoryStateStore()
+        await store.set("short", "1", ttl=0.05)
+        await store.set("forever", "1")
+        assert await store.get("short") == "1"
+        await asyncio.sleep(0.1)
+        return await store.get("short"), await store.get("forever")
+
+    assert asyncio.run(run()) == (None, "1")
+
+
+def test_in_memory_store_incr_keeps_first_expiry():
+    async def run():
+        store = shared_state.InMemoryStateStore()
+        assert await store.incr("counter", ttl=0.1) == 1
+        await asyncio.sleep(0.06)
+        assert await store.incr("counter", ttl=0.1) == 2
+        await asyncio.sleep(0.06)
+        return await store.incr("counter", ttl=0.1)
+
+    assert asyncio.run(run()) == 1
+
+
+def test_session_token_expires(monkeypatch):
+    monkeypatch.setattr(shared_state, "state_store", shared_state.InMemoryStateStore())
+    monkeypatch.setattr(auth, "SESSION_TOKEN_TTL", 0.05)
+    keys = models.APIKeysModel(google_speech_api_key="s" * 30, gemini_api_key="g" * 30)
+
+    async def run():
+        token = await auth.issue_session_token(keys)
+        assert token.startswith(auth.SESSION_TOKEN_PREFIX)
+        assert (await auth.resolve_session_token(token)).gemini_api_key == keys.gemini_api_key
+        await asyncio.sleep(0.1)
+        # Skip the per-process resolution cache to reach the store
+        auth.resolved_tokens.pop(auth.secret_digest(token))
+        await auth.resolve_session_token(token)
+
+    with pytest.raises(HTTPException) as expired:
+        asyncio.run(run())
+    assert expired.value.status_code == 401
+
+
+class SharedMemoryStore(shared_state.InMemoryStateStore):
+    """In-memory store standing in for Redis"""
+    shared = True
+
+
+class BrokenStore(SharedMemoryStore):
+    async def incr(self, key, ttl):
+        raise ConnectionError("redis down")
+
+
+def test_state_keys_share_one_prefix():
+    assert shared_state.state_key("token", "abc") == shared_state.STATE_KEY_PREFIX + "token:abc"
+
+
+def test_context_version_is_counted_in_the_shared_store(monkeypatch):
+    monkeypatch.setattr(shared_state, "state_store", SharedMemoryStore())
+
+    async def run():
+        assert await context.shared_context_version("session-0001") == 0
+        assert await context.bump_context_version("session-0001") == 1
+        assert await context.bump_context_version("session-0001") == 2
+        return await context.shared_context_version("session-0001")
+
+    assert asyncio.run(run()) == 2
+
+
+def test_context_version_is_skipped_without_a_shared_store(monkeypatch):
+    monkeypatch.setattr(shared_state, "state_store", shared_state.InMemoryStateStore())
+    assert asyncio.run(context.bump_context_version("session-0001")) is None
+
+
+def test_failed_version_bump_drops_the_buffered_context(monkeypatch):
+    monkeypatch.setattr(shared_state, "state_store", BrokenStore())
+    buffer = context.TranscriptBuffer(5, 100, 10**6, 3600, 400)
+    monkeypatch.setattr(context, "transcript_buffer", buffer)
+    buffer.prime("session-0001", [("interviewer", "hello", None)], version=1)
+
+    assert asyncio.run(context.bump_context_version("session-0001")) is None
+    # Other workers cannot be told, so this one re-primes from Mongo
+    assert buffer.get_context("session-0001") is None
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_REDIS_URL"), reason="set TEST_REDIS_URL to run against Redis")
+def test_redis_store_round_trip():
+    async def run():
+        store = shared_state.RedisStateStore(os.environ["TEST_REDIS_URL"])
+        key = shared_state.state_key("test", uuid.uuid4().hex)
+        try:
+            await store.set(key, "value", ttl=5)
+            assert await store.get(key) == "value"
+            await store.delete(key)
+            assert await store.get(key) is None
+            assert await store.incr(key, ttl=5) == 1
+            assert await store.incr(key, ttl=5) == 2
+        finally:
+            await store.delete(key)
+            await store.close()
+
+    asyncio.run(run())
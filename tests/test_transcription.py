@@ -0,0 +1,76 @@
+import asyncio
+import base64
+
+import httpx
+import pytest
+
+import auth
+import database
+import models
+import server
+import transcription
+from benchmark import FAKE_KEYS
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+AUDIO = base64.b64encode(b"\x1a\x45\xdf\xa3" + b"webm-audio" * 20).decode("ascii")
+
+
+@pytest.fixture
+def speech(monkeypatch):
+    """A fake Speech call that records what it was sent, and an in-memory Mongo"""
+    calls = []
+
+    async def recognize(api_key, audio_content, sample_rate, encoding):
+        calls.append((audio_content, sample_rate, encoding))
+        return "tell me about yourself", 0.9
+
+    monkeypatch.setattr(transcription, "recognize_speech", recognize)
+    monkeypatch.setattr(database, "db", mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"])
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    return calls
+
+
+async def transcribe(**fields):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        token = await auth.issue_session_token(models.APIKeysModel(**FAKE_KEYS))
+        session = (await client.post("/api/interview/session", json={"user_id": "test"})).json()
+        response = await client.post(
+            "/api/transcribe-audio",
+            json={"session_id": session["id"], "audio_data": AUDIO, **fields},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200
+        stored = await database.db.transcripts.find({"session_id": session["id"]}, {"_id": 0}).to_list(10)
+        return session, response.json(), stored
+
+
+def test_transcript_is_not_saved_by_default(speech):
+    _, body, stored = asyncio.run(transcribe())
+    assert body["transcript"] == "tell me about yourself"
+    assert body["entry"] is None
+    assert stored == []
+    # The client's base64 goes to Speech as is
+    assert speech[0][0] == AUDIO.encode("ascii")
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_persist_saves_and_returns_the_entry(speech, background):
+    session, body, stored = asyncio.run(transcribe(persist=True, persist_in_background=background, speaker="candidate"))
+    entry = body["entry"]
+    assert entry["session_id"] == session["id"]
+    assert entry["text"] == "tell me about yourself"
+    assert entry["speaker"] == "candidate"
+    assert entry["confidence"] == 0.9
+    assert [doc["id"] for doc in stored] == [entry["id"]]
+
+
+def test_empty_transcript_is_not_persisted(speech, monkeypatch):
+    async def recognize(api_key, audio_content, sample_rate, encoding):
+        return "", 0.0
+
+    monkeypatch.setattr(transcription, "recognize_speech", recognize)
+    _, body, stored = asyncio.run(transcribe(persist=True))
+    assert body["entry"] is None
+    assert stored == []
@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import upstream
+from benchmark import FaultInjector, InjectedUpstreamError, make_fake_llm
+from emergentintegrations.llm.chat import UserMessage
+
+
+def fake_chat(error_rate: float = 0.0):
+    chat_class = make_fake_llm(FaultInjector("gemini", 0.0, error_rate=error_rate), tokens=3, token_interval_ms=0)
+    return chat_class(api_key="unused", session_id="session", system_message="")
+
+
+class QuotaError(RuntimeError):
+    status_code = 429
+
+
+def call(guard, api_key, attempt):
+    return asyncio.run(guard.call(api_key, attempt))
+
+
+def test_breaker_opens_per_key_on_upstream_failures():
+    guard = upstream.UpstreamGuard("test", "Test", 5.0, False)
+    failing = fake_chat(error_rate=1.0)
+
+    for _ in range(upstream.BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(InjectedUpstreamError):
+            call(guard, "key-a", lambda: failing.send_message(UserMessage(text="hi")))
+
+    with pytest.raises(HTTPException) as rejected:
+        call(guard, "key-a", lambda: failing.send_message(UserMessage(text="hi")))
+    assert rejected.value.status_code == 503
+    assert "Retry-After" in rejected.value.headers
+
+    # Another user's key is unaffected
+    assert call(guard, "key-b", lambda: fake_chat().send_message(UserMessage(text="hi")))
+    assert guard.stats()["breakers"] == {"keys": 2, "open": 1, "opened": 1, "rejected": 1}
+
+
+def test_breaker_ignores_auth_and_quota_errors():
+    guard = upstream.UpstreamGuard("test", "Test", 5.0, False)
+
+    async def quota_exceeded():
+        raise QuotaError("quota exceeded")
+
+    for _ in range(upstream.BREAKER_FAILURE_THRESHOLD * 2):
+        with pytest.raises(QuotaError):
+            call(guard, "key-a", quota_exceeded)
+    assert guard.health("key-a").breaker.state == upstream.CircuitBreaker.CLOSED
+
+
+def test_breaker_half_open_admits_one_probe():
+    guard = upstream.UpstreamGuard("test", "Test", 5.0, False)
+    breaker = guard.health("key-a").breaker
+    for _ in range(upstream.BREAKER_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    assert breaker.state == upstream.CircuitBreaker.OPEN
+    breaker.opened_at -= breaker.reset_seconds
+
+    # The first caller after the reset period is the probe; others still fail fast
+    guard.check("key-a")
+    assert breaker.state == upstream.CircuitBreaker.HALF_OPEN
+    with pytest.raises(HTTPException):
+        guard.check("key-a")
+
+    # A failed probe re-opens the breaker, a successful one closes it
+    guard.record_failure(guard.health("key-a"))
+    assert breaker.state == upstream.CircuitBreaker.OPEN
+    breaker.opened_at -= breaker.reset_seconds
+    assert call(guard, "key-a", lambda: fake_chat().send_message(UserMessage(text="hi")))
+    assert breaker.state == upstream.CircuitBreaker.CLOSED
+
+
+def test_call_is_bounded_by_request_deadline():
+    guard = upstream.UpstreamGuard("test", "Test", 30.0, False)
+    budget_ms = upstream.UPSTREAM_RESERVE_MS + 200
+
+    async def run():
+        with upstream.latency_budget(budget_ms):
+            return await guard.call("key-a", lambda: asyncio.sleep(10))
+
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as timed_out:
+        asyncio.run(run())
+    assert timed_out.value.status_code == 504
+    assert time.monotonic() - started < budget_ms / 1000
+    assert guard.timeouts == 1
+
+
+def test_exhausted_budget_skips_the_call():
+    guard = upstream.UpstreamGuard("test", "Test", 30.0, False)
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+
+    async def run():
+        with upstream.latency_budget(upstream.UPSTREAM_RESERVE_MS / 2):
+            return await guard.call("key-a", attempt)
+
+    with pytest.raises(HTTPException) as exhausted:
+        asyncio.run(run())
+    assert exhausted.value.status_code == 504
+    assert attempts == []
+
+
+def test_hedge_wins_and_cancels_the_straggler():
+    guard = upstream.UpstreamGuard("test", "Test", 5.0, True)
+    health = guard.health("key-a")
+    for _ in range(upstream.HEDGE_MIN_SAMPLES):
+        health.latency.observe(0.01)
+    cancelled = []
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        if len(attempts) == 1:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+        return "hedged"
+
+    async def run():
+        result = await guard.call("key-a", attempt)
+        # Let the cancelled primary unwind
+        await asyncio.sleep(0)
+        return result
+
+    started = time.monotonic()
+    assert asyncio.run(run()) == "hedged"
+    assert time.monotonic() - started < 1
+    assert cancelled == [1]
+    assert (guard.hedges, guard.hedge_wins) == (1, 1)
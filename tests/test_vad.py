@@ -0,0 +1,67 @@
+import asyncio
+import base64
+
+import httpx
+import pytest
+
+import auth
+import database
+import models
+import server
+import sessions
+from benchmark import FAKE_KEYS
+from vad import VoiceActivityDetector
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+AUDIO = b"\x1a\x45\xdf\xa3" + b"\x00" * 200
+SILENCE = [0.001] * 10
+
+
+def test_voiced_span_needs_enough_speech():
+    detector = VoiceActivityDetector(threshold=0.01, min_speech_ms=200, pad_ms=0)
+    assert detector.voiced_span([0.0, 0.5, 0.0, 0.0], 100) is None
+    assert detector.voiced_span([0.0, 0.5, 0.5, 0.0], 100) == (1, 2)
+    assert detector.trailing_silence_ms([0.5, 0.0, 0.0], 100) == 200
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(database, "db", mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"])
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    sessions.session_cache.clear()
+
+    async def call(method, url, **kwargs):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            token = await auth.issue_session_token(models.APIKeysModel(**FAKE_KEYS))
+            session = (await client.post("/api/interview/session", json={"user_id": "test"})).json()
+            return session["id"], await client.request(
+                method, url.format(session=session["id"]), headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+
+    return lambda *args, **kwargs: asyncio.run(call(*args, **kwargs))
+
+
+def test_json_endpoint_rejects_a_non_positive_frame_length(api):
+    body = {"session_id": "session-0001", "audio_data": base64.b64encode(AUDIO).decode(), "energy": SILENCE}
+    _, response = api("POST", "/api/transcribe-audio", json={**body, "energy_frame_ms": 0})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "energy_frame_ms"]
+
+
+def test_raw_endpoint_rejects_a_non_positive_frame_length(api):
+    _, response = api(
+        "POST", "/api/transcribe-audio/raw?session_id={session}&energy=0.001,0.001&energy_frame_ms=-20", content=AUDIO
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", "energy_frame_ms"]
+
+
+def test_silent_chunk_skips_speech(api):
+    session_id, response = api(
+        "POST", "/api/transcribe-audio/raw?session_id={session}&energy=" + ",".join(map(str, SILENCE)), content=AUDIO
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["transcript"], body["session_id"], body["skipped_silence"]) == ("", session_id, True)
@@ -0,0 +1,164 @@
+import asyncio
+import fcntl
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import database
+from write_behind import WriteBehindQueue, only_duplicates
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+class FlakyDatabase:
+    """Mongo whose insert_many fails while ``failing`` is set"""
+
+    def __init__(self, db):
+        self.db = db
+        self.failing = False
+
+    def __getitem__(self, name):
+        collection = self.db[name]
+        outer = self
+
+        class Collection:
+            async def insert_many(self, docs, ordered=True):
+                if outer.failing:
+                    raise ConnectionError("mongo unavailable")
+                return await collection.insert_many(docs, ordered=ordered)
+
+        return Collection()
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    db = mongomock_motor.AsyncMongoMockClient()["interview_copilot_test"]
+    flaky = FlakyDatabase(db)
+    monkeypatch.setattr(database, "db", flaky)
+    return flaky
+
+
+def transcript(session_id="session-1", text="hello"):
+    return {"id": str(uuid.uuid4()), "session_id": session_id, "text": text, "timestamp": datetime.utcnow()}
+
+
+def make_queue(mode, journal_path=None, batch_size=100):
+    return WriteBehindQueue("transcripts", mode, batch_size, 0.01, 1000, journal_path)
+
+
+async def stored_ids(mongo):
+    return {doc["id"] async for doc in mongo.db.transcripts.find({})}
+
+
+def test_only_duplicates():
+    duplicates = BulkWriteError({"writeErrors": [{"code": 11000}, {"code": 11000}]})
+    mixed = BulkWriteError({"writeErrors": [{"code": 11000}, {"code": 121}]})
+    write_concern = BulkWriteError({"writeErrors": [{"code": 11000}], "writeConcernErrors": [{"code": 64}]})
+
+    assert only_duplicates(duplicates)
+    assert not only_duplicates(mixed)
+    assert not only_duplicates(write_concern)
+    assert not only_duplicates(ConnectionError("down"))
+
+
+def test_flush_before_ack_returns_once_stored(mongo):
+    async def run():
+        queue = make_queue("flush_before_ack")
+        doc = transcript()
+        await queue.write(doc)
+        stored = await stored_ids(mongo)
+        pending = queue.pending_for(doc["session_id"])
+        await queue.close()
+        return doc["id"] in stored, pending
+
+    assert asyncio.run(run()) == (True, [])
+
+
+def test_flush_before_ack_reports_a_failed_batch(mongo):
+    mongo.failing = True
+
+    async def run():
+        queue = make_queue("flush_before_ack")
+        with pytest.raises(ConnectionError):
+            await queue.write(transcript())
+        return queue.stats()["failures"]
+
+    assert asyncio.run(run()) == 1
+
+
+def test_replay_tolerates_entries_already_stored(mongo, tmp_path):
+    base = str(tmp_path / "transcripts.journal")
+    stored, lost = transcript(text="stored"), transcript(text="lost")
+
+    async def run():
+        await mongo.db.transcripts.create_index("id", unique=True)
+        await mongo.db.transcripts.insert_one(dict(stored))
+        # A dead worker's journal: one entry made it to Mongo before the crash
+        with open(base + ".99999999", "wb") as journal:
+            for doc in (stored, lost):
+                journal.write(json.dumps(doc, default=str).encode() + b"\n")
+            journal.write(b'{"id": "torn')
+        queue = make_queue("journaled", base)
+        queue.start()
+        await asyncio.sleep(0.2)
+        stats = queue.stats()
+        await queue.close()
+        return stats, await stored_ids(mongo), await mongo.db.transcripts.find_one({"id": lost["id"]})
+
+    stats, ids, replayed = asyncio.run(run())
+    assert ids == {stored["id"], lost["id"]}
+    assert isinstance(replayed["timestamp"], datetime)
+    assert (stats["replayed"], stats["adopted_journals"], stats["unconfirmed"]) == (2, 1, 0)
+    assert not os.path.exists(base + ".99999999")
+
+
+def test_live_workers_journal_is_left_alone(mongo, tmp_path):
+    base = str(tmp_path / "transcripts.journal")
+    entry = json.dumps(transcript(), default=str).encode() + b"\n"
+
+    async def run():
+        with open(base + ".12345", "ab") as live:
+            live.write(entry)
+            live.flush()
+            fcntl.flock(live, fcntl.LOCK_EX)
+            queue = make_queue("journaled", base)
+            queue.start()
+            await asyncio.sleep(0.1)
+            stats = queue.stats()
+            await queue.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert (stats["replayed"], stats["adopted_journals"]) == (0, 0)
+    with open(base + ".12345", "rb") as journal:
+        assert journal.read() == entry
+
+
+def test_journal_is_truncated_only_once_everything_is_stored(mongo, tmp_path):
+    base = str(tmp_path / "transcripts.journal")
+    own = f"{base}.{os.getpid()}"
+
+    async def run():
+        queue = make_queue("journaled", base)
+        mongo.failing = True
+        await queue.write(transcript())
+        await queue.write(transcript())
+        await asyncio.sleep(0.1)
+        # Acknowledged but not in Mongo: the journal must keep both entries
+        kept = os.path.getsize(own)
+        mongo.failing = False
+        await asyncio.sleep(1.0)
+        truncated = os.path.getsize(own)
+        await queue.close()
+        return kept, truncated, await stored_ids(mongo)
+
+    kept, truncated, ids = asyncio.run(run())
+    assert kept > 0
+    assert truncated == 0
+    assert len(ids) == 2
+    # Drained on close, so the journal is removed
+    assert not os.path.exists(own)